@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+'''
+Run tests of test_tools against SQLite databases in a temporary folder::
+
+    python runtests.py
+    python runtests.py tests.test_parallel tests.test_utils.DiffTest
+'''
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# Databases and cache of the runner are created in temporary folder
+TEMP_DIR = tempfile.mkdtemp(prefix='test_tools_tests_')
+atexit.register(shutil.rmtree, TEMP_DIR, True)
+os.chdir(TEMP_DIR)
+
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': 'tools.db',
+                'TEST_NAME': 'test_tools.db',
+            },
+        },
+        INSTALLED_APPS=(
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sessions',
+            'django.contrib.sites',
+            'tests',
+            'test_tools',
+        ),
+        SITE_ID=1,
+        SECRET_KEY='test_tools',
+        ROOT_URLCONF='tests.urls',
+        TEST_TOOLS_PROJECT_ROOT=ROOT,
+        TEST_TOOLS_CACHE_DIR=os.path.join(TEMP_DIR, '.test_tools'),
+    )
+
+
+def runtests(*test_labels):
+    ''' Run tests of labels or all the tests of `tests` package '''
+    from django.test import TestCase
+    from django.test.simple import DjangoTestSuiteRunner, reorder_suite
+    from django.utils.unittest.loader import defaultTestLoader
+
+    class TestToolsRunner(DjangoTestSuiteRunner):
+        ''' Runner which finds tests by unittest discovery '''
+
+        def build_suite(self, test_labels, extra_tests=None, **kwargs):
+            if test_labels:
+                suite = defaultTestLoader.loadTestsFromNames(test_labels)
+            else:
+                suite = defaultTestLoader.discover(
+                    os.path.join(ROOT, 'tests'), top_level_dir=ROOT)
+            return reorder_suite(suite, (TestCase,))
+
+    # Django 1.4 runner stops at the first failure by default
+    runner = TestToolsRunner(verbosity=1, interactive=False, failfast=False)
+    failures = runner.run_tests(test_labels)
+    sys.exit(bool(failures))
+
+
+if __name__ == '__main__':
+    runtests(*sys.argv[1:])
@@ -0,0 +1,481 @@
+'''
+Benchmarks of test_tools overhead on synthetic data. Run them with project
+settings, save results as JSON and compare them with a baseline:
+
+    DJANGO_SETTINGS_MODULE=project.settings python -m test_tools.benchmark
+    python -m test_tools.benchmark run --output current.json
+    python -m test_tools.benchmark compare baseline.json current.json
+'''
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from contextlib import contextmanager
+from optparse import OptionParser
+
+IMPORT_SCRIPT = '''
+import sys, time
+start = time.time()
+import {0}
+sys.stdout.write(repr(time.time() - start))
+'''
+
+# Modules which test_tools.utils imports only when helpers need them
+IMPORTED_MODULES = (
+    'test_tools.utils',
+    'mock',
+    'cProfile',
+    'django.test',
+    'django.contrib.auth.models',
+    'django.contrib.sites.models',
+)
+
+# Numbers of objects for model_factory and diff benchmarks
+SIZES = (100, 1000, 10000)
+# Numbers of apps of generated project for build_suite benchmark
+APP_COUNTS = (10, 50)
+MODULES_PER_APP = 5
+TESTS_PER_MODULE = 10
+# Numbers of databases for setup_databases benchmark, every one has a mirror
+ALIAS_COUNTS = (1, 4, 8)
+# Slowdown relative to baseline which is reported as regression
+TOLERANCE = 0.2
+# Differences smaller than this number of seconds are noise
+MIN_DIFFERENCE = 0.0005
+
+APP_PREFIX = 'test_tools_benchmark_app_'
+TEST_MODULE = '''from django.test import TestCase
+
+
+class BenchmarkTest{0}(TestCase):
+{1}
+'''
+TEST_METHOD = '''
+    def test_{0}(self):
+        pass
+'''
+
+
+def measure(func, repeat=3, setup=None):
+    ''' Best time of calling func, setup is called before every call '''
+    timings = []
+    for counter in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def time_import(module_name, repeat=5):
+    '''
+    Best time of importing module in fresh interpreter, None if it can't
+    be imported
+    '''
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    timings = []
+    for counter in range(repeat):
+        output = subprocess.Popen(
+            [sys.executable, '-c', IMPORT_SCRIPT.format(module_name)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            env=env).communicate()[0]
+        if not output:
+            return None
+        timings.append(float(output))
+    return min(timings)
+
+
+def run_import_benchmarks(repeat=5):
+    ''' Import time of test_tools.utils compared to its heavy dependencies '''
+    results = {}
+    for module_name in IMPORTED_MODULES:
+        timing = time_import(module_name, repeat)
+        if timing is not None:
+            results['import:' + module_name] = timing
+    return results
+
+
+@contextmanager
+def use_databases(databases):
+    ''' Replace databases of connections while the block runs '''
+    from django.db import connections
+    from threading import local
+
+    old_databases = connections.databases
+    old_connections = connections._connections
+    connections.databases = databases
+    connections._connections = local()
+    try:
+        yield
+    finally:
+        for connection in connections.all():
+            connection.close()
+        connections.databases = old_databases
+        connections._connections = old_connections
+
+
+def get_sqlite_settings(directory, name, **extra):
+    ''' Settings of SQLite database in directory '''
+    settings = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(directory, name + '.db'),
+        'TEST_NAME': os.path.join(directory, 'test_' + name + '.db'),
+    }
+    settings.update(extra)
+    return settings
+
+
+def get_benchmark_model():
+    ''' Model of synthetic table, Django returns the same class every time '''
+    from django.db import models
+
+    class BenchmarkRow(models.Model):
+        name = models.CharField(max_length=100)
+        number = models.IntegerField()
+        parent = models.ForeignKey('self', null=True)
+
+        class Meta:
+            app_label = 'test_tools'
+            db_table = 'test_tools_benchmark_row'
+
+    return BenchmarkRow
+
+
+def create_table(model, using):
+    ''' Create table of model which is not synced '''
+    from django.core.management.color import no_style
+    from django.db import connections, transaction
+
+    connection = connections[using]
+    cursor = connection.cursor()
+    for sql in connection.creation.sql_create_model(model, no_style())[0]:
+        cursor.execute(sql)
+    transaction.commit_unless_managed(using=using)
+
+
+@contextmanager
+def rolled_back(using):
+    ''' Run the block in transaction which is rolled back like in TestCase '''
+    from django.db import transaction
+
+    transaction.enter_transaction_management(using=using)
+    transaction.managed(True, using=using)
+    try:
+        yield
+    finally:
+        transaction.rollback(using=using)
+        transaction.leave_transaction_management(using=using)
+
+
+def run_model_factory_benchmarks(directory, sizes=SIZES, repeat=3):
+    ''' Time of building, saving and bulk saving objects '''
+    from django.db import DEFAULT_DB_ALIAS
+    from test_tools.utils import model_factory
+
+    model = get_benchmark_model()
+    results = {}
+    with use_databases({DEFAULT_DB_ALIAS: get_sqlite_settings(directory,
+                                                              'factory')}):
+        create_table(model, DEFAULT_DB_ALIAS)
+        for size in sizes:
+            values = {'name': ['name {0}'.format(number)
+                               for number in range(size)],
+                      'number': range(size)}
+            results['model_factory:unsaved:{0}'.format(size)] = measure(
+                lambda: model_factory(model, **values), repeat)
+            for variant, bulk in (('save', False), ('bulk', True)):
+                timings = []
+                for counter in range(repeat):
+                    with rolled_back(DEFAULT_DB_ALIAS):
+                        start = time.time()
+                        model_factory(model, save=True, bulk=bulk, **values)
+                        timings.append(time.time() - start)
+                results['model_factory:{0}:{1}'.format(variant, size)] = \
+                                                                min(timings)
+    return results
+
+
+def run_diff_benchmarks(sizes=SIZES, repeat=3):
+    '''
+    Time of get_diff with every tenth object changed and of has_diff with
+    equal objects, which compares all of them
+    '''
+    from test_tools.utils import model_factory
+
+    model = get_benchmark_model()
+    results = {}
+    for size in sizes:
+        ids = range(1, size + 1)
+        names = ['name {0}'.format(number) for number in ids]
+        expected = model_factory(model, id=ids, name=names, number=ids)
+        changed = model_factory(model, id=ids, name=names,
+            number=[number + (number % 10 == 0) for number in ids])
+        equal = list(model_factory(model, id=ids, name=names, number=ids))
+        results['get_diff:{0}'.format(size)] = measure(
+            lambda: expected.get_diff(changed), repeat)
+        results['get_diff:ordered:{0}'.format(size)] = measure(
+            lambda: expected.get_diff(changed, ordered=True), repeat)
+        results['has_diff:{0}'.format(size)] = measure(
+            lambda: expected.has_diff(equal, fields=True), repeat)
+    return results
+
+
+def create_project(directory, app_count, modules=MODULES_PER_APP,
+                   tests=TESTS_PER_MODULE):
+    ''' Write apps with test packages, return their names '''
+    apps = []
+    methods = ''.join(TEST_METHOD.format(number) for number in range(tests))
+    for number in range(app_count):
+        app_name = '{0}{1}'.format(APP_PREFIX, number)
+        tests_dir = os.path.join(directory, app_name, 'tests')
+        os.makedirs(tests_dir)
+        for path in (os.path.join(directory, app_name, '__init__.py'),
+                     os.path.join(directory, app_name, 'models.py'),
+                     os.path.join(tests_dir, '__init__.py')):
+            open(path, 'w').close()
+        for module in range(modules):
+            with open(os.path.join(tests_dir, 'test_{0}.py'.format(module)),
+                      'w') as module_file:
+                module_file.write(TEST_MODULE.format(module, methods))
+        apps.append(app_name)
+    return apps
+
+
+def forget_project():
+    ''' Remove generated apps from imported modules, so they are loaded again '''
+    for name in list(sys.modules):
+        if name.startswith(APP_PREFIX):
+            del sys.modules[name]
+
+
+def run_build_suite_benchmarks(directory, app_counts=APP_COUNTS, repeat=3):
+    '''
+    Time of building suite of generated project with introspection of all
+    test modules and with discovery index
+    '''
+    from django.conf import settings
+    from django.test.utils import override_settings
+    from test_tools.test_runner import DiscoveryDjangoTestSuiteRunner
+
+    results = {}
+    for app_count in app_counts:
+        project_dir = os.path.join(directory, 'apps_{0}'.format(app_count))
+        sys.path.insert(0, project_dir)
+        apps = tuple(create_project(project_dir, app_count))
+        try:
+            with override_settings(PROJECT_APPS=apps,
+                    INSTALLED_APPS=tuple(settings.INSTALLED_APPS) + apps,
+                    TEST_TOOLS_CACHE_DIR=os.path.join(project_dir,
+                                                      '.test_tools')):
+                for variant, indexed in (('introspect', False),
+                                         ('indexed', True)):
+                    runner = DiscoveryDjangoTestSuiteRunner(verbosity=0,
+                        discovery_index=indexed)
+                    if indexed:
+                        forget_project()
+                        runner.build_suite([])
+                    results['build_suite:{0}:{1}'.format(variant,
+                        app_count)] = measure(
+                            lambda: runner.build_suite([]), repeat,
+                            forget_project)
+        finally:
+            forget_project()
+            sys.path.remove(project_dir)
+    return results
+
+
+def run_setup_databases_benchmarks(directory, alias_counts=ALIAS_COUNTS,
+                                   repeat=3):
+    ''' Time of setup and teardown of databases which have mirrors '''
+    from django.db import DEFAULT_DB_ALIAS
+    from test_tools.test_runner import DiscoveryDjangoTestSuiteRunner
+
+    results = {}
+    for alias_count in alias_counts:
+        databases = {}
+        for number in range(alias_count):
+            alias = DEFAULT_DB_ALIAS if number == 0 else 'db_{0}'.format(
+                                                                    number)
+            databases[alias] = get_sqlite_settings(directory,
+                '{0}_{1}'.format(alias, alias_count))
+            databases['{0}_mirror'.format(alias)] = get_sqlite_settings(
+                directory, '{0}_mirror_{1}'.format(alias, alias_count),
+                TEST_MIRROR=alias)
+        with use_databases(databases):
+            runner = DiscoveryDjangoTestSuiteRunner(verbosity=0)
+            setup_timings = []
+            teardown_timings = []
+            for counter in range(repeat + 1):
+                start = time.time()
+                old_config = runner.setup_databases()
+                setup_timings.append(time.time() - start)
+                start = time.time()
+                runner.teardown_databases(old_config)
+                teardown_timings.append(time.time() - start)
+        # The first run creates database files and states
+        results['setup_databases:{0}'.format(alias_count)] = \
+                                                        min(setup_timings[1:])
+        results['teardown_databases:{0}'.format(alias_count)] = \
+                                                    min(teardown_timings[1:])
+    return results
+
+
+def run_benchmarks(sizes=SIZES, app_counts=APP_COUNTS,
+                   alias_counts=ALIAS_COUNTS, repeat=3, only=None):
+    '''
+    Run benchmarks, only ones with names starting with one of only prefixes
+    if they are given. Return seconds of the best run by benchmark name.
+    '''
+    def selected(name):
+        ''' Check if benchmark is requested '''
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    results = {}
+    directory = tempfile.mkdtemp(prefix='test_tools_benchmark_')
+    try:
+        if selected('import'):
+            results.update(run_import_benchmarks(max(repeat, 5)))
+        if selected('model_factory'):
+            results.update(run_model_factory_benchmarks(directory, sizes,
+                                                        repeat))
+        if selected('get_diff') or selected('has_diff'):
+            results.update(run_diff_benchmarks(sizes, repeat))
+        if selected('build_suite'):
+            results.update(run_build_suite_benchmarks(directory, app_counts,
+                                                      repeat))
+        if selected('setup_databases') or selected('teardown_databases'):
+            results.update(run_setup_databases_benchmarks(directory,
+                                                          alias_counts, repeat))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return dict((name, timing) for name, timing in results.items()
+                if selected(name))
+
+
+def save_results(path, results):
+    ''' Write results with versions they were measured with '''
+    import django
+
+    with open(path, 'w') as results_file:
+        json.dump({'python': sys.version.split()[0],
+                   'django': django.get_version(),
+                   'benchmarks': results}, results_file, indent=2,
+                  sort_keys=True)
+
+
+def load_results(path):
+    ''' Read benchmark results saved by save_results '''
+    with open(path) as results_file:
+        return json.load(results_file)['benchmarks']
+
+
+def compare_results(baseline, results, tolerance=TOLERANCE,
+                    min_difference=MIN_DIFFERENCE):
+    '''
+    Compare results with baseline. Return rows of name, baseline, result
+    and flag which is 'regression' if result is slower than baseline more
+    than by tolerance and min_difference seconds, 'new' or 'missing' if
+    benchmark is not in one of them and empty otherwise.
+    '''
+    rows = []
+    for name in sorted(set(baseline) | set(results)):
+        old = baseline.get(name)
+        new = results.get(name)
+        if old is None:
+            flag = 'new'
+        elif new is None:
+            flag = 'missing'
+        elif new > old * (1 + tolerance) and new - old > min_difference:
+            flag = 'regression'
+        else:
+            flag = ''
+        rows.append((name, old, new, flag))
+    return rows
+
+
+def format_ms(seconds):
+    ''' Seconds as milliseconds for report column '''
+    if seconds is None:
+        return '{0:>10}'.format('-')
+    return '{0:10.2f}'.format(seconds * 1000)
+
+
+def write_results(results, stream=sys.stdout):
+    ''' Print results in milliseconds '''
+    for name in sorted(results):
+        stream.write('{0:<40} {1} ms\n'.format(name,
+                                               format_ms(results[name])))
+
+
+def write_comparison(rows, stream=sys.stdout):
+    ''' Print comparison with ratio of result to baseline '''
+    stream.write('{0:<40} {1:>10} {2:>10} {3:>7}\n'.format('benchmark',
+                                            'base ms', 'new ms', 'ratio'))
+    for name, old, new, flag in rows:
+        ratio = '{0:7.2f}'.format(new / old) if old and new is not None \
+            else '{0:>7}'.format('-')
+        stream.write('{0:<40} {1} {2} {3} {4}'.format(name, format_ms(old),
+                             format_ms(new), ratio, flag).rstrip() + '\n')
+
+
+def parse_numbers(value):
+    ''' Tuple of integers from comma separated string '''
+    return tuple(int(number) for number in value.split(','))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = OptionParser(usage='python -m test_tools.benchmark '
+        '[run] [options]\n       python -m test_tools.benchmark compare '
+        'BASELINE RESULTS [options]')
+    parser.add_option('-o', '--output', dest='output', default=None,
+        help='Save results as JSON to file.')
+    parser.add_option('--repeat', dest='repeat', type='int', default=3,
+        help='Number of runs of every benchmark, the best one is reported.')
+    parser.add_option('--only', dest='only', default=None,
+        help='Run only benchmarks with names starting with one of comma '
+             'separated prefixes, like model_factory,get_diff.')
+    parser.add_option('--sizes', dest='sizes', default=None,
+        help='Comma separated numbers of objects for model_factory and '
+             'diff benchmarks.')
+    parser.add_option('--apps', dest='apps', default=None,
+        help='Comma separated numbers of apps for build_suite benchmark.')
+    parser.add_option('--aliases', dest='aliases', default=None,
+        help='Comma separated numbers of databases for setup_databases '
+             'benchmark.')
+    parser.add_option('--tolerance', dest='tolerance', type='float',
+        default=TOLERANCE,
+        help='Slowdown relative to baseline reported as regression.')
+    options, args = parser.parse_args(argv)
+
+    if args and args[0] == 'compare':
+        if len(args) != 3:
+            parser.error('compare needs baseline and results files')
+        rows = compare_results(load_results(args[1]), load_results(args[2]),
+                               options.tolerance)
+        write_comparison(rows)
+        return 1 if any(row[3] == 'regression' for row in rows) else 0
+    if args and args != ['run']:
+        parser.error('unknown command {0}'.format(args[0]))
+
+    results = run_benchmarks(
+        sizes=parse_numbers(options.sizes) if options.sizes else SIZES,
+        app_counts=parse_numbers(options.apps) if options.apps else APP_COUNTS,
+        alias_counts=parse_numbers(options.aliases) if options.aliases
+            else ALIAS_COUNTS,
+        repeat=options.repeat,
+        only=options.only.split(',') if options.only else None)
+    write_results(results)
+    if options.output:
+        save_results(options.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+''' Files persisted between test runs '''
+
+import json
+import os
+
+from django.conf import settings
+
+CACHE_DIR_NAME = '.test_tools'
+
+
+def get_project_root():
+    ''' Folder with project sources, current folder by default '''
+    try:
+        return os.path.abspath(settings.TEST_TOOLS_PROJECT_ROOT)
+    except AttributeError:
+        return os.getcwd()
+
+
+def get_cache_dir():
+    '''
+    TEST_TOOLS_CACHE_DIR, relative to project root, or .test_tools folder of
+    project root
+    '''
+    return os.path.join(get_project_root(), getattr(settings,
+                        'TEST_TOOLS_CACHE_DIR', CACHE_DIR_NAME))
+
+
+def get_cache_path(name):
+    ''' Absolute path of file in cache directory '''
+    cache_dir = get_cache_dir()
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    return os.path.join(cache_dir, name)
+
+
+def load_json(name, default=None):
+    ''' Read json file from cache, return default if it's missing or broken '''
+    try:
+        with open(get_cache_path(name)) as cache_file:
+            return json.load(cache_file)
+    except (IOError, ValueError):
+        return default
+
+
+def save_json(name, data):
+    ''' Write json file, so concurrent readers never see half of it '''
+    path = get_cache_path(name)
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as cache_file:
+        json.dump(data, cache_file)
+    os.rename(tmp_path, path)
@@ -0,0 +1,213 @@
+''' Data sets built by factories and cached between test runs '''
+
+import inspect
+import cPickle as pickle
+import re
+import zlib
+
+from functools import wraps
+from hashlib import sha1
+from django.core.management.color import no_style
+from django.db import connections, models, transaction, DEFAULT_DB_ALIAS
+from test_tools.cache import get_cache_path
+from test_tools.queries import add_observer, remove_observer
+from test_tools.schema import get_schema_fingerprint
+
+INSERT_RE = re.compile(r'^\s*INSERT\s+INTO\s+["`]?([^\s"`(]+)', re.IGNORECASE)
+# Number of rows inserted by one statement when data set is loaded
+LOAD_BATCH_SIZE = 500
+
+
+def get_tables(connection):
+    ''' Model of every existing table by table name '''
+    existing = set(connection.introspection.table_names())
+    tables = {}
+    for model in models.get_models(include_auto_created=True):
+        opts = model._meta
+        if not opts.proxy and opts.db_table in existing:
+            tables.setdefault(opts.db_table, model)
+    return tables
+
+
+def get_source_key(func, args, kwargs):
+    '''
+    Hash over source of the module with the function and over arguments,
+    so changes of the factory calls give a new key
+    '''
+    try:
+        source = open(inspect.getsourcefile(func)).read()
+    except (IOError, TypeError):
+        source = func.__code__.co_code
+    return sha1(repr((source, func.__name__, args,
+                      sorted(kwargs.items())))).hexdigest()
+
+
+def get_table_state(connection, tables):
+    '''
+    Number of rows and the greatest primary key of every table. Saved rows
+    keep their keys, so they can be loaded only into the same state.
+    '''
+    quote_name = connection.ops.quote_name
+    cursor = connection.cursor()
+    state = []
+    for table in sorted(tables):
+        cursor.execute('SELECT COUNT(*), MAX({0}) FROM {1}'.format(
+            quote_name(tables[table]._meta.pk.column), quote_name(table)))
+        count, last = cursor.fetchone()
+        state.append((table, count, last))
+    return state
+
+
+class TableMarks(object):
+    '''
+    Last primary key of every table with auto increment keys and all the
+    keys of other tables, so rows added later can be found
+    '''
+
+    def __init__(self, connection, tables):
+        self.connection = connection
+        self.tables = tables
+        self.marks = {}
+        cursor = connection.cursor()
+        for table, model in tables.items():
+            pk = model._meta.pk
+            column = connection.ops.quote_name(pk.column)
+            quoted_table = connection.ops.quote_name(table)
+            if isinstance(pk, models.AutoField):
+                cursor.execute('SELECT MAX({0}) FROM {1}'.format(column,
+                                                                 quoted_table))
+                self.marks[table] = cursor.fetchone()[0] or 0
+            else:
+                cursor.execute('SELECT {0} FROM {1}'.format(column,
+                                                            quoted_table))
+                self.marks[table] = set(row[0] for row in cursor.fetchall())
+
+    def get_new_rows(self, table):
+        ''' Column names and rows added to the table since marks were taken '''
+        pk = self.tables[table]._meta.pk
+        mark = self.marks[table]
+        quote_name = self.connection.ops.quote_name
+        sql = 'SELECT * FROM {0}'.format(quote_name(table))
+        params = []
+        if not isinstance(mark, set):
+            sql += ' WHERE {0} > %s'.format(quote_name(pk.column))
+            params.append(mark)
+        cursor = self.connection.cursor()
+        cursor.execute(sql + ' ORDER BY {0}'.format(quote_name(pk.column)),
+                       params)
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        if isinstance(mark, set):
+            index = columns.index(pk.column)
+            rows = [row for row in rows if row[index] not in mark]
+        return columns, [tuple(row) for row in rows]
+
+
+def build_data(func, args, kwargs, connection):
+    '''
+    Call function and collect the rows it added to every table, tables are
+    ordered by their first insert, so foreign keys are loaded after the rows
+    they point to
+    '''
+    tables = get_tables(connection)
+    marks = TableMarks(connection, tables)
+    inserted = []
+
+    def observe(db, sql, params, duration):
+        ''' Remember order of tables by their first insert '''
+        match = INSERT_RE.match(sql)
+        if db.alias == connection.alias and match and \
+                match.group(1) not in inserted:
+            inserted.append(match.group(1))
+
+    add_observer(observe)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        remove_observer(observe)
+
+    ordered = [table for table in inserted if table in tables]
+    ordered.extend(sorted(set(tables) - set(ordered)))
+    data = []
+    for table in ordered:
+        columns, rows = marks.get_new_rows(table)
+        if rows:
+            data.append((table, columns, rows))
+    return data, result
+
+
+def load_data(data, connection):
+    ''' Insert rows of every table by batches and fix sequences '''
+    cursor = connection.cursor()
+    quote_name = connection.ops.quote_name
+    tables = get_tables(connection)
+    for table, columns, rows in data:
+        sql = 'INSERT INTO {0} ({1}) VALUES ({2})'.format(quote_name(table),
+            ', '.join(quote_name(column) for column in columns),
+            ', '.join(['%s'] * len(columns)))
+        for start in range(0, len(rows), LOAD_BATCH_SIZE):
+            cursor.executemany(sql, rows[start:start + LOAD_BATCH_SIZE])
+    for sql in connection.ops.sequence_reset_sql(no_style(),
+            [tables[table] for table, columns, rows in data]):
+        cursor.execute(sql)
+    transaction.commit_unless_managed(using=connection.alias)
+
+
+def read_dataset(path):
+    ''' Key, rows and result saved to file or None if it can't be read '''
+    try:
+        with open(path, 'rb') as dataset_file:
+            return pickle.loads(zlib.decompress(dataset_file.read()))
+    except Exception:
+        return None
+
+
+def write_dataset(path, dataset):
+    ''' Save key, rows and result to compressed file '''
+    with open(path, 'wb') as dataset_file:
+        dataset_file.write(zlib.compress(pickle.dumps(dataset,
+                                                      pickle.HIGHEST_PROTOCOL)))
+
+
+def cached_dataset(func=None, using=DEFAULT_DB_ALIAS):
+    '''
+    Decorator for function which builds data with model_factory. Rows added
+    by the first call are saved to cache directory together with the result
+    of the function, next runs insert the rows in batches and return the
+    saved result without calling the function::
+
+        @cached_dataset
+        def create_orders(count):
+            users = model_factory(User, username=get_fake_email(count),
+                                  save=True, bulk=True)
+            return model_factory(Order, user=users, save=True, bulk=True)
+
+    Cache is rebuilt if the module of the function, arguments or models are
+    changed. The result must be picklable. Only inserted rows are cached,
+    changes of rows which existed before the call are not. Rows are saved
+    with their primary keys, so they are cached for number of rows and the
+    greatest key of every table before the call, the function is called
+    again if tables hold other rows.
+    '''
+    if func is None:
+        return lambda func: cached_dataset(func, using)
+
+    @wraps(func)
+    def _wrapper(*args, **kwargs):
+        ''' Load data from cache or build it '''
+        connection = connections[using]
+        state = repr(get_table_state(connection, get_tables(connection)))
+        key = sha1(get_source_key(func, args, kwargs) +
+                   get_schema_fingerprint(connection) + state).hexdigest()
+        path = get_cache_path('dataset-{0}.{1}-{2}.pickle'.format(
+            func.__module__, func.__name__, sha1(repr((args,
+                sorted(kwargs.items()), state))).hexdigest()[:12]))
+        dataset = read_dataset(path)
+        if dataset is not None and dataset['key'] == key:
+            load_data(dataset['tables'], connection)
+            return dataset['result']
+
+        tables, result = build_data(func, args, kwargs, connection)
+        write_dataset(path, {'key': key, 'tables': tables, 'result': result})
+        return result
+    return _wrapper
@@ -0,0 +1,160 @@
+''' Index of test modules which allows to skip their introspection '''
+
+import inspect
+import os
+import sys
+
+from django.utils import unittest
+from django.utils.unittest.loader import defaultTestLoader
+from django.utils.importlib import import_module
+from test_tools.cache import load_json, save_json
+
+
+def iter_tests(suite):
+    ''' Flatten nested suites '''
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for sub_test in iter_tests(test):
+                yield sub_test
+        else:
+            yield test
+
+
+def get_stat(path):
+    ''' Modification time and size of file '''
+    stat = os.stat(path)
+    return [stat.st_mtime, stat.st_size]
+
+
+def get_source_path(module):
+    ''' Path of source file of module or None if module has no file '''
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return None
+    return os.path.abspath(os.path.splitext(path)[0] + '.py')
+
+
+class DiscoveryIndex(object):
+    '''
+    Test names of apps and test modules. Names are valid while files of
+    app or module and files of test classes with their bases have the same
+    modification time and size, so tests are created without introspection
+    and only modules of test classes are imported.
+    '''
+
+    def __init__(self, name='discovery.json'):
+        self.name = name
+        data = load_json(name, {})
+        self.modules = data.get('modules', {})
+        self.apps = data.get('apps', {})
+        self.changed = False
+
+    def save(self):
+        ''' Write index if some entry was changed '''
+        if self.changed:
+            save_json(self.name, {'modules': self.modules, 'apps': self.apps})
+            self.changed = False
+
+    def is_fresh(self, entry):
+        ''' Check that files of module and its test classes are the same '''
+        try:
+            for path, stat in entry['files'].items():
+                if get_stat(path) != stat:
+                    return False
+        except OSError:
+            return False
+        return entry['tests'] is not None
+
+    def get_entry(self, paths, label, suite):
+        '''
+        Build index entry from loaded suite. Tests are saved as module,
+        class and method names, so classes imported from other modules are
+        created from their own modules.
+        '''
+        files = dict((path, get_stat(path)) for path in paths)
+        tests = []
+        for test in iter_tests(suite):
+            klass = test.__class__
+            method_name = getattr(test, '_testMethodName', '')
+            module = sys.modules.get(klass.__module__)
+            if getattr(module, klass.__name__, None) is not klass or \
+                    test.id() != '.'.join([klass.__module__, klass.__name__,
+                                           method_name]):
+                # Doctests, custom load_tests and classes which can't be
+                # found by name aren't cached
+                tests = None
+                break
+            tests.append([klass.__module__, klass.__name__, method_name])
+            for base in inspect.getmro(klass):
+                try:
+                    source = inspect.getsourcefile(base)
+                except TypeError:
+                    continue
+                if source and source not in files:
+                    files[source] = get_stat(source)
+        return {'label': label, 'files': files, 'tests': tests}
+
+    def set_entry(self, entries, name, entry):
+        ''' Save entry, mark index as changed only if entry differs '''
+        if entries.get(name) != entry:
+            entries[name] = entry
+            self.changed = True
+
+    def build_suite(self, tests):
+        ''' Create tests from names without introspection '''
+        suite = unittest.TestSuite()
+        for module_name, class_name, method_name in tests:
+            klass = getattr(import_module(module_name), class_name)
+            suite.addTest(klass(method_name))
+        return suite
+
+    def load_module(self, module_name, path, label):
+        ''' Load tests from module, use index if module wasn't changed '''
+        entry = self.modules.get(module_name)
+        if entry is not None and self.is_fresh(entry):
+            return self.build_suite(entry['tests'])
+        suite = defaultTestLoader.loadTestsFromModule(
+                                                import_module(module_name))
+        self.set_entry(self.modules, module_name,
+                       self.get_entry([path], label, suite))
+        return suite
+
+    def load_app(self, app_name):
+        '''
+        Create tests of app from index without importing its models and
+        test modules. Return None if app isn't in index or was changed.
+        '''
+        entry = self.apps.get(app_name)
+        if entry is None or not self.is_fresh(entry):
+            return None
+        return self.build_suite(entry['tests'])
+
+    def add_app(self, app_name, paths, suite):
+        '''
+        Save tests of app. Paths are files and folders of app which add or
+        remove tests when they are changed.
+        '''
+        self.set_entry(self.apps, app_name,
+                       self.get_entry(paths, app_name, suite))
+
+    def find(self, test_label):
+        '''
+        Resolve label like app.module.Class.method to suite. Only modules of
+        test classes of the label are imported. Return None if label is not
+        in index or any module of the label was changed.
+        '''
+        tests = []
+        for module_name, entry in sorted(self.modules.items()):
+            label = entry['label']
+            if test_label != label and \
+                    not test_label.startswith(label + '.') and \
+                    not label.startswith(test_label + '.'):
+                continue
+            if not self.is_fresh(entry):
+                return None
+            tests.extend(test for test in entry['tests']
+                         if '.'.join([label] + test[1:] + ['']).startswith(
+                                                        test_label + '.'))
+        if not tests:
+            return None
+        return self.build_suite(tests)
@@ -0,0 +1,108 @@
+''' Schema of migrated database loaded into test databases at once '''
+
+import os
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.core.management.sql import emit_post_sync_signal
+from django.db import models, transaction
+from test_tools.datasets import get_tables, load_data
+from test_tools.schema import MIGRATION_TABLES, get_table_rows
+
+
+def get_pg_command(connection, program, *args):
+    ''' Command line and environment of PostgreSQL client for database '''
+    settings_dict = connection.settings_dict
+    command = [program]
+    if settings_dict['USER']:
+        command += ['-U', settings_dict['USER']]
+    if settings_dict['HOST']:
+        command += ['-h', settings_dict['HOST']]
+    if settings_dict['PORT']:
+        command += ['-p', str(settings_dict['PORT'])]
+    command += list(args) + [settings_dict['NAME']]
+    env = dict(os.environ)
+    if settings_dict['PASSWORD']:
+        env['PGPASSWORD'] = settings_dict['PASSWORD']
+    return command, env
+
+
+def dump_schema(connection):
+    '''
+    DDL script of tables of models with their indexes and rows of migration
+    tables, None if database is not supported
+    '''
+    existing = get_tables(connection)
+    if connection.vendor == 'sqlite':
+        cursor = connection.cursor()
+        cursor.execute("SELECT tbl_name, sql FROM sqlite_master WHERE sql IS "
+                       "NOT NULL ORDER BY rowid")
+        script = ''.join(sql + ';\n' for table, sql in cursor.fetchall()
+                         if table in existing)
+    elif connection.vendor == 'postgresql' and existing:
+        tables = []
+        for table in sorted(existing):
+            tables += ['--table', connection.ops.quote_name(table)]
+        command, env = get_pg_command(connection, 'pg_dump', '--schema-only',
+                                      '--no-owner', '--no-privileges', *tables)
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                       env=env)
+        except OSError:
+            return None
+        script = process.communicate()[0]
+        if process.returncode:
+            return None
+    else:
+        return None
+
+    tables = []
+    for table in MIGRATION_TABLES:
+        if table in existing:
+            columns, rows = get_table_rows(connection, table)
+            tables.append((table, columns, rows))
+    return {'script': script, 'tables': tables}
+
+
+def is_schema_loaded(command):
+    '''
+    Check if schema dump is loaded instead of calling command on test
+    databases, it's enabled with TEST_TOOLS_LOAD_SCHEMA setting
+    '''
+    return command == 'migrate' and \
+        getattr(settings, 'TEST_TOOLS_LOAD_SCHEMA', False)
+
+
+def drop_tables(connection):
+    ''' Remove tables of models with their indexes and sequences '''
+    cursor = connection.cursor()
+    cascade = ' CASCADE' if connection.vendor == 'postgresql' else ''
+    for table in get_tables(connection):
+        cursor.execute('DROP TABLE IF EXISTS {0}{1}'.format(
+                                    connection.ops.quote_name(table), cascade))
+    transaction.commit_unless_managed(using=connection.alias)
+
+
+def load_schema(connection, schema):
+    '''
+    Replace tables of database with the dump in one script, copy rows of
+    migration tables and send post_syncdb like syncdb does for new tables,
+    so content types, permissions and sites are created
+    '''
+    drop_tables(connection)
+    if connection.vendor == 'sqlite':
+        connection.cursor()
+        connection.connection.executescript(schema['script'])
+    else:
+        command, env = get_pg_command(connection, 'psql', '--quiet',
+            '--single-transaction', '--set', 'ON_ERROR_STOP=1')
+        process = subprocess.Popen(command, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+        errors = process.communicate(schema['script'])[1]
+        if process.returncode:
+            raise CommandError('Loading schema into {0} failed: {1}'.format(
+                                    connection.settings_dict['NAME'], errors))
+    load_data(schema['tables'], connection)
+    emit_post_sync_signal(set(models.get_models(include_auto_created=True)),
+                          0, False, connection.alias)
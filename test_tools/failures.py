@@ -0,0 +1,108 @@
+''' Tests which failed in previous runs '''
+
+import re
+
+from django.test import TestCase
+from django.utils import unittest
+from test_tools.cache import load_json, save_json
+from test_tools.listeners import TestListener
+
+FAILURES_FILE = 'failures.json'
+# Errors of class and module fixtures are reported with ids like
+# 'setUpClass (app.tests.UserTest)'
+FIXTURE_ERROR_RE = re.compile(r'^\w+ \((.+)\)$')
+
+
+def load_failures():
+    ''' Ids of tests which failed or raised error last time they were run '''
+    return set(load_json(FAILURES_FILE, []))
+
+
+def is_failed(test_id, failures):
+    ''' Check if test or its class or module failed '''
+    if test_id in failures:
+        return True
+    return any(test_id.startswith(failure + '.') for failure in failures)
+
+
+def was_run(failure, run):
+    ''' Check if test or any test of failed fixture was run '''
+    match = FIXTURE_ERROR_RE.match(failure)
+    if match:
+        return any(is_failed(test_id, [match.group(1)]) for test_id in run)
+    return failure in run
+
+
+def get_failed_ids(failures):
+    ''' Test ids and prefixes of test ids of failed fixtures '''
+    ids = set()
+    for failure in failures:
+        match = FIXTURE_ERROR_RE.match(failure)
+        ids.add(match.group(1) if match else failure)
+    return ids
+
+
+def order_failed_first(suite, failures, only=False):
+    '''
+    Move classes with failed tests to the beginning of suite or leave only
+    failed tests. Tests of every class stay together in their order, so
+    class fixtures run once. Tests which are not django TestCase stay after
+    the ones which are, as reorder_suite left them.
+    '''
+    failed_ids = get_failed_ids(failures)
+    tests = list(suite)
+    failed = [is_failed(test.id(), failed_ids) for test in tests]
+    failed_classes = set(test.__class__ for test, test_failed
+                         in zip(tests, failed) if test_failed)
+    class_positions = {}
+    keyed = []
+    for position, test in enumerate(tests):
+        klass = test.__class__
+        class_position = class_positions.setdefault(klass, position)
+        if failed[position] or not only:
+            keyed.append(((not isinstance(test, TestCase),
+                           klass not in failed_classes, class_position,
+                           position), test))
+    keyed.sort(key=lambda item: item[0])
+    return unittest.TestSuite([test for key, test in keyed])
+
+
+class FailureListener(TestListener):
+    '''
+    Remember ids of failed and errored tests. Failures of tests which were
+    not run are kept, tests which passed are removed.
+    '''
+
+    def __init__(self):
+        self.run = set()
+        self.failures = set()
+
+    def startTestRun(self):
+        self.run = set()
+        self.failures = set()
+
+    def beforeTest(self, test):
+        self.run.add(test.id())
+
+    def addError(self, test, err):
+        self.failures.add(test.id())
+
+    def addFailure(self, test, err):
+        self.failures.add(test.id())
+
+    def addUnexpectedSuccess(self, test):
+        self.failures.add(test.id())
+
+    def get_data(self):
+        return self.run, self.failures
+
+    def merge_data(self, data):
+        run, failures = data
+        self.run.update(run)
+        self.failures.update(failures)
+
+    def stopTestRun(self):
+        failures = set(failure for failure in load_failures()
+                       if not was_run(failure, self.run))
+        failures.update(self.failures)
+        save_json(FAILURES_FILE, sorted(failures))
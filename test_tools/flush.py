@@ -0,0 +1,132 @@
+''' Flushing only tables written by tests instead of the whole database '''
+
+import re
+
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.test import testcases
+from test_tools.datasets import get_tables
+from test_tools.queries import add_observer, remove_observer
+from test_tools.schema import get_checksum, get_table_rows
+from test_tools.utils import reset_site_cache
+
+WRITE_RE = re.compile(r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|'
+                      r'UPDATE|DELETE\s+FROM)\s+["`]?([^\s"`(,;]+)',
+                      re.IGNORECASE)
+# Statements which don't change data of tables
+READ_RE = re.compile(r'^\s*(?:SELECT|SAVEPOINT|RELEASE|ROLLBACK|COMMIT|BEGIN|'
+                     r'SET|SHOW|PRAGMA|EXPLAIN|DESCRIBE)\b', re.IGNORECASE)
+
+
+class DirtyTableFlusher(object):
+    '''
+    Replace flush of TransactionTestCase by reset of tables which were
+    written since the previous flush. The first flush of every database is
+    the full one, rows it leaves, like content types or initial data, are
+    saved. Later only written tables are emptied, saved rows are inserted
+    back and sequences are reset, so tables are the same as after the full
+    flush. Statements which are not recognized cause the full flush.
+
+    With verify every table is compared with the full flush result after
+    reset and AssertionError lists the tables which differ.
+    '''
+
+    def __init__(self, verify=False):
+        self.verify = verify
+        self.baselines = {}
+        self.dirty = {}
+        self.unknown = set()
+        self.original_call_command = None
+
+    def observe(self, db, sql, params, duration):
+        ''' Remember tables written by the query '''
+        match = WRITE_RE.match(sql)
+        if match:
+            self.dirty.setdefault(db.alias, set()).add(match.group(1))
+        elif not READ_RE.match(sql):
+            self.unknown.add(db.alias)
+
+    def call_command(self, name, *args, **options):
+        ''' Replace flush command of test cases '''
+        if name != 'flush':
+            return self.original_call_command(name, *args, **options)
+        self.flush(options.get('database'), *args, **options)
+
+    def install(self):
+        ''' Start tracking written tables and replace flush of tests '''
+        add_observer(self.observe)
+        self.original_call_command = testcases.call_command
+        testcases.call_command = self.call_command
+
+    def uninstall(self):
+        ''' Stop tracking and restore flush '''
+        testcases.call_command = self.original_call_command
+        remove_observer(self.observe)
+
+    def flush(self, db, *args, **options):
+        ''' Reset written tables of database or flush it completely '''
+        if db not in self.baselines or db in self.unknown:
+            self.original_call_command('flush', *args, **options)
+            self.baselines[db] = self.get_baseline(connections[db])
+        else:
+            self.reset(connections[db], self.dirty.get(db, set()))
+        self.dirty.pop(db, None)
+        self.unknown.discard(db)
+
+    def get_baseline(self, connection):
+        ''' Columns, rows and checksum of every table after full flush '''
+        baseline = {}
+        for table in connection.introspection.django_table_names(
+                                                        only_existing=True):
+            columns, rows = get_table_rows(connection, table)
+            baseline[table] = (columns, rows, get_checksum(rows))
+        return baseline
+
+    def reset(self, connection, tables):
+        ''' Make tables the same as after the full flush '''
+        from django.contrib.sites.models import Site
+
+        baseline = self.baselines[connection.alias]
+        tables = sorted(table for table in tables if table in baseline)
+        if tables:
+            quote_name = connection.ops.quote_name
+            cursor = connection.cursor()
+            mysql = connection.vendor == 'mysql'
+            if mysql:
+                cursor.execute('SET FOREIGN_KEY_CHECKS = 0')
+            for table in tables:
+                cursor.execute('DELETE FROM {0}'.format(quote_name(table)))
+            for table in tables:
+                columns, rows, checksum = baseline[table]
+                if rows:
+                    cursor.executemany('INSERT INTO {0} ({1}) VALUES ({2})'
+                        .format(quote_name(table),
+                                ', '.join(quote_name(name)
+                                          for name in columns),
+                                ', '.join(['%s'] * len(columns))), rows)
+            if mysql:
+                cursor.execute('SET FOREIGN_KEY_CHECKS = 1')
+                for table in tables:
+                    cursor.execute('ALTER TABLE {0} AUTO_INCREMENT = 1'
+                                   .format(quote_name(table)))
+            models = get_tables(connection)
+            for sql in connection.ops.sequence_reset_sql(no_style(),
+                    [models[table] for table in tables if table in models]):
+                cursor.execute(sql)
+            transaction.commit_unless_managed(using=connection.alias)
+            if Site._meta.db_table in tables:
+                # Flushed Site is created again only by post_syncdb
+                reset_site_cache(connection.alias)
+        if self.verify:
+            self.check(connection)
+
+    def check(self, connection):
+        ''' Compare all the tables with the result of full flush '''
+        baseline = self.baselines[connection.alias]
+        differ = []
+        for table, (columns, rows, checksum) in sorted(baseline.items()):
+            if get_checksum(get_table_rows(connection, table)[1]) != checksum:
+                differ.append(table)
+        if differ:
+            raise AssertionError('Tables differ from flushed database: '
+                                 '{0}'.format(', '.join(differ)))
@@ -0,0 +1,205 @@
+''' Selecting tests affected by changed source files '''
+
+import os
+import subprocess
+import sys
+import threading
+
+from django.utils import unittest
+from test_tools.cache import get_project_root, load_json, save_json
+from test_tools.listeners import TestListener
+
+IMPACT_FILE = 'impact.json'
+EXTERNAL_DIRS = ('site-packages', 'dist-packages')
+
+
+def get_source_path(filename, root):
+    ''' Path of python source relative to root or None if it's external '''
+    filename = os.path.abspath(filename)
+    if filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+    if not filename.startswith(root + os.sep) or \
+            any(name in filename.split(os.sep) for name in EXTERNAL_DIRS):
+        return None
+    return os.path.relpath(filename, root)
+
+
+def load_impact_map():
+    '''
+    Files executed by every test and files imported during the run. The map
+    is stored as a list of files and their indexes to keep it compact.
+    '''
+    data = load_json(IMPACT_FILE, {})
+    files = data.get('files', [])
+    tests = dict((test_id, set(files[index] for index in indexes))
+                 for test_id, indexes in data.get('tests', {}).items())
+    imported = set(files[index] for index in data.get('imported', []))
+    return tests, imported
+
+
+def save_impact_map(tests, imported):
+    ''' Merge files of tests from the run into saved map '''
+    saved_tests, saved_imported = load_impact_map()
+    saved_tests.update(tests)
+    saved_imported.update(imported)
+
+    files = sorted(saved_imported.union(*saved_tests.values()))
+    indexes = dict((path, index) for index, path in enumerate(files))
+    save_json(IMPACT_FILE, {
+        'files': files,
+        'tests': dict((test_id, sorted(indexes[path] for path in paths))
+                      for test_id, paths in saved_tests.items()),
+        'imported': sorted(indexes[path] for path in saved_imported),
+    })
+
+
+def get_changed_files(changed=None, since=None):
+    '''
+    Paths relative to project root from comma separated list or from git
+    diff of working tree against revision
+    '''
+    root = get_project_root()
+    paths = []
+    if changed:
+        paths.extend(os.path.abspath(path) for path in changed.split(','))
+    if since:
+        git_root = subprocess.Popen(['git', 'rev-parse', '--show-toplevel'],
+            stdout=subprocess.PIPE, cwd=root).communicate()[0].strip()
+        output = subprocess.Popen(['git', 'diff', '--name-only', since],
+            stdout=subprocess.PIPE, cwd=root).communicate()[0]
+        paths.extend(os.path.join(git_root, path)
+                     for path in output.splitlines() if path)
+        # New files are not in diff until they are added to index
+        output = subprocess.Popen(['git', 'ls-files', '--others',
+            '--exclude-standard', '--full-name'],
+            stdout=subprocess.PIPE, cwd=root).communicate()[0]
+        paths.extend(os.path.join(git_root, path)
+                     for path in output.splitlines() if path)
+    return set(os.path.relpath(path, root) for path in paths)
+
+
+def get_impacted_tests(changed_files):
+    '''
+    Ids of tests which executed any of changed files, None if all the tests
+    could be affected. Tests without recorded files are not in the map.
+    '''
+    tests, imported = load_impact_map()
+    used = set().union(*tests.values())
+    impacted = set()
+    for path in changed_files:
+        # Files which are not python or are executed only on import, like
+        # settings or constants, could affect any test
+        if not path.endswith('.py') or (path in imported and
+                                        path not in used):
+            return None, tests
+        impacted.update(test_id for test_id, paths in tests.items()
+                        if path in paths)
+    return impacted, tests
+
+
+def select_impacted(suite, changed_files):
+    ''' Leave tests affected by changes and tests without recorded data '''
+    impacted, tests = get_impacted_tests(changed_files)
+    if impacted is None:
+        return suite
+    return unittest.TestSuite([test for test in suite
+        if test.id() in impacted or test.id() not in tests])
+
+
+class ImpactListener(TestListener):
+    '''
+    Record project files executed by every test. Only function calls are
+    traced, so recording is much cheaper than line coverage. Tracer which
+    was set before, e.g. coverage, keeps working. Files executed by setup
+    and teardown of class or module are recorded for every its test.
+    '''
+
+    def __init__(self, root=None):
+        self.root = root or get_project_root()
+        self.paths = {}
+        self.tests = {}
+        self.fixtures = {}
+        # Files of every started tracing, fixtures of modules can be
+        # notified inside of fixtures of classes
+        self.executed = []
+        self.previous_trace = None
+
+    def trace(self, frame, event, arg):
+        ''' Global trace function which remembers files of called code '''
+        if event == 'call':
+            filename = frame.f_code.co_filename
+            try:
+                path = self.paths[filename]
+            except KeyError:
+                path = self.paths[filename] = get_source_path(filename,
+                                                              self.root)
+            if path is not None:
+                for executed in self.executed:
+                    executed.add(path)
+        if self.previous_trace is not None:
+            return self.previous_trace(frame, event, arg)
+        return None
+
+    def start_tracing(self):
+        ''' Record files executed from now on, tracings can be nested '''
+        if not self.executed:
+            self.previous_trace = sys.gettrace()
+            threading.settrace(self.trace)
+            sys.settrace(self.trace)
+        self.executed.append(set())
+
+    def stop_tracing(self):
+        '''
+        Return files executed since the last start, restore previous tracer
+        when the outermost tracing is stopped
+        '''
+        executed = self.executed.pop()
+        if not self.executed:
+            sys.settrace(self.previous_trace)
+            threading.settrace(self.previous_trace)
+            self.previous_trace = None
+        return executed
+
+    def startTestRun(self):
+        self.tests = {}
+        self.fixtures = {}
+
+    def beforeTest(self, test):
+        self.start_tracing()
+
+    def afterTest(self, test):
+        self.tests[test.id()] = self.stop_tracing()
+
+    def beforeFixture(self, name):
+        self.start_tracing()
+
+    def fixture(self, name, duration):
+        # Fixture names are class or module id with method name
+        owner = name.rsplit('.', 1)[0]
+        self.fixtures.setdefault(owner, set()).update(self.stop_tracing())
+
+    def get_tests(self):
+        ''' Files of tests with files of fixtures of their class and module '''
+        tests = {}
+        for test_id, paths in self.tests.items():
+            class_id = test_id.rsplit('.', 1)[0]
+            module_name = class_id.rsplit('.', 1)[0]
+            tests[test_id] = paths.union(self.fixtures.get(class_id, ()),
+                                         self.fixtures.get(module_name, ()))
+        return tests
+
+    def get_data(self):
+        return self.get_tests()
+
+    def merge_data(self, data):
+        self.tests.update(data)
+
+    def stopTestRun(self):
+        imported = set()
+        for module in sys.modules.values():
+            filename = getattr(module, '__file__', None)
+            if filename:
+                path = get_source_path(filename, self.root)
+                if path is not None:
+                    imported.add(path)
+        save_impact_map(self.get_tests(), imported)
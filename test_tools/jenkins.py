@@ -0,0 +1,67 @@
+''' Discovery runner for django_jenkins '''
+
+import os
+
+from django.utils.unittest import TextTestRunner
+from django_jenkins import signals
+from django_jenkins.runner import CITestSuiteRunner, XMLTestResult
+from test_tools.test_runner import DiscoveryDjangoTestSuiteRunner
+
+
+class StreamedXMLTestResult(XMLTestResult):
+    '''
+    Result which doesn't keep tests for JUnit report and doesn't write it,
+    the report is streamed while tests run
+    '''
+
+    def stopTest(self, test):
+        # Info and output of test aren't kept, so buffers may be disabled
+        super(XMLTestResult, self).stopTest(test)
+
+    def dump_xml(self, output_dir):
+        pass
+
+
+class StreamedJUnitCITestSuiteRunner(CITestSuiteRunner):
+    '''
+    CI runner which doesn't collect results of the whole run and
+    doesn't write JUnit report after it if the report is streamed.
+    Other reports of django_jenkins are written as usual.
+    '''
+    streamed_junit = False
+
+    def __init__(self, *args, **kwargs):
+        # Output of tests isn't captured in debug mode of django_jenkins
+        self.buffer = not kwargs.get('debug', False)
+        super(StreamedJUnitCITestSuiteRunner, self).__init__(*args, **kwargs)
+
+    def run_suite(self, suite, **kwargs):
+        if not self.streamed_junit:
+            return super(StreamedJUnitCITestSuiteRunner, self).run_suite(
+                                                            suite, **kwargs)
+        signals.before_suite_run.send(sender=self)
+        result = TextTestRunner(buffer=self.buffer,
+                                resultclass=StreamedXMLTestResult,
+                                verbosity=self.verbosity).run(suite)
+        signals.after_suite_run.send(sender=self)
+        return result
+
+
+class JenkinsDiscoveryDjangoTestSuiteRunner(DiscoveryDjangoTestSuiteRunner,
+                                            StreamedJUnitCITestSuiteRunner):
+    '''
+    The same as DiscoveryDjangoTestSuiteRunner but for jenkins. Every
+    shard writes reports to its own folder, so they can be merged.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(JenkinsDiscoveryDjangoTestSuiteRunner, self).__init__(*args,
+                                                                    **kwargs)
+        if self.shard:
+            self.output_dir = os.path.join(self.output_dir,
+                                'shard_{0}_of_{1}'.format(*self.shard))
+        if self.options.junit_xml is None and self.with_reports:
+            # Report is streamed instead of written after the whole run
+            self.options.junit_xml = os.path.join(self.output_dir,
+                                                  'junit.xml')
+            self.streamed_junit = True
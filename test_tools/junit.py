@@ -0,0 +1,211 @@
+''' JUnit XML report written while tests run '''
+
+import os
+import re
+import time
+import traceback
+
+from xml.sax.saxutils import escape, quoteattr
+from django.utils import unittest
+from django.utils.encoding import force_unicode
+from test_tools.discovery import iter_tests
+from test_tools.failures import FIXTURE_ERROR_RE
+from test_tools.listeners import ResultProxy
+
+HEADER = '<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n'
+FOOTER = '</testsuites>\n'
+# Characters which are not allowed in XML documents
+INVALID_XML_RE = re.compile(
+    u'[^\u0009\u000a\u000d\u0020-\ud7ff\ue000-\ufffd]')
+
+
+def clean_text(value):
+    ''' Unicode text without characters which are not allowed in XML '''
+    return INVALID_XML_RE.sub(u'\ufffd', force_unicode(value,
+                                                     errors='replace'))
+
+
+def get_test_names(test):
+    '''
+    Class and method names of test. Errors of class and module fixtures
+    are reported as tests named after the fixture.
+    '''
+    match = FIXTURE_ERROR_RE.match(test.id())
+    if match:
+        return match.group(1), test.id().split(' ')[0]
+    klass = type(test)
+    return ('{0}.{1}'.format(klass.__module__, klass.__name__),
+            getattr(test, '_testMethodName', test.id().rsplit('.', 1)[-1]))
+
+
+def format_error(err):
+    ''' Last line of exception as message and the whole traceback '''
+    text = ''.join(traceback.format_exception(*err))
+    lines = [line for line in text.splitlines() if line.strip()]
+    return lines[-1] if lines else '', text
+
+
+class ClassReport(object):
+    ''' Testcase elements of one class kept until the class is written '''
+
+    def __init__(self, name):
+        self.name = name
+        self.cases = []
+        self.counts = {}
+        self.duration = 0
+
+    def add(self, case, duration, kind=None):
+        self.cases.append(case)
+        self.duration += duration
+        if kind is not None:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def render(self):
+        ''' Testsuite element encoded for the file '''
+        return u''.join([u'  <testsuite name={0} tests="{1}" failures="{2}" '
+            u'errors="{3}" skipped="{4}" time="{5:.3f}">\n'.format(
+                quoteattr(clean_text(self.name)), len(self.cases),
+                self.counts.get('failure', 0), self.counts.get('error', 0),
+                self.counts.get('skipped', 0), self.duration)] +
+            self.cases + [u'  </testsuite>\n']).encode('utf-8')
+
+
+class JUnitXMLWriter(object):
+    '''
+    Write JUnit XML report test by test instead of collecting results of
+    the whole run. Tests of a class are kept until all the tests of the
+    class expected in the suite are reported, then they are written as one
+    testsuite element when the next test starts and the file is flushed,
+    so tests of classes run by parallel workers at the same time are
+    merged. The closing tag is written after every class and replaced by
+    the next one, so the file is a valid document even if the run is
+    killed. Classes which are not finished are written on close.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.output = None
+        self.end = 0
+        self.started = {}
+        self.outcomes = {}
+        self.expected = {}
+        self.classes = {}
+        self.order = []
+
+    def expect(self, suite):
+        ''' Count tests of every class which will be reported '''
+        for test in iter_tests(suite):
+            class_name = get_test_names(test)[0]
+            self.expected[class_name] = self.expected.get(class_name, 0) + 1
+
+    def open(self):
+        ''' Create report without tests '''
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.output = open(self.path, 'wb')
+        self.output.write(HEADER + FOOTER)
+        self.output.flush()
+        self.end = len(HEADER)
+
+    def close(self):
+        ''' Write tests of all the kept classes and close the file '''
+        if self.output is not None:
+            for class_name in list(self.order):
+                self.write_class(class_name)
+            self.output.close()
+            self.output = None
+
+    def startTest(self, test):
+        for class_name in list(self.order):
+            if self.expected.get(class_name, 1) <= 0:
+                self.write_class(class_name)
+        self.started[test.id()] = time.time()
+
+    def stopTest(self, test):
+        started = self.started.pop(test.id(), None)
+        self.add_case(test, time.time() - started if started else 0,
+                      *self.outcomes.pop(test.id(), (None, None, None)))
+        class_name = get_test_names(test)[0]
+        if class_name in self.expected:
+            self.expected[class_name] -= 1
+
+    def add_outcome(self, test, kind, message=None, text=None):
+        ''' Remember outcome for test, errors of fixtures are added at once '''
+        if test.id() in self.started:
+            self.outcomes[test.id()] = (kind, message, text)
+        else:
+            self.add_case(test, 0, kind, message, text)
+
+    def addSuccess(self, test):
+        pass
+
+    def addError(self, test, err):
+        self.add_outcome(test, 'error', *format_error(err))
+
+    def addFailure(self, test, err):
+        self.add_outcome(test, 'failure', *format_error(err))
+
+    def addSkip(self, test, reason):
+        self.add_outcome(test, 'skipped', reason)
+
+    def addExpectedFailure(self, test, err):
+        pass
+
+    def addUnexpectedSuccess(self, test):
+        self.add_outcome(test, 'error', 'Unexpected success')
+
+    def add_case(self, test, duration, kind=None, message=None, text=None):
+        ''' Add testcase element to report of class of test '''
+        class_name, name = get_test_names(test)
+        if class_name not in self.classes:
+            self.classes[class_name] = ClassReport(class_name)
+            self.order.append(class_name)
+        case = u'    <testcase classname={0} name={1} time="{2:.3f}"'.format(
+            quoteattr(clean_text(class_name)), quoteattr(clean_text(name)),
+            duration)
+        if kind is None:
+            case += u'/>\n'
+        else:
+            case += u'>\n      <{0}'.format(kind)
+            if message is not None:
+                case += u' message={0}'.format(quoteattr(clean_text(message)))
+            case += u'>{0}</{1}>\n    </testcase>\n'.format(
+                escape(clean_text(text or '')), kind)
+        self.classes[class_name].add(case, duration, kind)
+
+    def write_class(self, class_name):
+        ''' Write testsuite of kept tests, then the closing tag and flush '''
+        suite = self.classes.pop(class_name).render()
+        self.order.remove(class_name)
+        self.output.seek(self.end)
+        # One write, so the file is never left without the closing tag
+        self.output.write(suite + FOOTER)
+        self.output.flush()
+        self.end += len(suite)
+
+
+class ReportResultProxy(ResultProxy):
+    ''' Pass starts and stops of tests to the writer too '''
+
+    OUTCOMES = ResultProxy.OUTCOMES + ('startTest', 'stopTest')
+
+
+class ReportedTestSuite(unittest.TestSuite):
+    '''
+    Run suite with result which passes tests to the report writer, so
+    report is written in the main process with any runner and result
+    '''
+
+    def __init__(self, suite, writer):
+        super(ReportedTestSuite, self).__init__([suite])
+        self.writer = writer
+
+    def run(self, result):
+        self.writer.expect(self._tests[0])
+        self.writer.open()
+        try:
+            self._tests[0](ReportResultProxy(result, [self.writer]))
+        finally:
+            self.writer.close()
+        return result
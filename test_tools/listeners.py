@@ -0,0 +1,173 @@
+''' Hooks for collecting data about every test of the suite '''
+
+import time
+
+from django.utils import unittest
+
+
+class TestListener(object):
+    '''
+    Base class for objects notified about running tests. Listeners collect
+    data in the process which runs tests. With --parallel the data of every
+    worker is passed to get_data and merged into listener of main process
+    with merge_data before stopTestRun.
+    '''
+
+    def startTestRun(self):
+        ''' Called once before the suite in main process '''
+
+    def stopTestRun(self):
+        ''' Called once after the suite in main process '''
+
+    def beforeTest(self, test):
+        ''' Called before test including django fixtures setup '''
+
+    def afterTest(self, test):
+        ''' Called after test including django fixtures teardown '''
+
+    def beforeFixture(self, name):
+        ''' Called before class or module setup and teardown '''
+
+    def fixture(self, name, duration):
+        ''' Called after class or module setup and teardown '''
+
+    def addSuccess(self, test):
+        pass
+
+    def addError(self, test, err):
+        pass
+
+    def addFailure(self, test, err):
+        pass
+
+    def addSkip(self, test, reason):
+        pass
+
+    def addExpectedFailure(self, test, err):
+        pass
+
+    def addUnexpectedSuccess(self, test):
+        pass
+
+    def get_data(self):
+        ''' Picklable data collected in worker process '''
+        return None
+
+    def merge_data(self, data):
+        ''' Merge data collected in worker process '''
+
+
+class ResultProxy(object):
+    ''' Pass test outcomes to listeners and to the real result '''
+
+    OUTCOMES = ('addSuccess', 'addError', 'addFailure', 'addSkip',
+                'addExpectedFailure', 'addUnexpectedSuccess')
+
+    def __init__(self, result, listeners):
+        self.__dict__['_result'] = result
+        self.__dict__['_listeners'] = listeners
+
+    def __getattr__(self, name):
+        attr = getattr(self._result, name)
+        if name not in self.OUTCOMES:
+            return attr
+
+        def _outcome(*args):
+            ''' Call listeners, then the result '''
+            for listener in self._listeners:
+                getattr(listener, name)(*args)
+            return attr(*args)
+        return _outcome
+
+    def __setattr__(self, name, value):
+        setattr(self._result, name, value)
+
+
+class ListenedTestSuite(unittest.TestSuite):
+    ''' Flat suite which notifies listeners about tests and fixtures '''
+
+    def __init__(self, tests=(), listeners=()):
+        super(ListenedTestSuite, self).__init__(tests)
+        self.listeners = listeners
+        self._module_torn_down = False
+
+    def notify(self, method, *args):
+        ''' Call method of every listener '''
+        for listener in self.listeners:
+            getattr(listener, method)(*args)
+
+    def timed_fixture(self, name, handler, *args):
+        ''' Call fixture handler and report its duration '''
+        self.notify('beforeFixture', name)
+        started = time.time()
+        handler(*args)
+        self.notify('fixture', name, time.time() - started)
+
+    def _handleClassSetUp(self, test, result):
+        klass = test.__class__
+        if klass is getattr(result, '_previousTestClass', None):
+            return
+        self.timed_fixture('{0}.{1}.setUpClass'.format(klass.__module__,
+            klass.__name__),
+            super(ListenedTestSuite, self)._handleClassSetUp, test, result)
+
+    def _tearDownPreviousClass(self, test, result):
+        klass = getattr(result, '_previousTestClass', None)
+        if klass is None or klass is test.__class__:
+            return
+        self.timed_fixture('{0}.{1}.tearDownClass'.format(klass.__module__,
+            klass.__name__),
+            super(ListenedTestSuite, self)._tearDownPreviousClass,
+            test, result)
+
+    def _handleModuleFixture(self, test, result):
+        module_name = test.__class__.__module__
+        if module_name == self._get_previous_module(result):
+            return
+        # Previous module is torn down before, so its teardown isn't timed
+        # as setup of this module and isn't called again by the base class
+        self._handleModuleTearDown(result)
+        self._module_torn_down = True
+        try:
+            self.timed_fixture('{0}.setUpModule'.format(module_name),
+                super(ListenedTestSuite, self)._handleModuleFixture,
+                test, result)
+        finally:
+            self._module_torn_down = False
+
+    def _handleModuleTearDown(self, result):
+        module_name = self._get_previous_module(result)
+        if module_name is None or self._module_torn_down:
+            return
+        self.timed_fixture('{0}.tearDownModule'.format(module_name),
+            super(ListenedTestSuite, self)._handleModuleTearDown, result)
+
+    def run(self, result):
+        '''
+        The same as TestSuite.run but for flat suite and with listeners
+        called around the whole test, so time of django fixtures loading
+        and flushing is included
+        '''
+        result = ResultProxy(result, self.listeners)
+        for test in self:
+            if result.shouldStop:
+                break
+            if isinstance(test, unittest.TestSuite):
+                test(result)
+                continue
+
+            self._tearDownPreviousClass(test, result)
+            self._handleModuleFixture(test, result)
+            self._handleClassSetUp(test, result)
+            result._previousTestClass = test.__class__
+            if getattr(test.__class__, '_classSetupFailed', False) or \
+                    getattr(result, '_moduleSetUpFailed', False):
+                continue
+
+            self.notify('beforeTest', test)
+            test(result)
+            self.notify('afterTest', test)
+
+        self._tearDownPreviousClass(None, result)
+        self._handleModuleTearDown(result)
+        return result
@@ -0,0 +1,186 @@
+''' Memory allocated and retained by every test '''
+
+import gc
+import os
+import sys
+
+try:
+    # Python 2 has it only with pytracemalloc
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from django.core.management.base import CommandError
+
+from test_tools.cache import save_json
+from test_tools.impact import get_project_root, get_source_path
+from test_tools.listeners import TestListener
+
+MEMORY_FILE = 'memory.json'
+# Growth of memory of tests retaining more bytes is attributed to sites
+LEAK_THRESHOLD = 64 * 1024
+# Number of allocation sites reported for every leaking test
+TOP_SITES = 5
+# Frames kept for every allocation, so project code causing it is found
+TRACEBACK_FRAMES = 16
+
+
+def get_rss():
+    ''' Resident memory of current process in bytes, 0 if it's unknown '''
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        return 0
+
+
+def check_tracemalloc():
+    ''' Raise CommandError if allocations can't be traced '''
+    if tracemalloc is None:
+        raise CommandError('--memory needs tracemalloc, install pytracemalloc '
+                           'and Python patched for it')
+
+
+def take_snapshot():
+    ''' Traced allocations to compare later '''
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, os.path.splitext(__file__)[0] + '.py'),
+    ])
+
+
+def get_site(traceback, root):
+    '''
+    The most recent frame of allocation which is in the project, or the
+    most recent frame if there are none
+    '''
+    frames = list(traceback)
+    for frame in frames:
+        path = get_source_path(frame.filename, root)
+        if path is not None:
+            return '{0}:{1}'.format(path, frame.lineno)
+    return '{0}:{1}'.format(frames[0].filename, frames[0].lineno)
+
+
+def get_growth(old, new, top=TOP_SITES):
+    '''
+    Sites which allocated most memory between snapshots as tuples of site,
+    bytes and number of blocks
+    '''
+    root = get_project_root()
+    sites = {}
+    for stat in new.compare_to(old, 'traceback'):
+        if stat.size_diff > 0:
+            site = get_site(stat.traceback, root)
+            size, count = sites.get(site, (0, 0))
+            sites[site] = size + stat.size_diff, count + stat.count_diff
+    return sorted(((site, size, count) for site, (size, count)
+                   in sites.items()), key=lambda site: site[1],
+                  reverse=True)[:top]
+
+
+def format_size(size):
+    ''' Human readable number of bytes '''
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return '{0:.1f} {1}'.format(size, unit)
+        size /= 1024.0
+    return '{0:.1f} GB'.format(size)
+
+
+class MemoryListener(TestListener):
+    '''
+    Record peak and retained memory of every test and report the tests
+    which retain most. Allocations are traced with tracemalloc, growth of
+    resident memory of the process is recorded too. Garbage is collected
+    after every test, so only memory which is still referenced is counted
+    as retained. Growth of tests retaining more than LEAK_THRESHOLD is
+    attributed to allocation sites. Growth is counted since the previous
+    leaking test, so leaks of smaller tests before are included.
+    '''
+
+    def __init__(self, top=10, stream=None):
+        check_tracemalloc()
+        self.top = top
+        self.stream = stream or sys.stderr
+        self.stats = {}
+        self.started_tracing = False
+        self.snapshot = None
+        self.before = 0
+        self.peak = 0
+        self.rss = 0
+
+    def startTestRun(self):
+        self.stats = {}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_FRAMES)
+            self.started_tracing = True
+        gc.collect()
+        self.snapshot = take_snapshot()
+
+    def beforeTest(self, test):
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.before, self.peak = tracemalloc.get_traced_memory()
+        self.rss = get_rss()
+
+    def afterTest(self, test):
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        if peak <= self.peak and not hasattr(tracemalloc, 'reset_peak'):
+            # Peak of the process didn't change, peak of the test is unknown
+            peak = self.before
+        peak = max(peak, current)
+        retained = current - self.before
+        sites = []
+        if retained >= LEAK_THRESHOLD:
+            snapshot = take_snapshot()
+            sites = get_growth(self.snapshot, snapshot)
+            self.snapshot = snapshot
+        self.stats[test.id()] = (max(peak - self.before, 0), retained,
+                                 get_rss() - self.rss, sites)
+
+    def get_data(self):
+        return self.stats
+
+    def merge_data(self, data):
+        self.stats.update(data)
+
+    def stopTestRun(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.snapshot = None
+        save_json(MEMORY_FILE, dict((test_id, {
+            'peak': peak,
+            'retained': retained,
+            'rss': rss,
+            'sites': [{'site': site, 'size': size, 'count': count}
+                      for site, size, count in sites],
+        }) for test_id, (peak, retained, rss, sites) in self.stats.items()))
+        self.report()
+
+    def report(self):
+        ''' Write tests which retain most memory and have highest peaks '''
+        write = self.stream.write
+        write('\nTests retaining most memory:\n')
+        leaks = sorted(self.stats.items(), key=lambda item: item[1][1],
+                       reverse=True)[:self.top]
+        for test_id, (peak, retained, rss, sites) in leaks:
+            if retained <= 0:
+                break
+            write('{0:>10} retained {1:>10} peak {2:>10} RSS  {3}\n'.format(
+                format_size(retained), format_size(peak), format_size(rss),
+                test_id))
+            for site, size, count in sites:
+                write('{0:>10} in {1:6d} blocks  {2}\n'.format(
+                                            format_size(size), count, site))
+
+        write('\nTests with highest memory peak:\n')
+        for test_id, (peak, retained, rss, sites) in sorted(
+                self.stats.items(), key=lambda item: item[1][0],
+                reverse=True)[:self.top]:
+            write('{0:>10} peak {1:>10} retained {2:>10} RSS  {3}\n'.format(
+                format_size(peak), format_size(retained), format_size(rss),
+                test_id))
@@ -0,0 +1,191 @@
+''' Running test suite in several processes '''
+
+import multiprocessing
+import Queue
+
+from django.db import connections
+from django.utils import unittest
+from django.utils.unittest.suite import _ErrorHolder
+from test_tools.listeners import ListenedTestSuite, ResultProxy
+from test_tools.sharding import split_suite
+
+
+class RemoteTestError(Exception):
+    ''' Error raised by a test in worker process '''
+
+
+class WorkerTestResult(unittest.TestResult):
+    ''' Send test events from worker process to the main one '''
+
+    def __init__(self, queue, positions):
+        super(WorkerTestResult, self).__init__()
+        self.queue = queue
+        self.positions = positions
+
+    def send(self, event, test, *args):
+        ''' Test is sent as position in suite or as description '''
+        position = self.positions.get(id(test), str(test))
+        self.queue.put((event, position) + args)
+
+    def startTest(self, test):
+        super(WorkerTestResult, self).startTest(test)
+        self.send('startTest', test)
+
+    def stopTest(self, test):
+        super(WorkerTestResult, self).stopTest(test)
+        self.send('stopTest', test)
+
+    def addSuccess(self, test):
+        super(WorkerTestResult, self).addSuccess(test)
+        self.send('addSuccess', test)
+
+    def addError(self, test, err):
+        super(WorkerTestResult, self).addError(test, err)
+        self.send('addError', test, self.errors[-1][1])
+
+    def addFailure(self, test, err):
+        super(WorkerTestResult, self).addFailure(test, err)
+        self.send('addFailure', test, self.failures[-1][1])
+
+    def addSkip(self, test, reason):
+        super(WorkerTestResult, self).addSkip(test, reason)
+        self.send('addSkip', test, reason)
+
+    def addExpectedFailure(self, test, err):
+        super(WorkerTestResult, self).addExpectedFailure(test, err)
+        self.send('addExpectedFailure', test,
+                  self.expectedFailures[-1][1])
+
+    def addUnexpectedSuccess(self, test):
+        super(WorkerTestResult, self).addUnexpectedSuccess(test)
+        self.send('addUnexpectedSuccess', test)
+
+
+def run_worker(worker, chunk, databases, listeners, queue, failfast):
+    ''' Run chunk of tests against worker databases '''
+    for alias, names in databases.items():
+        connections[alias].settings_dict['NAME'] = names[worker - 1]
+    result = WorkerTestResult(queue, dict((id(test), position)
+                                          for position, test in chunk))
+    result.failfast = failfast
+    try:
+        ListenedTestSuite([test for position, test in chunk],
+                          listeners).run(result)
+        queue.put(('listenerData', worker,
+                   [listener.get_data() for listener in listeners]))
+    finally:
+        for connection in connections.all():
+            connection.close()
+        queue.put(('workerDone', worker))
+
+
+class ParallelTestSuite(unittest.TestSuite):
+    '''
+    Run tests in forked processes and replay their results into the result
+    object of the main process, so any runner reports them as usual.
+    Data collected by listeners in workers is merged into listeners of the
+    main process.
+    '''
+
+    def __init__(self, suite, processes, databases, listeners=()):
+        super(ParallelTestSuite, self).__init__(suite)
+        self.processes = processes
+        self.databases = databases
+        self.listeners = listeners
+
+    def build_err(self, test, event, traceback):
+        ''' Fake exc_info from formatted traceback of worker '''
+        exc_class = RemoteTestError
+        if event == 'addFailure':
+            exc_class = test.failureException
+        return exc_class, exc_class(traceback), None
+
+    def replay(self, result, event):
+        ''' Call result method for event received from worker '''
+        name, position, args = event[0], event[1], event[2:]
+        if isinstance(position, int):
+            test = self._tests[position]
+        else:
+            test = _ErrorHolder(position)
+        if name in ('addError', 'addFailure', 'addExpectedFailure'):
+            args = (self.build_err(test, name, args[0]),)
+        getattr(result, name)(test, *args)
+
+    def report_lost_tests(self, result, chunk, started, finished, message):
+        '''
+        Report tests of chunk which weren't finished as errors. Listeners of
+        main process get the errors too, because the worker never sends
+        their data.
+        '''
+        result = ResultProxy(result, self.listeners)
+        for position, test in chunk:
+            if position in finished:
+                continue
+            if position not in started:
+                result.startTest(test)
+            result.addError(test, self.build_err(test, 'addError', message))
+            result.stopTest(test)
+
+    def run(self, result):
+        for connection in connections.all():
+            connection.close()
+
+        queue = multiprocessing.Queue()
+        workers = {}
+        chunks = [chunk for chunk in split_suite(self, self.processes)
+                  if chunk]
+        for worker, chunk in enumerate(chunks, 1):
+            workers[worker] = multiprocessing.Process(target=run_worker,
+                args=(worker, chunk, self.databases, self.listeners, queue,
+                      getattr(result, 'failfast', False)))
+            workers[worker].start()
+
+        running = set(workers)
+        started = set()
+        finished = set()
+
+        def handle(event):
+            ''' Replay test event or update state of workers '''
+            if event[0] == 'workerDone':
+                running.discard(event[1])
+            elif event[0] == 'listenerData':
+                for listener, data in zip(self.listeners, event[2]):
+                    listener.merge_data(data)
+            else:
+                if event[0] == 'startTest':
+                    started.add(event[1])
+                elif event[0] == 'stopTest':
+                    finished.add(event[1])
+                self.replay(result, event)
+
+        while running and not result.shouldStop:
+            try:
+                event = queue.get(timeout=1)
+            except Queue.Empty:
+                pass
+            else:
+                handle(event)
+                continue
+            exited = [worker for worker in running
+                      if not workers[worker].is_alive()]
+            if not exited:
+                continue
+            # Events which exited workers sent before exit are read first
+            while True:
+                try:
+                    handle(queue.get_nowait())
+                except Queue.Empty:
+                    break
+            for worker in exited:
+                if worker in running:
+                    running.discard(worker)
+                    self.report_lost_tests(result, chunks[worker - 1],
+                        started, finished, 'Worker {0} exited with code {1}'
+                        ' before the test finished'.format(
+                                        worker, workers[worker].exitcode))
+
+        for process in workers.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        return result
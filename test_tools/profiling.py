@@ -0,0 +1,286 @@
+'''
+Profiling of callables and tests with cProfile. Merged profiles and
+collapsed stacks can be built from saved files with::
+
+    python -m test_tools.profiling merge all.prof first.prof second.prof
+    python -m test_tools.profiling collapse all.prof > all.collapsed
+
+Collapsed stacks are the input of flamegraph.pl and speedscope.
+'''
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import time
+
+from functools import wraps
+from django.conf import settings
+from test_tools.listeners import TestListener
+
+PROFILE_EXT = '.prof'
+COLLAPSED_EXT = '.collapsed'
+MERGED_NAME = 'merged'
+# Files written by the last run of ProfileListener into its folder
+MANIFEST_NAME = '.test_tools_profiles.json'
+# Deeper call paths are cut in collapsed stacks
+MAX_STACK_DEPTH = 100
+# Stacks with less own time are rounded to zero microseconds and dropped
+MIN_STACK_DURATION = 0.0000005
+
+# Stats merged across calls of every profiled callable by log path
+_merged = {}
+
+
+def get_profile_log_base():
+    ''' Folder for profile logs from settings '''
+    try:
+        return settings.PROFILE_LOG_BASE
+    except AttributeError:
+        return "/tmp"
+
+
+def get_log_path(log_file):
+    ''' Absolute path of log, relative ones are placed to PROFILE_LOG_BASE '''
+    if os.path.isabs(log_file):
+        return log_file
+    return os.path.join(get_profile_log_base(), log_file)
+
+
+def get_timestamped_path(path):
+    '''
+    Insert UTC timestamp into the file name, so 'my_view.prof' becomes
+    'my_view-20100211T170321.prof'. A counter is added for calls made
+    within the same second.
+    '''
+    base, ext = os.path.splitext(path)
+    base = '{0}-{1}'.format(base, time.strftime('%Y%m%dT%H%M%S',
+                                                 time.gmtime()))
+    timestamped = base + ext
+    counter = 1
+    while os.path.exists(timestamped):
+        timestamped = '{0}-{1}{2}'.format(base, counter, ext)
+        counter += 1
+    return timestamped
+
+
+def merge_stats(paths):
+    ''' Stats of all the profile files, None if there are no files '''
+    stats = None
+    for path in paths:
+        if stats is None:
+            stats = pstats.Stats(path)
+        else:
+            stats.add(path)
+    return stats
+
+
+def get_function_name(func):
+    ''' Frame name of pstats function key for collapsed stacks '''
+    filename, line, name = func
+    if filename == '~':
+        # Builtins are keyed like ('~', 0, '<len>')
+        return name.strip('<>')
+    return '{0}:{1}:{2}'.format(os.path.basename(filename), line, name)
+
+
+def get_top_level_time(func_stats):
+    '''
+    Part of cumulative time of function spent in calls which were made
+    outside of profiled functions. They are calls missing among callers,
+    recursive function may be called by others and still be on the top.
+    '''
+    cc, nc, tt, ct, callers = func_stats
+    top_calls = nc - sum(caller_stats[0] for caller_stats in callers.values())
+    if top_calls <= 0 or cc <= 0:
+        return 0
+    return ct * min(top_calls, cc) / float(cc)
+
+
+def get_collapsed_stacks(stats):
+    '''
+    Collapsed stacks with microseconds of own time, like
+    'main;run;query 1200'. cProfile keeps only caller and callee pairs,
+    so time of function is split between its call paths in proportion to
+    time spent under every caller. Paths with less time than a stack can
+    show are not followed, so the walk doesn't grow with number of paths
+    of the call graph.
+    '''
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, caller_stats in callers.items():
+            callees.setdefault(caller, []).append((func, caller_stats[3]))
+    collapsed = {}
+    stack = []
+    on_stack = set()
+
+    def walk(func, budget):
+        ''' Split inclusive budget of func between its own time and calls '''
+        cc, nc, tt, ct, callers = stats.stats[func]
+        if ct <= 0 or budget < MIN_STACK_DURATION:
+            return
+        stack.append(get_function_name(func))
+        on_stack.add(func)
+        share = min(budget / ct, 1.0)
+        key = ';'.join(stack)
+        collapsed[key] = collapsed.get(key, 0) + tt * share
+        if len(stack) < MAX_STACK_DEPTH:
+            for callee, callee_ct in callees.get(func, ()):
+                # Recursive calls are already included in own stack
+                if callee not in on_stack:
+                    walk(callee, callee_ct * share)
+        stack.pop()
+        on_stack.discard(func)
+
+    for func, func_stats in stats.stats.items():
+        walk(func, get_top_level_time(func_stats))
+    return [(key, int(round(duration * 1000000)))
+            for key, duration in sorted(collapsed.items())
+            if duration >= MIN_STACK_DURATION]
+
+
+def write_collapsed(stats, path):
+    ''' Write collapsed stacks of stats to the file '''
+    with open(path, 'w') as collapsed_file:
+        for stack, microseconds in get_collapsed_stacks(stats):
+            collapsed_file.write('{0} {1}\n'.format(stack, microseconds))
+
+
+def profile(log_file, merge=False, collapsed=False):
+    """Profile some callable.
+
+    This decorator uses the cProfile profiler to profile some callable (like
+    a view function or method) and dumps the profile data somewhere sensible
+    for later processing and examination.
+
+    It takes the profile log name. If it's a relative path, it places it
+    under the PROFILE_LOG_BASE. It also inserts a time stamp into the file
+    name, such that 'my_view.prof' become 'my_view-20100211T170321.prof',
+    where the time stamp is in UTC. This makes it easy to run and compare
+    multiple trials.
+
+    With merge stats of all calls are also accumulated in
+    'my_view-merged.prof'. With collapsed every log gets '.collapsed' file
+    of stacks for flamegraphs next to it.
+    """
+
+    def _outer(f):
+        @wraps(f)
+        def _inner(*args, **kwargs):
+            log_path = get_log_path(log_file)
+            prof = cProfile.Profile()
+            try:
+                return prof.runcall(f, *args, **kwargs)
+            finally:
+                final_log_file = get_timestamped_path(log_path)
+                prof.dump_stats(final_log_file)
+                paths = [final_log_file]
+                if merge:
+                    base, ext = os.path.splitext(log_path)
+                    merged_path = '{0}-{1}{2}'.format(base, MERGED_NAME, ext)
+                    stats = _merged.get(log_path)
+                    if stats is None:
+                        stats = _merged[log_path] = pstats.Stats(
+                                                            final_log_file)
+                    else:
+                        stats.add(final_log_file)
+                    stats.dump_stats(merged_path)
+                    paths.append(merged_path)
+                if collapsed:
+                    for path in paths:
+                        write_collapsed(pstats.Stats(path),
+                            os.path.splitext(path)[0] + COLLAPSED_EXT)
+
+        return _inner
+    return _outer
+
+
+def get_test_profile_name(test_id):
+    ''' File name of test profile which is safe for any file system '''
+    return re.sub(r'[^\w.-]', '_', test_id) + PROFILE_EXT
+
+
+class ProfileListener(TestListener):
+    '''
+    Profile every test into its own file of the folder. Profiles of all the
+    tests, including ones run by parallel workers, are merged on the end of
+    the run into merged.prof and merged.collapsed. Names of written files
+    are kept in a manifest of the folder, so the next run removes only them
+    and other files of the folder are left.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.profiler = None
+        self.names = []
+
+    def get_manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def startTestRun(self):
+        self.names = []
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        # Profiles of previous run would get into merged stats
+        try:
+            with open(self.get_manifest_path()) as manifest:
+                names = json.load(manifest)
+        except (IOError, ValueError):
+            names = []
+        for name in names:
+            path = os.path.join(self.directory, os.path.basename(name))
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def beforeTest(self, test):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def afterTest(self, test):
+        self.profiler.disable()
+        name = get_test_profile_name(test.id())
+        self.profiler.dump_stats(os.path.join(self.directory, name))
+        self.profiler = None
+        self.names.append(name)
+
+    def get_data(self):
+        return self.names
+
+    def merge_data(self, data):
+        self.names.extend(data)
+
+    def stopTestRun(self):
+        names = sorted(set(self.names))
+        stats = merge_stats([os.path.join(self.directory, name)
+                             for name in names])
+        if stats is not None:
+            names += [MERGED_NAME + PROFILE_EXT, MERGED_NAME + COLLAPSED_EXT]
+            stats.dump_stats(os.path.join(self.directory,
+                                          MERGED_NAME + PROFILE_EXT))
+            write_collapsed(stats, os.path.join(self.directory,
+                                                MERGED_NAME + COLLAPSED_EXT))
+        with open(self.get_manifest_path(), 'w') as manifest:
+            json.dump(names, manifest)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) >= 3 and argv[0] == 'merge':
+        stats = merge_stats(argv[2:])
+        stats.dump_stats(argv[1])
+    elif len(argv) >= 2 and argv[0] == 'collapse':
+        for stack, microseconds in get_collapsed_stacks(merge_stats(argv[1:])):
+            sys.stdout.write('{0} {1}\n'.format(stack, microseconds))
+    else:
+        sys.stderr.write('Usage: python -m test_tools.profiling '
+                         'merge OUTPUT PROFILE...\n'
+                         '       python -m test_tools.profiling '
+                         'collapse PROFILE...\n')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+''' Accounting of SQL queries made by tests '''
+
+import sys
+import time
+
+from functools import wraps
+from django.db.backends import util
+from test_tools.cache import load_json, save_json
+from test_tools.listeners import TestListener
+
+QUERIES_FILE = 'queries.json'
+
+_observers = []
+_original_wrappers = {}
+
+
+def notify(db, sql, params, duration):
+    ''' Pass executed query to observers '''
+    for observer in list(_observers):
+        observer(db, sql, params, duration)
+
+
+class ObservedCursorWrapper(util.CursorWrapper):
+    ''' Cursor which passes executed queries to observers '''
+
+    def get_base_method(self, name):
+        '''
+        Method of base wrapper. Old Django wrappers have no execute and
+        proxy it to the cursor by __getattr__, which marks transaction dirty.
+        '''
+        base = super(ObservedCursorWrapper, self)
+        try:
+            return getattr(base, name)
+        except AttributeError:
+            return base.__getattr__(name)
+
+    def execute(self, sql, params=()):
+        started = time.time()
+        try:
+            return self.get_base_method('execute')(sql, params)
+        finally:
+            notify(self.db, sql, params, time.time() - started)
+
+    def executemany(self, sql, param_list):
+        started = time.time()
+        try:
+            return self.get_base_method('executemany')(sql, param_list)
+        finally:
+            notify(self.db, sql, param_list, time.time() - started)
+
+
+class ObservedCursorDebugWrapper(util.CursorDebugWrapper):
+    ''' Debug cursor which passes executed queries to observers '''
+
+    def execute(self, sql, params=()):
+        started = time.time()
+        try:
+            return super(ObservedCursorDebugWrapper, self).execute(sql,
+                                                                   params)
+        finally:
+            notify(self.db, sql, params, time.time() - started)
+
+    def executemany(self, sql, param_list):
+        started = time.time()
+        try:
+            return super(ObservedCursorDebugWrapper, self).executemany(sql,
+                                                                param_list)
+        finally:
+            notify(self.db, sql, param_list, time.time() - started)
+
+
+def add_observer(observer):
+    '''
+    Call observer with connection, sql, params and duration of every query.
+    Cursor wrappers are replaced the same way no_database does it, only
+    while there are observers.
+    '''
+    if not _observers:
+        _original_wrappers['CursorWrapper'] = util.CursorWrapper
+        _original_wrappers['CursorDebugWrapper'] = util.CursorDebugWrapper
+        util.CursorWrapper = ObservedCursorWrapper
+        util.CursorDebugWrapper = ObservedCursorDebugWrapper
+    _observers.append(observer)
+
+
+def remove_observer(observer):
+    ''' Stop calling observer, restore cursor wrappers after the last one '''
+    _observers.remove(observer)
+    if not _observers:
+        if util.CursorWrapper is ObservedCursorWrapper:
+            util.CursorWrapper = _original_wrappers['CursorWrapper']
+        if util.CursorDebugWrapper is ObservedCursorDebugWrapper:
+            util.CursorDebugWrapper = _original_wrappers['CursorDebugWrapper']
+
+
+class query_budget(object):
+    '''
+    Decorator and context manager which fails if wrapped code makes more
+    than max_queries queries or spends more than max_time_ms in SQL. All
+    databases are counted unless using is given::
+
+        @query_budget(max_queries=5, max_time_ms=50)
+        def test_something(self):
+            pass
+
+        with query_budget(max_queries=1):
+            list(User.objects.all())
+    '''
+
+    def __init__(self, max_queries=None, max_time_ms=None, using=None):
+        self.max_queries = max_queries
+        self.max_time_ms = max_time_ms
+        self.using = using
+        self.queries = []
+
+    def __call__(self, func):
+        @wraps(func)
+        def _wrapper(*args, **kwargs):
+            ''' Call function inside of a new budget '''
+            with query_budget(self.max_queries, self.max_time_ms, self.using):
+                return func(*args, **kwargs)
+        return _wrapper
+
+    def observe(self, db, sql, params, duration):
+        ''' Remember query of the database '''
+        if self.using is None or db.alias == self.using:
+            self.queries.append((duration, sql, params))
+
+    def __enter__(self):
+        self.queries = []
+        add_observer(self.observe)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        remove_observer(self.observe)
+        if exc_type is not None:
+            return False
+
+        total_ms = sum(query[0] for query in self.queries) * 1000
+        reason = None
+        if self.max_queries is not None and \
+                len(self.queries) > self.max_queries:
+            reason = 'Expected at most {0} queries, got {1}'.format(
+                                        self.max_queries, len(self.queries))
+        elif self.max_time_ms is not None and total_ms > self.max_time_ms:
+            reason = 'Expected at most {0} ms in SQL, got {1:.1f} ms'.format(
+                                                self.max_time_ms, total_ms)
+        if reason:
+            queries = ['{0}. ({1:.1f} ms) {2}; args={3}'.format(number,
+                            duration * 1000, sql, params) for number,
+                       (duration, sql, params) in enumerate(self.queries, 1)]
+            raise AssertionError('{0}\n{1}'.format(reason, '\n'.join(queries)))
+        return False
+
+
+class QueryListener(TestListener):
+    '''
+    Count queries and SQL time of every test and report the tests with
+    most queries and the tests which make more queries than last time
+    '''
+
+    def __init__(self, top=10, stream=None):
+        self.top = top
+        self.stream = stream or sys.stderr
+        self.stats = {}
+        self.count = 0
+        self.duration = 0
+
+    def observe(self, db, sql, params, duration):
+        ''' Count query of current test '''
+        self.count += 1
+        self.duration += duration
+
+    def startTestRun(self):
+        self.stats = {}
+
+    def beforeTest(self, test):
+        self.count = 0
+        self.duration = 0
+        add_observer(self.observe)
+
+    def afterTest(self, test):
+        remove_observer(self.observe)
+        self.stats[test.id()] = (self.count, self.duration)
+
+    def get_data(self):
+        return self.stats
+
+    def merge_data(self, data):
+        self.stats.update(data)
+
+    def stopTestRun(self):
+        history = load_json(QUERIES_FILE, {})
+        self.report(history)
+        history.update(self.stats)
+        save_json(QUERIES_FILE, history)
+
+    def report(self, history):
+        ''' Write tests with most queries and query count regressions '''
+        write = self.stream.write
+        write('\nTests with most queries:\n')
+        for test_id, (count, duration) in sorted(self.stats.items(),
+                key=lambda item: item[1], reverse=True)[:self.top]:
+            write('{0:6d} queries {1:9.1f} ms  {2}\n'.format(count,
+                                                duration * 1000, test_id))
+
+        regressions = []
+        for test_id, (count, duration) in self.stats.items():
+            if test_id in history and count > history[test_id][0]:
+                regressions.append((count - history[test_id][0], test_id))
+        if regressions:
+            write('\nTests making more queries than in previous run:\n')
+            for delta, test_id in sorted(regressions,
+                                          reverse=True)[:self.top]:
+                write('{0:6d} -> {1} queries  {2}\n'.format(
+                    history[test_id][0], self.stats[test_id][0], test_id))
@@ -0,0 +1,145 @@
+''' Schema and data fingerprints of the project stored in test databases '''
+
+from hashlib import sha1
+
+from django.conf import settings
+from django.db import models, transaction
+
+STATE_TABLE = 'test_tools_state'
+# Tables of applied migrations, they keep state of database, not test data
+MIGRATION_TABLES = ('south_migrationhistory',)
+
+
+def get_schema_fingerprint(connection):
+    ''' Hash over model definitions and applied migrations '''
+    schema = []
+    for model in models.get_models(include_auto_created=True):
+        opts = model._meta
+        fields = []
+        for field in opts.local_fields + opts.local_many_to_many:
+            fields.append((field.column, field.db_type(connection=connection),
+                field.null, field.unique, field.db_index, field.primary_key,
+                field.rel and field.rel.to._meta.db_table))
+        schema.append((opts.db_table, opts.managed, opts.proxy,
+                       opts.unique_together, fields))
+    schema.sort()
+
+    if 'south' in settings.INSTALLED_APPS:
+        from south.models import MigrationHistory
+        schema.extend(MigrationHistory.objects.using(connection.alias)
+                            .order_by('app_name', 'migration')
+                            .values_list('app_name', 'migration'))
+
+    return sha1(repr(schema)).hexdigest()
+
+
+def get_table_rows(connection, table):
+    ''' Column names and rows of the table '''
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM {0}'.format(
+                                        connection.ops.quote_name(table)))
+    return ([column[0] for column in cursor.description],
+            [tuple(row) for row in cursor.fetchall()])
+
+
+def get_checksum(rows):
+    ''' Hash of rows which doesn't depend on their order '''
+    return sha1(repr(sorted(rows))).hexdigest()
+
+
+def get_data_summary(connection):
+    '''
+    Hash over number of rows and the greatest primary key of every model
+    table. It notices added and deleted rows, but not updated ones, and
+    reads no rows into Python. Counting still takes time in proportion to
+    number of rows, PostgreSQL scans every table for it. Migration tables
+    are left out.
+    '''
+    quote_name = connection.ops.quote_name
+    columns = dict((model._meta.db_table, model._meta.pk.column) for model
+                   in models.get_models(include_auto_created=True))
+    cursor = connection.cursor()
+    summary = []
+    for table in sorted(connection.introspection.django_table_names(
+                                                        only_existing=True)):
+        if table not in MIGRATION_TABLES:
+            cursor.execute('SELECT COUNT(*), MAX({0}) FROM {1}'.format(
+                            quote_name(columns[table]), quote_name(table)))
+            summary.append((table,) + tuple(cursor.fetchone()))
+    return sha1(repr(summary)).hexdigest()
+
+
+def get_data_fingerprint(connection):
+    '''
+    Hash over rows of all model tables, so updated rows are noticed as well
+    as added and deleted ones. Migration tables are left out.
+    '''
+    checksums = []
+    for table in sorted(connection.introspection.django_table_names(
+                                                        only_existing=True)):
+        if table not in MIGRATION_TABLES:
+            checksums.append((table, get_checksum(
+                                    get_table_rows(connection, table)[1])))
+    return sha1(repr(checksums)).hexdigest()
+
+
+def get_migration_rows(connection):
+    ''' Columns and rows of every existing migration table '''
+    existing = connection.introspection.table_names()
+    return dict((table, get_table_rows(connection, table))
+                for table in MIGRATION_TABLES if table in existing)
+
+
+def restore_migration_rows(connection, tables):
+    '''
+    Put back rows of migration tables which were flushed or changed by
+    tests, so test database keeps its migration history
+    '''
+    quote_name = connection.ops.quote_name
+    cursor = connection.cursor()
+    for table, (columns, rows) in sorted(tables.items()):
+        if get_checksum(get_table_rows(connection, table)[1]) == \
+                get_checksum(rows):
+            continue
+        cursor.execute('DELETE FROM {0}'.format(quote_name(table)))
+        if rows:
+            cursor.executemany('INSERT INTO {0} ({1}) VALUES ({2})'.format(
+                quote_name(table),
+                ', '.join(quote_name(column) for column in columns),
+                ', '.join(['%s'] * len(columns))), rows)
+    transaction.commit_unless_managed(using=connection.alias)
+
+
+def get_state(connection, name):
+    ''' Read value saved by set_state or None '''
+    if STATE_TABLE not in connection.introspection.table_names():
+        return None
+    cursor = connection.cursor()
+    cursor.execute('SELECT value FROM {0} WHERE name = %s'.format(
+        connection.ops.quote_name(STATE_TABLE)), [name])
+    row = cursor.fetchone()
+    return row and row[0]
+
+
+def delete_state(connection, name):
+    ''' Remove value saved by set_state '''
+    if STATE_TABLE in connection.introspection.table_names():
+        connection.cursor().execute('DELETE FROM {0} WHERE name = %s'.format(
+            connection.ops.quote_name(STATE_TABLE)), [name])
+        transaction.commit_unless_managed(using=connection.alias)
+
+
+def set_state(connection, name, value):
+    '''
+    Save value in a plain table of the database, so it is not removed by
+    flush together with model tables
+    '''
+    table = connection.ops.quote_name(STATE_TABLE)
+    cursor = connection.cursor()
+    if STATE_TABLE not in connection.introspection.table_names():
+        cursor.execute('CREATE TABLE {0} (name varchar(32) NOT NULL '
+            'PRIMARY KEY, value varchar(40) NOT NULL)'.format(table))
+    cursor.execute('DELETE FROM {0} WHERE name = %s'.format(table), [name])
+    cursor.execute('INSERT INTO {0} (name, value) VALUES (%s, %s)'.format(
+                                                    table), [name, value])
+    transaction.commit_unless_managed(using=connection.alias)
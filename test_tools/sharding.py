@@ -0,0 +1,79 @@
+''' Splitting suite into chunks of similar duration '''
+
+import json
+
+from django.core.management.base import CommandError
+from test_tools.timing import get_average_durations
+
+
+def parse_shard(shard):
+    ''' Convert K/N string into tuple of shard number and shards count '''
+    try:
+        number, count = map(int, shard.split('/'))
+    except ValueError:
+        raise CommandError('Shard should be given as K/N, got {0}'.format(
+                                                                    shard))
+    if not 1 <= number <= count:
+        raise CommandError('Shard {0} is out of 1..{1}'.format(number, count))
+    return number, count
+
+
+def group_by_class(suite):
+    ''' Lists of position and test with tests of the same class together '''
+    groups = []
+    for position, test in enumerate(suite):
+        if groups and groups[-1][-1][1].__class__ is test.__class__:
+            groups[-1].append((position, test))
+        else:
+            groups.append([(position, test)])
+    return groups
+
+
+def load_timings(path):
+    '''
+    Average durations from timings history file which is shared by all the
+    nodes, e.g. committed to repository or passed as build artifact
+    '''
+    try:
+        with open(path) as timings_file:
+            history = json.load(timings_file)
+    except (IOError, ValueError), exception:
+        raise CommandError('Can\'t read shard timings {0}: {1}'.format(
+                                                            path, exception))
+    return get_average_durations(history)
+
+
+def get_class_id(test):
+    ''' Full name of class of test '''
+    return '{0}.{1}'.format(test.__class__.__module__,
+                            test.__class__.__name__)
+
+
+def split_suite(suite, count, durations=None):
+    '''
+    Split flat suite into chunks of positions and tests. Tests of the same
+    class are kept together and keep their order, so class fixtures and
+    reorder_suite grouping still work. Chunks are balanced by given average
+    durations, tests without them take average duration of known ones.
+    Without durations chunks have similar number of tests. The split depends
+    only on test ids and durations, so every node gets the same shards.
+    '''
+    durations = durations or {}
+    default = 1.0
+    if durations:
+        default = sum(durations.values()) / len(durations)
+
+    weighted_groups = []
+    for group in group_by_class(suite):
+        weight = sum(durations.get(test.id(), default)
+                     for position, test in group)
+        weighted_groups.append((-weight, get_class_id(group[0][1]), group))
+    weighted_groups.sort(key=lambda weighted_group: weighted_group[:2])
+
+    chunks = [[] for counter in range(count)]
+    weights = [0] * count
+    for weight, class_id, group in weighted_groups:
+        lightest = weights.index(min(weights))
+        chunks[lightest].extend(group)
+        weights[lightest] -= weight
+    return [sorted(chunk) for chunk in chunks]
@@ -1,12 +1,22 @@
 ''' Syncing and migrating test database '''
 
+import os
+
 from django.db.models.signals import post_syncdb
 from django.dispatch import receiver
 from django.core.management import call_command
-from test_tools.test_runner import get_test_db_name
-from django.db import connections
+from django.db.backends.creation import TEST_DATABASE_PREFIX
+from test_tools.test_runner import get_test_db_name, get_worker_db_names
+from test_tools.dump import dump_schema, is_schema_loaded, load_schema
+from test_tools.schema import get_schema_fingerprint, get_state, set_state
+from test_tools.snapshot import create_snapshot, snapshot_exists
+from test_tools.utils import SITE_STATE, create_site, reset_site_cache
+from django.db import connections, router, DEFAULT_DB_ALIAS
 from django.conf import settings
 
+# Schema dumps of source databases by alias, name and schema fingerprint
+SCHEMA_DUMPS = {}
+
 
 def reset_connection(connection, new_name):
     ''' Change database name '''
@@ -16,19 +26,101 @@ def reset_connection(connection, new_name):
     connection.cursor()
 
 
+def is_test_database(connection):
+    ''' Check if connection is switched to test or parallel worker database '''
+    name = os.path.basename(connection.settings_dict['NAME'])
+    test_name = connection.settings_dict['TEST_NAME']
+    if test_name:
+        return name.startswith(
+                        os.path.splitext(os.path.basename(test_name))[0])
+    return name.startswith(TEST_DATABASE_PREFIX)
+
+
+def get_source_schema(connection, source_name, fingerprint):
+    '''
+    Schema dump of the database which test databases follow, it's made
+    once for every schema fingerprint. The connection is switched back to
+    the database it was opened for.
+    '''
+    key = (connection.alias, source_name, fingerprint)
+    if key not in SCHEMA_DUMPS:
+        current_name = connection.settings_dict["NAME"]
+        reset_connection(connection, source_name)
+        try:
+            SCHEMA_DUMPS[key] = dump_schema(connection)
+        finally:
+            reset_connection(connection, current_name)
+    return SCHEMA_DUMPS[key]
+
+
+def call_db_command(connection, db_name, command, fingerprint=None,
+                    source_name=None):
+    '''
+    Call command on database and switch connection back. Command is skipped
+    if it was already called for the same schema fingerprint. If loading of
+    schema is enabled, schema of source database is loaded instead of
+    calling the command. Synced database is saved as a template for
+    restoring it after dirty runs.
+    '''
+    old_name = connection.settings_dict["NAME"]
+    reset_connection(connection, db_name)
+    try:
+        if fingerprint is None or \
+                get_state(connection, command) != fingerprint:
+            schema = None
+            if source_name is not None and is_schema_loaded(command):
+                schema = get_source_schema(connection, source_name,
+                                           fingerprint)
+            if schema is not None:
+                load_schema(connection, schema)
+            else:
+                call_command(command,
+                    interactive=False,
+                    database=connection.alias,
+                    load_initial_data=False)
+            if fingerprint is not None:
+                set_state(connection, command, fingerprint)
+            create_snapshot(connection)
+        elif not snapshot_exists(connection):
+            create_snapshot(connection)
+    finally:
+        reset_connection(connection, old_name)
+
+
+def get_source_fingerprint(connection, source_name):
+    '''
+    Schema fingerprint of the database which test databases follow, the
+    connection is switched back to the database it was opened for
+    '''
+    current_name = connection.settings_dict["NAME"]
+    reset_connection(connection, source_name)
+    try:
+        return get_schema_fingerprint(connection)
+    finally:
+        reset_connection(connection, current_name)
+
+
+def sync_database(connection, db_name, source_name):
+    ''' Sync and migrate freshly created database like the source one '''
+    fingerprint = get_source_fingerprint(connection, source_name)
+    call_db_command(connection, db_name, 'syncdb', fingerprint)
+    if 'south' in settings.INSTALLED_APPS:
+        call_db_command(connection, db_name, 'migrate', fingerprint,
+                        source_name)
+
+
 def call_test_db_command(command):
-    ''' Call command on test database '''
+    ''' Call command on test database and parallel worker databases '''
     for alias in connections:
         connection = connections[alias]
-        old_name = connection.settings_dict["NAME"]
         test_db_name = get_test_db_name(connection)
-        if not old_name.startswith('test_'):
-            reset_connection(connection, test_db_name)
-            call_command(command,
-                interactive=False,
-                database=connection.alias,
-                load_initial_data=False)
-            reset_connection(connection, old_name)
+        if not is_test_database(connection):
+            fingerprint = get_schema_fingerprint(connection)
+            source_name = connection.settings_dict['NAME']
+            for db_name in [test_db_name] + get_worker_db_names(connection,
+                                                               test_db_name):
+                call_db_command(connection, db_name, command, fingerprint,
+                                source_name)
 
 
 @receiver(post_syncdb)
@@ -39,10 +131,36 @@ def sync_test_db(sender, **kwargs):
         call_test_db_command('syncdb')
 
 
+@receiver(post_syncdb)
+def create_test_site(sender, db=None, **kwargs):
+    '''
+    Create Site of SITE_ID when test database is synced or flushed, so it
+    is in templates and flushed tables and tests don't create it
+    '''
+    if sender.__name__ != 'django.contrib.sites.models':
+        return
+    from django.contrib.sites.models import Site
+
+    reset_site_cache(db)
+    connection = connections[db]
+    if is_test_database(connection) and router.allow_syncdb(db, Site):
+        create_site(db)
+        if get_state(connection, SITE_STATE) != str(settings.SITE_ID):
+            set_state(connection, SITE_STATE, str(settings.SITE_ID))
+
+
+def migrate_test_db(sender, db=DEFAULT_DB_ALIAS, **kwargs):
+    '''
+    Migrate test databases after migration of the database. South sends the
+    signal after every app, test databases are migrated again only if the
+    schema fingerprint was changed since, so partial migrations and
+    rollbacks get to test databases too.
+    '''
+    if not is_test_database(connections[db]):
+        call_test_db_command('migrate')
+
+
 if 'south' in settings.INSTALLED_APPS:
     from south.signals import post_migrate
 
-    @receiver(post_migrate)
-    def migrate_test_db(sender, **kwargs):
-        ''' Migrate test db '''
-        call_test_db_command('migrate')
+    post_migrate.connect(migrate_test_db)
@@ -0,0 +1,101 @@
+''' Pristine copies of test databases '''
+
+import os
+import shutil
+
+from test_tools.schema import get_data_fingerprint, get_data_summary, \
+    set_state
+
+
+def get_snapshot_name(db_name):
+    ''' Name of the template database for test database '''
+    base, ext = os.path.splitext(db_name)
+    return '{0}_template{1}'.format(base, ext)
+
+
+def execute_on_maintenance_db(connection, statements):
+    '''
+    PostgreSQL can't copy or drop database with open connections, so
+    statements are executed from `postgres` database
+    '''
+    db_name = connection.settings_dict['NAME']
+    connection.close()
+    connection.settings_dict['NAME'] = 'postgres'
+    try:
+        cursor = connection.cursor()
+        connection.creation._prepare_for_test_db_ddl()
+        for statement in statements:
+            cursor.execute(statement)
+    finally:
+        connection.close()
+        connection.settings_dict['NAME'] = db_name
+
+
+def copy_database(connection, source, target):
+    ''' Copy database with all data, return False if not supported '''
+    if connection.vendor == 'sqlite':
+        connection.close()
+        shutil.copyfile(source, target)
+    elif connection.vendor == 'postgresql':
+        qn = connection.ops.quote_name
+        execute_on_maintenance_db(connection, [
+            'DROP DATABASE IF EXISTS {0}'.format(qn(target)),
+            'CREATE DATABASE {0} TEMPLATE {1}'.format(qn(target), qn(source)),
+        ])
+    else:
+        return False
+    return True
+
+
+def snapshot_exists(connection):
+    ''' Check if test database has a template '''
+    snapshot_name = get_snapshot_name(connection.settings_dict['NAME'])
+    if connection.vendor == 'sqlite':
+        return os.path.exists(snapshot_name)
+    if connection.vendor == 'postgresql':
+        cursor = connection.cursor()
+        cursor.execute('SELECT 1 FROM pg_database WHERE datname = %s',
+                       [snapshot_name])
+        return cursor.fetchone() is not None
+    return False
+
+
+def set_snapshot_state(connection, snapshot_name, name, value):
+    ''' Save value in the state of template database '''
+    db_name = connection.settings_dict['NAME']
+    connection.close()
+    connection.settings_dict['NAME'] = snapshot_name
+    try:
+        set_state(connection, name, value)
+    finally:
+        connection.close()
+        connection.settings_dict['NAME'] = db_name
+
+
+def create_snapshot(connection):
+    '''
+    Save current state of test database as a template. Summary and
+    checksum of data are saved to the template and to the database after
+    the copy is made, so it's never left without the template they
+    describe.
+    '''
+    db_name = connection.settings_dict['NAME']
+    if db_name == ':memory:':
+        return False
+    states = [('data', get_data_summary(connection)),
+              ('data_checksum', get_data_fingerprint(connection))]
+    snapshot_name = get_snapshot_name(db_name)
+    if not copy_database(connection, db_name, snapshot_name):
+        return False
+    for name, value in states:
+        set_snapshot_state(connection, snapshot_name, name, value)
+        set_state(connection, name, value)
+    return True
+
+
+def restore_snapshot(connection):
+    ''' Replace test database with its template '''
+    if not snapshot_exists(connection):
+        return False
+    db_name = connection.settings_dict['NAME']
+    return copy_database(connection, get_snapshot_name(db_name), db_name)
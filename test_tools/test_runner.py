@@ -2,7 +2,9 @@
 
 import os
 import pkgutil
+import sys
 
+from optparse import make_option
 from django.test import TestCase
 from django.test.simple import DjangoTestSuiteRunner, reorder_suite, \
     build_suite, dependency_ordered
@@ -12,6 +14,16 @@ from django.utils.unittest.loader import defaultTestLoader
 from django.conf import settings
 from django.utils.importlib import import_module
 from django.db.backends.creation import TEST_DATABASE_PREFIX
+from test_tools.discovery import DiscoveryIndex, get_source_path
+from test_tools.listeners import ListenedTestSuite
+from test_tools.timing import TimingListener
+from test_tools.utils import FAST_PASSWORD_HASHER
+from test_tools.failures import FailureListener, load_failures, \
+    order_failed_first
+from test_tools.schema import get_data_fingerprint, get_data_summary, \
+    get_migration_rows, get_state, set_state, delete_state, \
+    restore_migration_rows
+from test_tools.snapshot import restore_snapshot
 
 
 def is_custom_test_package(module):
@@ -34,15 +46,78 @@ def get_test_module(app_name):
             raise ImportError('No module named {0}'.format(module_name))
 
 
+def get_app_paths(app, test_module=None):
+    '''
+    Files and folders which add or remove tests of app when they are
+    changed: app folder, models and tests modules and modules of test package
+    '''
+    if test_module is None:
+        test_module = sys.modules.get(
+                                app.__name__.rsplit('.', 1)[0] + '.tests')
+    paths = []
+    for module in (app, test_module):
+        path = module and get_source_path(module)
+        if not path or not os.path.exists(path):
+            continue
+        paths.append(path)
+        if hasattr(module, '__path__'):
+            folder = os.path.dirname(path)
+            paths.append(folder)
+            for importer, name, ispkg in pkgutil.iter_modules([folder]):
+                paths.append(os.path.join(folder, name, '__init__.py')
+                             if ispkg else os.path.join(folder, name + '.py'))
+    models_path = get_source_path(app)
+    if hasattr(app, '__path__'):
+        models_path = os.path.dirname(models_path)
+    paths.append(os.path.dirname(models_path))
+    return [item for item in paths if os.path.exists(item)]
+
+
 def get_test_db_name(connection):
     if connection.settings_dict['TEST_NAME']:
         return connection.settings_dict['TEST_NAME']
     return TEST_DATABASE_PREFIX + connection.settings_dict['NAME']
 
 
+def get_worker_db_name(test_db_name, worker):
+    ''' Name of the test database for parallel worker '''
+    base, ext = os.path.splitext(test_db_name)
+    return '{0}_{1}{2}'.format(base, worker, ext)
+
+
+def test_db_exists(connection, db_name):
+    ''' Check if database exists without creating it '''
+    if connection.vendor == 'sqlite':
+        return db_name == ':memory:' or os.path.exists(db_name)
+    old_name = connection.settings_dict['NAME']
+    connection.close()
+    connection.settings_dict['NAME'] = db_name
+    try:
+        connection.cursor()
+    except Exception:
+        return False
+    else:
+        return True
+    finally:
+        connection.close()
+        connection.settings_dict['NAME'] = old_name
+
+
+def get_worker_db_names(connection, test_db_name):
+    ''' Names of all provisioned worker databases '''
+    names = []
+    while test_db_exists(connection,
+                         get_worker_db_name(test_db_name, len(names) + 1)):
+        names.append(get_worker_db_name(test_db_name, len(names) + 1))
+    return names
+
+
 class PersistentTestDatabaseMixin(object):
     ''' Skip database recreation '''
 
+    parallel = 1
+    verify_data = False
+
     def _get_test_db_name(self, connection):
         """
         Internal implementation - returns the name of the test DB that will be
@@ -59,6 +134,94 @@ class PersistentTestDatabaseMixin(object):
         connection.features.confirm()
         connection.cursor()
 
+    def create_worker_database(self, connection, db_name, source_name):
+        ''' Create database for parallel worker and sync it like source '''
+        from test_tools.signals import sync_database
+
+        if self.verbosity >= 1:
+            print "Creating worker database '{0}'...".format(db_name)
+        test_name = connection.settings_dict['TEST_NAME']
+        connection.settings_dict['TEST_NAME'] = db_name
+        try:
+            connection.creation._create_test_db(self.verbosity, True)
+        finally:
+            connection.settings_dict['TEST_NAME'] = test_name
+        sync_database(connection, db_name, source_name)
+
+    def setup_worker_databases(self, connection, source_name):
+        '''
+        Provision missing worker databases of test database for source
+        database and return their names
+        '''
+        test_db_name = connection.settings_dict['NAME']
+        names = []
+        for worker in range(1, self.parallel + 1):
+            db_name = get_worker_db_name(test_db_name, worker)
+            if not test_db_exists(connection, db_name):
+                self.create_worker_database(connection, db_name,
+                                            source_name)
+            names.append(db_name)
+        return names
+
+    def for_each_database(self, callback):
+        ''' Call callback with connection switched to every test database '''
+        for connection, db_names in self.persistent_databases:
+            test_db_name = connection.settings_dict['NAME']
+            try:
+                for db_name in db_names:
+                    connection.close()
+                    connection.settings_dict['NAME'] = db_name
+                    callback(connection)
+            finally:
+                connection.close()
+                connection.settings_dict['NAME'] = test_db_name
+
+    def restore_database(self, connection):
+        ''' Restore test database from template '''
+        db_name = connection.settings_dict['NAME']
+        if restore_snapshot(connection):
+            if self.verbosity >= 1:
+                print "Restored test database '{0}' from template".format(
+                                                                    db_name)
+        else:
+            delete_state(connection, 'running')
+
+    def prepare_database(self, connection):
+        '''
+        Restore database left by aborted run and mark it as used. Rows of
+        migration tables are kept, so they can be put back after flushes.
+        '''
+        if get_state(connection, 'running'):
+            self.restore_database(connection)
+        set_state(connection, 'running', '1')
+        self.migration_rows[connection.settings_dict['NAME']] = \
+            get_migration_rows(connection)
+
+    def is_dirty(self, connection):
+        '''
+        Check if tests left some data in database by number of rows and the
+        greatest keys of tables, or by checksums of all the rows if data is
+        verified
+        '''
+        if self.verify_data:
+            return get_data_fingerprint(connection) != \
+                get_state(connection, 'data_checksum')
+        return get_data_summary(connection) != get_state(connection, 'data')
+
+    def cleanup_database(self, connection):
+        '''
+        Put back migration history flushed by tests and restore database if
+        tests left some data in it
+        '''
+        migration_rows = self.migration_rows.pop(
+                                    connection.settings_dict['NAME'], None)
+        if migration_rows:
+            restore_migration_rows(connection, migration_rows)
+        if self.is_dirty(connection):
+            self.restore_database(connection)
+        else:
+            delete_state(connection, 'running')
+
     def setup_databases(self, **kwargs):
         ''' Skip database creation. Just return the right connections '''
         from django.db import connections, DEFAULT_DB_ALIAS
@@ -96,11 +259,23 @@ class PersistentTestDatabaseMixin(object):
         # Second pass -- actually create the databases.
         old_names = []
         mirrors = []
+        self.worker_databases = {}
+        self.persistent_databases = []
+        self.migration_rows = {}
         for signature, (db_name, aliases) in dependency_ordered(
                                         test_databases.items(), dependencies):
             connection = connections[aliases[0]]
             old_names.append((connection, db_name, True))
             self.reopen_connection(connection)
+            if self.parallel > 1 and db_name:
+                worker_names = self.setup_worker_databases(connection,
+                                                           db_name)
+                for alias in aliases:
+                    self.worker_databases[alias] = worker_names
+            if db_name:
+                self.persistent_databases.append((connection,
+                    [connection.settings_dict['NAME']] +
+                    self.worker_databases.get(aliases[0], [])))
             for alias in aliases[1:]:
                 connection = connections[alias]
                 if db_name:
@@ -120,44 +295,270 @@ class PersistentTestDatabaseMixin(object):
             mirrors.append((alias, connections[alias].settings_dict['NAME']))
             connections[alias].settings_dict['NAME'] = connections[
                                             mirror_alias].settings_dict['NAME']
+            if mirror_alias in self.worker_databases:
+                self.worker_databases[alias] = self.worker_databases[
+                                                                mirror_alias]
 
+        self.for_each_database(self.prepare_database)
         return old_names, mirrors
 
     def teardown_databases(self, old_config, **kwargs):
-        ''' Don't delete database on the end of tests '''
-        pass
+        '''
+        Don't delete database on the end of tests. Restore it from template
+        if tests left it dirty.
+        '''
+        self.for_each_database(self.cleanup_database)
+
+
+class RunnerOptions(object):
+    '''
+    Values of runner options by their dest names. Options which are not
+    given get defaults of the option list, so runner can be created in code
+    with only the options it needs.
+    '''
+
+    def __init__(self, option_list, **options):
+        for option in option_list:
+            setattr(self, option.dest, options.get(option.dest,
+                                                   option.default))
 
 
 class DiscoveryDjangoTestSuiteRunner(PersistentTestDatabaseMixin,
                                                         DjangoTestSuiteRunner):
     """A test suite runner that uses unittest2 test discovery."""
 
+    option_list = (
+        make_option('--parallel', action='store', dest='parallel',
+            type='int', default=1,
+            help='Run tests in N processes. Every process uses its own '
+                 'persistent test database.'),
+        make_option('--no-discovery-index', action='store_false',
+            dest='discovery_index', default=True,
+            help='Introspect all test modules instead of using the index '
+                 'of unchanged ones.'),
+        make_option('--slowest', action='store', dest='slowest',
+            type='int', default=0,
+            help='Report N slowest tests and fixtures and N biggest '
+                 'regressions against timings history.'),
+        make_option('--shard', action='store', dest='shard', default=None,
+            help='Run only K-th of N parts of the suite given as K/N. Parts '
+                 'have similar number of tests.'),
+        make_option('--shard-timings', action='store', dest='shard_timings',
+            default=None,
+            help='Balance shards by durations from timings history file '
+                 'shared by all the nodes.'),
+        make_option('--record-impact', action='store_true',
+            dest='record_impact', default=False,
+            help='Record project files executed by every test.'),
+        make_option('--changed', action='store', dest='changed',
+            default=None,
+            help='Run only tests affected by comma separated files and '
+                 'tests without recorded impact.'),
+        make_option('--changed-since', action='store', dest='changed_since',
+            default=None,
+            help='Run only tests affected by files changed since git '
+                 'revision and tests without recorded impact.'),
+        make_option('--count-queries', action='store_true',
+            dest='count_queries', default=False,
+            help='Count queries and SQL time of every test and report tests '
+                 'with most queries and query count regressions.'),
+        make_option('--profile', action='store', dest='profile',
+            default=None,
+            help='Profile every test with cProfile into its own file of the '
+                 'folder and merge profiles of the whole run.'),
+        make_option('--failed-first', action='store_true',
+            dest='failed_first', default=False,
+            help='Run tests which failed last time before other tests.'),
+        make_option('--failed-only', action='store_true',
+            dest='failed_only', default=False,
+            help='Run only tests which failed last time, or all the tests '
+                 'if none failed.'),
+        make_option('--watch', action='store_true', dest='watch',
+            default=False,
+            help='Keep running and rerun tests affected by every change of '
+                 'project files.'),
+        make_option('--watch-interval', action='store',
+            dest='watch_interval', type='float', default=None,
+            help='Seconds between checks of project files in watch mode, '
+                 '1 by default.'),
+        make_option('--dirty-tables', action='store_true',
+            dest='dirty_tables', default=False,
+            help='Flush only tables written since previous flush for '
+                 'TransactionTestCase tests.'),
+        make_option('--verify-flush', action='store_true',
+            dest='verify_flush', default=False,
+            help='Flush only written tables and check that all the tables '
+                 'are the same as after full flush.'),
+        make_option('--verify-data', action='store_true',
+            dest='verify_data', default=False,
+            help='Compare checksums of all the rows instead of row counts '
+                 'to find if tests left data in test database.'),
+        make_option('--fast-hasher', action='store_true',
+            dest='fast_hasher', default=False,
+            help='Hash passwords with fast MD5 hasher during tests.'),
+        make_option('--memory', action='store_true', dest='memory',
+            default=False,
+            help='Record peak and retained memory of every test and report '
+                 'tests which retain most with their allocation sites.'),
+        make_option('--junit-xml', action='store', dest='junit_xml',
+            default=None,
+            help='Write JUnit XML report to file while tests run.'),
+    )
+
+    def __init__(self, options=None, **kwargs):
+        if options is None:
+            options = RunnerOptions(self.option_list, **kwargs)
+        for option in self.option_list:
+            kwargs.pop(option.dest, None)
+        self.options = options
+        self.parallel = options.parallel
+        self.discovery_index = DiscoveryIndex() if options.discovery_index \
+            else None
+        self.shard = None
+        if options.shard:
+            from test_tools.sharding import parse_shard
+
+            self.shard = parse_shard(options.shard)
+        if options.memory:
+            from test_tools.memory import check_tracemalloc
+
+            # Fail before test databases are created
+            check_tracemalloc()
+        self.dirty_tables = options.dirty_tables or options.verify_flush
+        self.verify_data = options.verify_data
+        self.password_hashers = None
+        super(DiscoveryDjangoTestSuiteRunner, self).__init__(**kwargs)
+
+    def setup_test_environment(self, **kwargs):
+        super(DiscoveryDjangoTestSuiteRunner, self).setup_test_environment(
+                                                                    **kwargs)
+        if self.options.fast_hasher:
+            from django.contrib.auth import hashers
+
+            self.password_hashers = settings.PASSWORD_HASHERS
+            # Other hashers are kept, so existing hashes can be checked
+            settings.PASSWORD_HASHERS = (FAST_PASSWORD_HASHER,) + tuple(
+                hasher for hasher in self.password_hashers
+                if hasher != FAST_PASSWORD_HASHER)
+            hashers.load_hashers()
+
+    def teardown_test_environment(self, **kwargs):
+        if self.password_hashers is not None:
+            from django.contrib.auth import hashers
+
+            settings.PASSWORD_HASHERS = self.password_hashers
+            self.password_hashers = None
+            hashers.load_hashers()
+        super(DiscoveryDjangoTestSuiteRunner, self).teardown_test_environment(
+                                                                    **kwargs)
+
+    def select_shard(self, suite):
+        ''' Leave only tests of the shard in suite '''
+        from test_tools.sharding import load_timings, split_suite
+
+        number, count = self.shard
+        durations = None
+        if self.options.shard_timings:
+            durations = load_timings(self.options.shard_timings)
+        chunk = split_suite(suite, count, durations)[number - 1]
+        return unittest.TestSuite([test for position, test in chunk])
+
+    def get_listeners(self):
+        ''' Listeners for collecting data about tests '''
+        options = self.options
+        listeners = []
+        queries = None
+        if options.count_queries:
+            from test_tools.queries import QueryListener
+
+            queries = QueryListener(top=options.slowest or 10)
+            listeners.append(queries)
+        listeners.append(TimingListener(top=options.slowest, queries=queries))
+        listeners.append(FailureListener())
+        if options.record_impact:
+            from test_tools.impact import ImpactListener
+
+            listeners.append(ImpactListener())
+        if options.profile:
+            from test_tools.profiling import ProfileListener
+
+            listeners.append(ProfileListener(options.profile))
+        if options.memory:
+            from test_tools.memory import MemoryListener
+
+            listeners.append(MemoryListener(top=options.slowest or 10))
+        return listeners
+
+    def select_impacted(self, suite):
+        ''' Leave only tests affected by changed files '''
+        from test_tools.impact import get_changed_files, select_impacted
+
+        changed_files = get_changed_files(self.options.changed,
+                                          self.options.changed_since)
+        impacted_suite = select_impacted(suite, changed_files)
+        if self.verbosity >= 1:
+            print "Selected {0} of {1} tests affected by {2} changed " \
+                  "files".format(impacted_suite.countTestCases(),
+                                 suite.countTestCases(), len(changed_files))
+        return impacted_suite
+
+    def select_failed(self, suite):
+        ''' Put tests which failed last time first or leave only them '''
+        failures = load_failures()
+        if not failures:
+            return suite
+        failed_suite = order_failed_first(suite, failures,
+                                          self.options.failed_only)
+        if self.verbosity >= 1 and self.options.failed_only:
+            print "Selected {0} of {1} tests which failed last time".format(
+                failed_suite.countTestCases(), suite.countTestCases())
+        return failed_suite
+
+    def load_test_module(self, app_name, module_name, path):
+        ''' Load tests from module of custom test package '''
+        full_name = '.'.join([app_name, 'tests', module_name])
+        if self.discovery_index is None or not os.path.exists(path):
+            return defaultTestLoader.loadTestsFromModule(
+                                                    import_module(full_name))
+        return self.discovery_index.load_module(full_name, path,
+                                        '.'.join([app_name, module_name]))
+
     def load_custom_test_package(self, module, app_name):
         ''' Load custom test package from module and app '''
-
-        for importer, module_name, ispkg in pkgutil.iter_modules(
-                                [os.path.dirname(module.__file__)]):
+        tests_dir = os.path.dirname(module.__file__)
+        for importer, module_name, ispkg in pkgutil.iter_modules([tests_dir]):
             try:
                 import_module('.'.join([app_name, 'tests']))
             except ImportError, e:
                 pass
             else:
-                module = import_module('.'.join([app_name, 'tests',
-                                             module_name]))
-                yield defaultTestLoader.loadTestsFromModule(module)
+                if ispkg:
+                    path = os.path.join(tests_dir, module_name, '__init__.py')
+                else:
+                    path = os.path.join(tests_dir, module_name + '.py')
+                yield self.load_test_module(app_name, module_name, path)
 
     def load_from_app(self, app_name):
         ''' Yielding a suite from application '''
+        if self.discovery_index is not None:
+            suite = self.discovery_index.load_app(app_name)
+            if suite is not None:
+                yield suite
+                return
         app = get_app(app_name.split('.')[-1])
         suite = build_suite(app)
         if suite.countTestCases():
-            yield suite
+            test_module = None
         else:
             test_module = get_test_module(app_name)
             if is_custom_test_package(test_module):
-                for test in self.load_custom_test_package(test_module,
-                                                          app_name):
-                    yield test
+                suite = unittest.TestSuite(self.load_custom_test_package(
+                                                    test_module, app_name))
+        if self.discovery_index is not None:
+            self.discovery_index.add_app(app_name,
+                                         get_app_paths(app, test_module),
+                                         suite)
+        yield suite
 
     def get_apps(self):
         try:
@@ -171,6 +572,12 @@ class DiscoveryDjangoTestSuiteRunner(PersistentTestDatabaseMixin,
             for test_label in test_labels:
                 # Handle case when app defined with dot
                 if '.' in test_label and test_label not in self.get_apps():
+                    if self.discovery_index is not None:
+                        new_suite = self.discovery_index.find(test_label)
+                        if new_suite is not None:
+                            suite.addTest(new_suite)
+                            continue
+
                     app_name = test_label.split('.')[0]
                     for app_label in self.get_apps():
                         if test_label.startswith(app_label):
@@ -209,11 +616,65 @@ class DiscoveryDjangoTestSuiteRunner(PersistentTestDatabaseMixin,
             for test in extra_tests:
                 suite.addTest(test)
 
-        return reorder_suite(suite, (TestCase,))
+        if self.discovery_index is not None:
+            self.discovery_index.save()
+
+        suite = reorder_suite(suite, (TestCase,))
+        if self.options.changed or self.options.changed_since:
+            suite = self.select_impacted(suite)
+        if self.shard:
+            suite = self.select_shard(suite)
+        if self.options.failed_first or self.options.failed_only:
+            suite = self.select_failed(suite)
+        return suite
+
+    def run_tests(self, test_labels, extra_tests=None, **kwargs):
+        ''' Run tests once or keep rerunning them in watch mode '''
+        if self.options.watch:
+            from test_tools.watch import Watcher, WATCH_INTERVAL
+
+            interval = self.options.watch_interval
+            if interval is None:
+                interval = WATCH_INTERVAL
+            return Watcher(self, test_labels, extra_tests, interval).run()
+        return super(DiscoveryDjangoTestSuiteRunner, self).run_tests(
+                                        test_labels, extra_tests, **kwargs)
+
+    def run_suite(self, suite, **kwargs):
+        '''
+        Run suite with listeners, split it between worker processes if
+        needed
+        '''
+        listeners = self.get_listeners()
+        for listener in listeners:
+            listener.startTestRun()
+        flusher = None
+        if self.dirty_tables:
+            from test_tools.flush import DirtyTableFlusher
+
+            flusher = DirtyTableFlusher(verify=self.options.verify_flush)
+            flusher.install()
+        if self.parallel > 1:
+            from test_tools.parallel import ParallelTestSuite
+
+            suite = ParallelTestSuite(suite, self.parallel,
+                                      self.worker_databases, listeners)
+        else:
+            suite = ListenedTestSuite(suite, listeners)
+        if self.options.junit_xml:
+            from test_tools.junit import JUnitXMLWriter, ReportedTestSuite
 
-if 'django_jenkins' in settings.INSTALLED_APPS:
-    from django_jenkins.runner import CITestSuiteRunner
+            suite = ReportedTestSuite(suite,
+                                      JUnitXMLWriter(self.options.junit_xml))
+        try:
+            result = super(DiscoveryDjangoTestSuiteRunner, self).run_suite(
+                                                            suite, **kwargs)
+        finally:
+            if flusher is not None:
+                flusher.uninstall()
+        for listener in listeners:
+            listener.stopTestRun()
+        return result
 
-    class JenkinsDiscoveryDjangoTestSuiteRunner(DiscoveryDjangoTestSuiteRunner,
-                                                CITestSuiteRunner):
-        ''' The same as DiscoveryDjangoTestSuiteRunner but for jenkins '''
+if 'django_jenkins' in settings.INSTALLED_APPS:
+    from test_tools.jenkins import JenkinsDiscoveryDjangoTestSuiteRunner
@@ -0,0 +1,129 @@
+''' Test case classes '''
+
+from django.core.management import call_command
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.test import TestCase
+from django.test.testcases import connections_support_transactions, \
+    disable_transaction_methods, restore_transaction_methods
+
+SAVEPOINT = 'test_tools_test'
+
+
+def is_sqlite(connection):
+    ''' Check if connection is to SQLite database '''
+    return connection.vendor == 'sqlite'
+
+
+class SharedDataTestCase(TestCase):
+    '''
+    Test case which builds data of setUpTestData once for the whole class
+    inside of a transaction which is rolled back after the last test. Every
+    test runs inside of a savepoint which is rolled back after it, so tests
+    see the class data without inserting it again. Fixtures are loaded once
+    for the class too::
+
+        class OrderTest(SharedDataTestCase):
+            @classmethod
+            def setUpTestData(cls):
+                cls.users = model_factory(User, username=get_fake_email(100),
+                                          save=True, bulk=True)
+
+    Objects of the class are shared by the tests, so tests should not rely
+    on changes made to them in memory by other tests.
+
+    If database doesn't support transactions the data is built before every
+    test like with setUp.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        ''' Create data shared by all the tests of the class '''
+
+    @classmethod
+    def get_databases(cls):
+        ''' Aliases of databases which are rolled back '''
+        if getattr(cls, 'multi_db', False):
+            return list(connections)
+        return [DEFAULT_DB_ALIAS]
+
+    @classmethod
+    def setUpClass(cls):
+        super(SharedDataTestCase, cls).setUpClass()
+        if not connections_support_transactions():
+            return
+        cls._isolation_levels = {}
+        for db in cls.get_databases():
+            transaction.enter_transaction_management(using=db)
+            transaction.managed(True, using=db)
+            connection = connections[db]
+            if is_sqlite(connection):
+                # pysqlite commits before every statement except DML, so
+                # SAVEPOINT would commit the class data. The transaction is
+                # opened explicitly instead.
+                connection.cursor()
+                cls._isolation_levels[db] = \
+                    connection.connection.isolation_level
+                connection.connection.isolation_level = None
+                connection.cursor().execute('BEGIN')
+        disable_transaction_methods()
+        try:
+            cls.load_fixtures()
+            cls.setUpTestData()
+        except Exception:
+            cls.rollback_class()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        if connections_support_transactions():
+            cls.rollback_class()
+        super(SharedDataTestCase, cls).tearDownClass()
+
+    @classmethod
+    def load_fixtures(cls):
+        ''' Load fixtures of the class '''
+        if hasattr(cls, 'fixtures'):
+            for db in cls.get_databases():
+                call_command('loaddata', *cls.fixtures, **{
+                    'verbosity': 0,
+                    'commit': False,
+                    'database': db,
+                })
+
+    @classmethod
+    def rollback_class(cls):
+        ''' Roll back the class data and leave transaction management '''
+        restore_transaction_methods()
+        for db in cls.get_databases():
+            transaction.rollback(using=db)
+            transaction.leave_transaction_management(using=db)
+            if db in cls._isolation_levels:
+                connections[db].connection.isolation_level = \
+                    cls._isolation_levels.pop(db)
+
+    def _fixture_setup(self):
+        if not connections_support_transactions():
+            super(SharedDataTestCase, self)._fixture_setup()
+            self.setUpTestData()
+            return
+
+        from django.contrib.sites.models import Site
+        Site.objects.clear_cache()
+
+        # Savepoints are run directly, Django ignores them for some backends
+        for db in self.get_databases():
+            connections[db].cursor().execute('SAVEPOINT ' + SAVEPOINT)
+
+    def _fixture_teardown(self):
+        if not connections_support_transactions():
+            return super(SharedDataTestCase, self)._fixture_teardown()
+
+        for db in self.get_databases():
+            cursor = connections[db].cursor()
+            cursor.execute('ROLLBACK TO SAVEPOINT ' + SAVEPOINT)
+            cursor.execute('RELEASE SAVEPOINT ' + SAVEPOINT)
+
+    def _post_teardown(self):
+        # Connections are not closed, they keep the transaction of the class
+        self._fixture_teardown()
+        self._urlconf_teardown()
@@ -0,0 +1,126 @@
+''' Durations of tests and fixtures collected across runs '''
+
+import sys
+import time
+
+from test_tools.cache import load_json, save_json
+from test_tools.listeners import TestListener
+
+HISTORY_FILE = 'timings.json'
+# Number of last durations kept for every test
+HISTORY_SIZE = 10
+# Test is reported as regression if it's slower than its average by the ratio
+# and by at least REGRESSION_MIN_DELTA seconds
+REGRESSION_RATIO = 1.5
+REGRESSION_MIN_DELTA = 0.05
+FIXTURES = ('setUpClass', 'tearDownClass', 'setUpModule', 'tearDownModule')
+# Most of classes and modules have no fixtures, don't keep their durations
+MIN_FIXTURE_DURATION = 0.001
+
+
+def load_history():
+    ''' Last durations of tests and fixtures by their ids '''
+    return load_json(HISTORY_FILE, {})
+
+
+def get_average_durations(history=None):
+    ''' Average duration of every test and fixture '''
+    if history is None:
+        history = load_history()
+    return dict((test_id, sum(durations) / len(durations))
+                for test_id, durations in history.items() if durations)
+
+
+def is_fixture(test_id):
+    ''' Check if id is of class or module setup or teardown '''
+    return test_id.rsplit('.', 1)[-1] in FIXTURES
+
+
+class TimingListener(TestListener):
+    '''
+    Collect wall time of every test and fixture, save it to history and
+    report the slowest tests and regressions. Slowest tests are reported
+    with number of queries and SQL time if query listener is given.
+    '''
+
+    def __init__(self, top=0, stream=None, queries=None):
+        self.top = top
+        self.stream = stream or sys.stderr
+        self.queries = queries
+        self.durations = {}
+        self.started = None
+
+    def startTestRun(self):
+        self.durations = {}
+
+    def beforeTest(self, test):
+        self.started = time.time()
+
+    def afterTest(self, test):
+        self.durations[test.id()] = time.time() - self.started
+
+    def fixture(self, name, duration):
+        if duration >= MIN_FIXTURE_DURATION:
+            self.durations[name] = self.durations.get(name, 0) + duration
+
+    def get_data(self):
+        return self.durations
+
+    def merge_data(self, data):
+        # Module fixtures may run in several workers, their time is summed
+        for test_id, duration in data.items():
+            self.durations[test_id] = self.durations.get(test_id, 0) + \
+                duration
+
+    def stopTestRun(self):
+        history = load_history()
+        averages = get_average_durations(history)
+        for test_id, duration in self.durations.items():
+            durations = history.setdefault(test_id, [])
+            durations.append(duration)
+            del durations[:-HISTORY_SIZE]
+        save_json(HISTORY_FILE, history)
+        if self.top:
+            self.report(averages)
+
+    def get_regressions(self, averages):
+        ''' Tuples of average and current durations with test id '''
+        regressions = []
+        for test_id, duration in self.durations.items():
+            average = averages.get(test_id)
+            if average is not None and \
+                    duration > average * REGRESSION_RATIO and \
+                    duration - average > REGRESSION_MIN_DELTA:
+                regressions.append((duration - average, average, duration,
+                                    test_id))
+        regressions.sort(reverse=True)
+        return regressions[:self.top]
+
+    def report(self, averages):
+        ''' Write the slowest tests, fixtures and regressions '''
+        tests = [(duration, test_id) for test_id, duration
+                 in self.durations.items() if not is_fixture(test_id)]
+        fixtures = [(duration, test_id) for test_id, duration
+                    in self.durations.items() if is_fixture(test_id)]
+        write = self.stream.write
+
+        write('\nSlowest tests:\n')
+        for duration, test_id in sorted(tests, reverse=True)[:self.top]:
+            if self.queries is not None and test_id in self.queries.stats:
+                count, sql_duration = self.queries.stats[test_id]
+                write('{0:9.3f}s {1:6d} queries {2:9.1f} ms  {3}\n'.format(
+                    duration, count, sql_duration * 1000, test_id))
+            else:
+                write('{0:9.3f}s  {1}\n'.format(duration, test_id))
+
+        write('\nSlowest class and module fixtures:\n')
+        for duration, test_id in sorted(fixtures, reverse=True)[:self.top]:
+            write('{0:9.3f}s  {1}\n'.format(duration, test_id))
+
+        regressions = self.get_regressions(averages)
+        if regressions:
+            write('\nRegressions against average of last {0} runs:\n'.format(
+                                                            HISTORY_SIZE))
+            for delta, average, duration, test_id in regressions:
+                write('{0:9.3f}s -> {1:.3f}s  {2}\n'.format(average, duration,
+                                                            test_id))
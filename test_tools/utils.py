@@ -1,21 +1,56 @@
 ''' Utility functions for tests '''
 
-import mock
-import hotshot
-import os
-
 from hashlib import sha1
+from itertools import count as iter_count, islice
 from functools import wraps
-from django.contrib.auth.models import User
-from django.test import Client
 from django.utils.datastructures import SortedDict
-from django.contrib.sites.models import Site
 from django.conf import settings
+from django.utils.functional import lazy
+
+# Heavy modules like mock, auth models, test client or profiling are imported
+# by helpers which need them, so test modules which import only light helpers
+# don't pay for them.
+
+BULK_BATCH_SIZE = 500
+
+
+def get_profile_log_base():
+    ''' Folder for profile logs from settings '''
+    from test_tools import profiling
+    return profiling.get_profile_log_base()
 
-try:
-    PROFILE_LOG_BASE = settings.PROFILE_LOG_BASE
-except AttributeError:
-    PROFILE_LOG_BASE = "/tmp"
+
+# Old name of the folder, settings are read when it's used
+PROFILE_LOG_BASE = lazy(get_profile_log_base, str)()
+
+
+class Comparison(object):
+    '''
+    Differences between expected and actual objects. Only first max_objects
+    of every kind are kept, the rest are counted.
+    '''
+
+    def __init__(self, max_objects):
+        self.max_objects = max_objects
+        self.count = 0
+        self.actual_ids = []
+        self.missed = []
+        self.extra = []
+        self.extra_count = 0
+        self.changed = []
+        self.changed_count = 0
+
+    def add_extra(self, obj):
+        ''' Remember object which is not expected '''
+        self.extra_count += 1
+        if len(self.extra) < self.max_objects:
+            self.extra.append(obj)
+
+    def add_changed(self, obj, changes):
+        ''' Remember expected object with fields which differ '''
+        self.changed_count += 1
+        if len(self.changed) < self.max_objects:
+            self.changed.append((obj, changes))
 
 
 class DebugList(list):
@@ -23,88 +58,394 @@ class DebugList(list):
     Extended list that provide diff functionality for model objects
     '''
     fields = None
+    # Number of objects of every kind shown in diff message
+    max_diff_objects = 50
+    # Number of rows fetched at once when comparing with a queryset
+    diff_chunk_size = 2000
 
     def __init__(self, *args, **kwargs):
         ''' Intialize tracked fields '''
         self.fields = kwargs.pop('fields', ['id'])
         super(DebugList, self).__init__(*args, **kwargs)
 
-    def get_order_diff(self, objects, message):
+    def get_attnames(self):
+        ''' Attributes of tracked fields, foreign keys are compared by id '''
+        if not self:
+            return list(self.fields)
+        attnames = dict((field.name, field.attname)
+                        for field in self[0]._meta.fields)
+        return [attnames.get(name, name) for name in self.fields]
+
+    def get_model_fields(self):
+        ''' Model fields of tracked names, None for other attributes '''
+        if not self:
+            return [None] * len(self.fields)
+        fields = {}
+        for field in self[0]._meta.fields:
+            fields[field.name] = fields[field.attname] = field
+        return [fields.get(name) for name in self.fields]
+
+    def convert_value(self, field, value):
+        ''' Python value of field, so e.g. datetime equals to its date '''
+        from django.core.exceptions import ValidationError
+        if field is None:
+            return value
+        try:
+            return field.to_python(value)
+        except ValidationError:
+            return value
+
+    def get_rows(self, objects, attnames):
+        ''' Id, values of tracked fields and object for every object '''
+        for obj in objects:
+            yield obj.id, tuple(getattr(obj, attname)
+                                for attname in attnames), obj
+
+    def get_queryset_rows(self, queryset, fields, ordered=False):
+        '''
+        Id and values of tracked fields fetched with values_list by chunks,
+        so model instances are not built and memory doesn't grow with the
+        number of rows. Chunks follow primary key unless order matters.
+        '''
+        values = queryset.values_list('pk', *fields)
+        query = values.query
+        if query.low_mark or query.high_mark is not None:
+            # Sliced queryset can't be sliced or filtered again
+            chunks = [values.iterator()]
+        elif ordered:
+            chunks = self.get_offset_chunks(self.get_stable_order(values))
+        else:
+            chunks = self.get_pk_chunks(values.order_by('pk'))
+        for chunk in chunks:
+            for row in chunk:
+                yield row[0], row[1:], None
+
+    def get_stable_order(self, values):
+        '''
+        Queryset with primary key as the last ordering, so rows with equal
+        values are not skipped or repeated by offset chunks
+        '''
+        query = values.query
+        if query.extra_order_by:
+            ordering = query.extra_order_by
+        elif not query.default_ordering:
+            ordering = query.order_by
+        else:
+            ordering = query.order_by or query.model._meta.ordering
+        return values.order_by(*(list(ordering) + ['pk']))
+
+    def get_offset_chunks(self, values):
+        ''' Chunks of rows in queryset order '''
+        offset = 0
+        while True:
+            chunk = list(values[offset:offset + self.diff_chunk_size])
+            yield chunk
+            if len(chunk) < self.diff_chunk_size:
+                break
+            offset += self.diff_chunk_size
+
+    def get_pk_chunks(self, values):
+        '''
+        Chunks of rows ordered by primary key. Joins of queryset can repeat
+        rows of one object, so rows of the last primary key of a chunk which
+        didn't fit into it are fetched before the next chunk.
+        '''
+        chunk = list(values[:self.diff_chunk_size])
+        while chunk:
+            yield chunk
+            if len(chunk) < self.diff_chunk_size:
+                break
+            last_pk = chunk[-1][0]
+            if not values.query.distinct:
+                fetched = sum(1 for row in chunk if row[0] == last_pk)
+                yield list(values.filter(pk=last_pk)[fetched:])
+            chunk = list(values.filter(pk__gt=last_pk)[
+                                                    :self.diff_chunk_size])
+
+    def get_actual_rows(self, objects, ordered=False, attnames=None):
+        ''' Rows of actual objects, tracked fields are skipped without names '''
+        from django.db.models.query import QuerySet
+        if isinstance(objects, QuerySet):
+            if attnames is None:
+                return self.get_queryset_rows(objects, (), ordered)
+            names = set(['pk'])
+            for field in objects.model._meta.fields:
+                names.update([field.name, field.attname])
+            if names.issuperset(self.fields):
+                return self.get_queryset_rows(objects, self.fields, ordered)
+            # Properties and other attributes can't be fetched by values_list
+            objects = objects.iterator()
+        return self.get_rows(objects, attnames or ())
+
+    def compare(self, rows, ordered=False, attnames=()):
+        '''
+        Compare self with rows of actual objects in one pass. Expected
+        objects are indexed by id once, so comparison takes linear time.
+        Objects with the same id, like unsaved ones, are matched in order of
+        their positions.
+        '''
+        positions = {}
+        for position in range(len(self) - 1, -1, -1):
+            positions.setdefault(self[position].id, []).append(position)
+        fields = self.get_model_fields() if attnames else ()
+        comparison = Comparison(self.max_diff_objects)
+        matched = set()
+        for obj_id, values, obj in rows:
+            comparison.count += 1
+            if ordered:
+                comparison.actual_ids.append(obj_id)
+            if not positions.get(obj_id):
+                comparison.add_extra(obj if obj is not None else values)
+                continue
+            position = positions[obj_id].pop()
+            matched.add(position)
+            expected = self[position]
+            changes = []
+            for name, attname, field, value in zip(self.fields, attnames,
+                                                   fields, values):
+                expected_value = getattr(expected, attname)
+                if self.convert_value(field, expected_value) != \
+                        self.convert_value(field, value):
+                    changes.append((name, expected_value, value))
+            if changes:
+                comparison.add_changed(expected, changes)
+        comparison.missed = [obj for index, obj in enumerate(self)
+                             if index not in matched]
+        return comparison
+
+    def get_order_diff(self, actual_ids, message):
         ''' Build wrong order message '''
-        convert_to_id = lambda obj: obj.id
-        actual_ids = map(convert_to_id, objects)
-        expected_ids = map(convert_to_id, self)
-        diff = reason = ''
+        expected_ids = [obj.id for obj in self]
         if actual_ids != expected_ids and set(actual_ids) == set(expected_ids):
             reason = "Wrong ID order"
-            diff = "Expect: {0}\nGot:    {1}".format(
-                ' '.join(map(str, actual_ids)),
-                ' '.join(map(str, expected_ids)))
-            msg = message.format(reason, diff)
-            return msg
+            first = 0
+            while actual_ids[first] == expected_ids[first]:
+                first += 1
+            last = first + self.max_diff_objects
+            diff = "First difference at position {0}\n" \
+                   "Expect: {1}\nGot:    {2}".format(first,
+                ' '.join(map(str, expected_ids[first:last])),
+                ' '.join(map(str, actual_ids[first:last])))
+            return message.format(reason, diff)
+
+    def build_diff(self, obj_list, total):
+        ''' Create text message for objects or rows of values '''
+        result = []
+        for obj in obj_list:
+            if isinstance(obj, tuple):
+                values = zip(self.fields, obj)
+                name = self[0].__class__.__name__ if self else 'Row'
+            else:
+                values = [(field_name, getattr(obj, field_name))
+                          for field_name in self.fields]
+                name = obj.__class__.__name__
+            result.append('{0}({1})'.format(name, ', '.join(
+                            '{0}={1}'.format(*key_value)
+                            for key_value in values)))
+        if total > len(obj_list):
+            result.append('... and {0} more'.format(total - len(obj_list)))
+        return "\n".join(result)
+
+    def build_changes(self, comparison):
+        ''' Create text message for objects with different fields '''
+        result = []
+        for obj, changes in comparison.changed:
+            result.append('{0}(id={1}): {2}'.format(obj.__class__.__name__,
+                obj.id, ', '.join('{0}: {1!r} != {2!r}'.format(*change)
+                                  for change in changes)))
+        if comparison.changed_count > len(comparison.changed):
+            result.append('... and {0} more'.format(
+                        comparison.changed_count - len(comparison.changed)))
+        return "\n".join(result)
+
+    def is_different(self, comparison, ordered=False):
+        ''' Check if comparison found any difference '''
+        if comparison.count != len(self):
+            return True
+        if ordered and comparison.actual_ids != [obj.id for obj in self]:
+            return True
+        return bool(comparison.missed or comparison.extra_count or
+                    comparison.changed_count)
 
-    def get_diff(self, objects, ordered=False):
-        ''' Build a diff message '''
-        if not isinstance(objects, list):
-            objects = list(objects)
+    def get_comparison_diff(self, comparison, ordered=False):
+        ''' Build a diff message from comparison, empty if it has no diff '''
+        if not self.is_different(comparison, ordered):
+            return ''
         message = "{0}\n{1}"
         reason = None
-        diff = ''
-        if len(self) != len(objects):
+        if len(self) != comparison.count:
             reason = "Expected length: {0} but got {1} objects".format(
-                                                    len(self), len(objects))
+                                                len(self), comparison.count)
         elif ordered:
-            msg = self.get_order_diff(objects, message)
+            msg = self.get_order_diff(comparison.actual_ids, message)
             if msg is not None:
                 return msg
 
-        map_objects = lambda obj_list: {obj.id: obj for obj in obj_list}
-        missed_objects = filter(lambda obj: not obj.id in map_objects(objects),
-                                                                        self)
-        extra_objects = filter(lambda obj: not obj.id in map_objects(self),
-                                                                    objects)
-
-        def build_diff(obj_list):
-            ''' Create text message for object '''
-            result = []
-            for obj in obj_list:
-                fields = {}
-                for field_name in self.fields:
-                    fields[field_name] = getattr(obj, field_name)
-                fields = map(lambda key_value: '{0}={1}'.format(*key_value),
-                    fields.items())
-                result.append('{0}({1})'.format(obj.__class__.__name__,
-                                                ', '.join(fields)))
-            return result
-
-        if not reason and (missed_objects or extra_objects):
+        missed, extra = comparison.missed, comparison.extra
+        if not reason and (missed or extra or comparison.changed):
             reason = "Expected and actual objects are different"
 
-        if missed_objects:
-            diff = "Missed objects: \n{0}".format(
-                                    "\n".join(build_diff(missed_objects)))
+        sections = []
+        if missed:
+            sections.append("Missed objects: \n{0}".format(self.build_diff(
+                                missed[:self.max_diff_objects], len(missed))))
 
-        if extra_objects:
-            diff += "\n\nExtra objects: \n{0}".format(
-                                        "\n".join(build_diff(extra_objects)))
+        if extra:
+            sections.append("Extra objects: \n{0}".format(self.build_diff(
+                                            extra, comparison.extra_count)))
 
-        return message.format(reason, diff)
+        if comparison.changed:
+            sections.append("Changed objects: \n{0}".format(
+                                            self.build_changes(comparison)))
 
-    def has_diff(self, objects, ordered=False):
-        ''' Return true if all the objects has the same ids as in self '''
-        actual_ids = map(lambda obj: obj.id, objects)
-        expected_ids = map(lambda obj: obj.id, self)
-        if len(actual_ids) != len(expected_ids):
-            return True
-        if ordered:
-            return actual_ids != expected_ids
-        return set(actual_ids) != set(expected_ids)
+        return message.format(reason, "\n\n".join(sections))
+
+    def get_comparison(self, objects, ordered=False, fields=True):
+        '''
+        Compare self with actual objects by ids and, if fields is true, by
+        tracked fields
+        '''
+        attnames = self.get_attnames() if fields else None
+        return self.compare(self.get_actual_rows(objects, ordered, attnames),
+                            ordered, attnames or ())
+
+    def get_diff(self, objects, ordered=False):
+        ''' Build a diff message '''
+        return self.get_comparison_diff(self.get_comparison(objects, ordered),
+                                        ordered)
+
+    def has_diff(self, objects, ordered=False, fields=False):
+        '''
+        Return true if objects have other ids than self. With fields=True
+        tracked fields are compared too, as get_diff does.
+        '''
+        return self.is_different(
+                    self.get_comparison(objects, ordered, fields), ordered)
+
+
+def reserve_pks(model, using, num):
+    '''
+    Return free primary keys for objects which are going to be inserted or
+    None if backend doesn't allow to know them before insert
+    '''
+    from django.db import connections
+    from django.db.models import AutoField
+
+    opts = model._meta
+    connection = connections[using]
+    if not num or not isinstance(opts.pk, AutoField):
+        return None
+    if connection.vendor == 'postgresql':
+        # Sequence gives keys atomically, concurrent inserts can't take them
+        cursor = connection.cursor()
+        cursor.execute('SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                       'FROM generate_series(1, %s)',
+                       [connection.ops.quote_name(opts.db_table),
+                        opts.pk.column, num])
+        return [row[0] for row in cursor.fetchall()]
+    return None
+
+
+def has_consecutive_pks(connection):
+    '''
+    Check if rows inserted by one statement get consecutive primary keys.
+    SQLite serializes writes of the connection, MySQL gives consecutive
+    keys unless innodb_autoinc_lock_mode is 2 (default since MySQL 8).
+    '''
+    if connection.vendor == 'sqlite':
+        return True
+    if connection.vendor == 'mysql':
+        cursor = connection.cursor()
+        cursor.execute('SELECT @@innodb_autoinc_lock_mode')
+        return int(cursor.fetchone()[0]) != 2
+    return False
+
+
+def insert_rows(model, objects, using):
+    '''
+    Insert objects without primary keys and return primary keys given
+    to them by the database
+    '''
+    from django.db import connections
+    from django.db.models import AutoField
+    from django.db.models.sql import InsertQuery
+
+    opts = model._meta
+    connection = connections[using]
+    fields = [field for field in opts.local_fields
+              if not isinstance(field, AutoField)]
+    query = InsertQuery(model)
+    query.insert_values(fields, objects)
+    compiler = query.get_compiler(using=using)
+    compiler.return_id = False
+    statements = compiler.as_sql()
+    cursor = connection.cursor()
+    pks = []
+    for sql, params in statements:
+        cursor.execute(sql, params)
+        pks.append(connection.ops.last_insert_id(cursor, opts.db_table,
+                                                 opts.pk.column))
+    if len(statements) == 1 and len(objects) > 1:
+        # Rows of one statement get consecutive keys. SQLite returns key of
+        # the last row and MySQL returns key of the first one.
+        first = pks[0]
+        if connection.vendor == 'sqlite':
+            first -= len(objects) - 1
+        pks = range(first, first + len(objects))
+    return pks
+
+
+def bulk_save(model, objects, batch_size=None):
+    ''' Insert objects with bulk_create by batches and set primary keys '''
+    from django.db import connections, router, transaction
+    from django.db.models import AutoField
+
+    using = router.db_for_write(model)
+    connection = connections[using]
+    batch_size = batch_size or BULK_BATCH_SIZE
+    new_objects = [obj for obj in objects if obj.pk is None]
+    old_objects = [obj for obj in objects if obj.pk is not None]
+    saved_objects = objects
+    pks = reserve_pks(model, using, len(new_objects))
+    if pks is not None:
+        for obj, pk in zip(new_objects, pks):
+            obj.pk = pk
+    elif (new_objects and connection.vendor in ('sqlite', 'mysql') and
+          isinstance(model._meta.pk, AutoField) and
+          not has_consecutive_pks(connection)):
+        # Keys of one statement may interleave with other inserts
+        for obj in new_objects:
+            obj.save(using=using, force_insert=True)
+        saved_objects = old_objects
+    elif (new_objects and connection.vendor in ('sqlite', 'mysql') and
+          isinstance(model._meta.pk, AutoField)):
+        # MAX(pk) + 1 isn't safe with concurrent inserts, so primary keys
+        # are taken from inserts of objects
+        fields = [field for field in model._meta.local_fields
+                  if not isinstance(field, AutoField)]
+        size = min(batch_size,
+                   connection.ops.bulk_batch_size(fields, new_objects))
+        for start in range(0, len(new_objects), size):
+            batch = new_objects[start:start + size]
+            for obj, pk in zip(batch, insert_rows(model, batch, using)):
+                obj.pk = pk
+        transaction.commit_unless_managed(using=using)
+        saved_objects = old_objects
+    for start in range(0, len(saved_objects), batch_size):
+        model.objects.using(using).bulk_create(
+                                    saved_objects[start:start + batch_size])
+    for obj in objects:
+        obj._state.adding = False
+        obj._state.db = using
+    return objects
 
 
 def model_factory(model, *args, **kwargs):
     ''' Simple object fabric for tests '''
     save = kwargs.pop('save', False)
     num = kwargs.pop('num', 1)
+    bulk = kwargs.pop('bulk', False)
+    batch_size = kwargs.pop('batch_size', None)
     kwargs = SortedDict(kwargs)
     if kwargs and not isinstance(kwargs.values()[0], list):
         for key in kwargs:
@@ -112,7 +453,7 @@ def model_factory(model, *args, **kwargs):
 
     def _create_model_obj(**_kwargs):
         ''' Create or build object '''
-        if save:
+        if save and not bulk:
             return model.objects.create(*args, **_kwargs)
         return model(*args, **_kwargs)
 
@@ -128,20 +469,172 @@ def model_factory(model, *args, **kwargs):
     else:
         models.append(_create_model_obj())
 
+    if save and bulk:
+        bulk_save(model, models, batch_size)
+
     if len(models) == 1:
         return models[0]
     return models
 
 
-def get_logged_in_client():
-    user = model_factory(User, email=get_fake_email())
-    user.set_password('password')
-    user.save()
-    client = Client()
-    client.login(username=get_fake_email(), password='password')
+def iter_model_factory(model, *args, **kwargs):
+    '''
+    Streaming variant of model_factory which yields objects one by one, so
+    memory doesn't depend on number of objects. Values can be constants,
+    lists or iterators consumed one item per object, and callables called
+    with number of the object. Objects are created until count objects are
+    made or any list or iterator is exhausted. With bulk=True lists of
+    batch_size objects are yielded, they are inserted if save=True.
+    '''
+    save = kwargs.pop('save', False)
+    bulk = kwargs.pop('bulk', False)
+    count = kwargs.pop('count', None)
+    batch_size = kwargs.pop('batch_size', None) or BULK_BATCH_SIZE
+    fields = kwargs.keys()
+    values = {}
+    for key, value in kwargs.items():
+        if isinstance(value, (list, tuple)):
+            value = iter(value)
+        values[key] = value
+
+    def _iter_objects():
+        ''' Create or build objects while there are values '''
+        numbers = iter_count() if count is None else xrange(count)
+        for number in numbers:
+            model_kw = {}
+            for key, value in values.items():
+                if hasattr(value, 'next'):
+                    try:
+                        model_kw[key] = value.next()
+                    except StopIteration:
+                        return
+                elif callable(value):
+                    model_kw[key] = value(number)
+                else:
+                    model_kw[key] = value
+            if save and not bulk:
+                yield model.objects.create(*args, **model_kw)
+            else:
+                yield model(*args, **model_kw)
+
+    def _iter_batches(objects):
+        ''' Split objects to batches and insert them '''
+        while True:
+            batch = DebugList(islice(objects, batch_size), fields=fields)
+            if not batch:
+                return
+            if save:
+                bulk_save(model, batch, batch_size)
+            yield batch
+
+    if bulk:
+        return _iter_batches(_iter_objects())
+    return _iter_objects()
+
+
+SESSION_KEY_CHARS = '1234567890abcdef'
+# Fast hasher which can be put first into PASSWORD_HASHERS in tests
+FAST_PASSWORD_HASHER = 'django.contrib.auth.hashers.MD5PasswordHasher'
+
+# Hashes of passwords, so every user doesn't pay for hashing
+_password_hashes = {}
+# Numbers of users created for logged in clients
+_client_numbers = iter_count()
+
+
+def get_password_hash(password='password'):
+    ''' Hash of password which is made once per process '''
+    from django.contrib.auth.hashers import make_password
+
+    if password not in _password_hashes:
+        _password_hashes[password] = make_password(password)
+    return _password_hashes[password]
+
+
+def get_session_data(user):
+    ''' Session content of logged in user '''
+    from django.contrib.auth import BACKEND_SESSION_KEY, SESSION_KEY
+
+    return {SESSION_KEY: user.pk,
+            BACKEND_SESSION_KEY: settings.AUTHENTICATION_BACKENDS[0]}
+
+
+def set_session_cookie(client, session_key):
+    ''' Set session cookie of client the same way as Client.login does '''
+    session_cookie = settings.SESSION_COOKIE_NAME
+    client.cookies[session_cookie] = session_key
+    client.cookies[session_cookie].update({
+        'max-age': None,
+        'path': '/',
+        'domain': settings.SESSION_COOKIE_DOMAIN,
+        'secure': settings.SESSION_COOKIE_SECURE or None,
+        'expires': None,
+    })
     return client
 
 
+def login_client(user, client=None):
+    '''
+    Log client in as user by saving session directly, without password
+    check and login request
+    '''
+    from django.test import Client
+    from django.utils.importlib import import_module
+
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session.update(get_session_data(user))
+    session.save()
+    return set_session_cookie(client or Client(), session.session_key)
+
+
+def get_logged_in_clients(num=1, users=None, **kwargs):
+    '''
+    Clients logged in as distinct users. Users are inserted by one query
+    with hash of 'password' made once, kwargs are passed to model_factory.
+    Sessions are inserted by one query with database session backend.
+    '''
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.models import Session
+    from django.test import Client
+    from django.utils.crypto import get_random_string
+    from django.utils.importlib import import_module
+
+    if users is None:
+        kwargs.setdefault('username', ['client_{0}@example.com'.format(
+            _client_numbers.next()) for counter in range(num)])
+        kwargs.setdefault('password', get_password_hash())
+        for key, value in kwargs.items():
+            if not isinstance(value, list):
+                kwargs[key] = [value] * num
+        users = model_factory(User, save=True, bulk=True, **kwargs)
+        if not isinstance(users, list):
+            users = [users]
+
+    if settings.SESSION_ENGINE != 'django.contrib.sessions.backends.db':
+        clients = [login_client(user) for user in users]
+    else:
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        expire_date = store.get_expiry_date()
+        sessions = [Session(session_key=get_random_string(32,
+                                                          SESSION_KEY_CHARS),
+                            session_data=store.encode(get_session_data(user)),
+                            expire_date=expire_date) for user in users]
+        Session.objects.bulk_create(sessions)
+        clients = [set_session_cookie(Client(), session.session_key)
+                   for session in sessions]
+    if len(clients) == 1:
+        return clients[0]
+    return clients
+
+
+def get_logged_in_client():
+    from django.contrib.auth.models import User
+
+    user = model_factory(User, email=get_fake_email(),
+                         password=get_password_hash(), save=True)
+    return login_client(user)
+
+
 def get_form(forms, fields):
     '''
     Simply iterate over forms and return first occurred with
@@ -157,12 +650,87 @@ def get_form(forms, fields):
                                                         ', '.join(fields)))
 
 
+# Name of the state which test databases keep when Site is created in them
+SITE_STATE = 'site'
+# Aliases and names of databases where Site of SITE_ID is known to exist
+_site_databases = set()
+
+
+def reset_site_cache(using):
+    ''' Forget that database has Site, after it's flushed '''
+    for key in list(_site_databases):
+        if key[0] == using:
+            _site_databases.discard(key)
+
+
+def create_site(using):
+    ''' Get or create Site of SITE_ID in database '''
+    from django.contrib.sites.models import Site
+
+    return Site.objects.using(using).get_or_create(pk=settings.SITE_ID,
+        defaults={'domain': 'example.com', 'name': 'example.com'})[0]
+
+
+def ensure_site(using=None):
+    '''
+    Create Site of SITE_ID unless it exists. Test databases get the site
+    when they are synced or flushed and remember it in their state, so the
+    site is looked up once per database, not before every test. Sites
+    created inside of a test transaction are rolled back, so they are
+    looked up again by the next test.
+    '''
+    from django.contrib.sites.models import Site
+    from django.db import connections, router, transaction
+    from test_tools.schema import get_state
+
+    using = using or router.db_for_write(Site)
+    connection = connections[using]
+    key = (using, connection.settings_dict['NAME'])
+    if key in _site_databases:
+        return
+    if get_state(connection, SITE_STATE) != str(settings.SITE_ID):
+        create_site(using)
+        if transaction.is_managed(using=using):
+            return
+    _site_databases.add(key)
+
+
 def site_required(func):
-    ''' Simply creates a Site from settings '''
+    '''
+    Make sure a Site from settings exists before decorated test function
+    runs. Tests of decorated django test case class get the site inside of
+    their transaction, so it's rolled back or flushed together with other
+    data and the cache of ensure_site stays right.
+    '''
+    if isinstance(func, type):
+        if hasattr(func, '_pre_setup'):
+            pre_setup = func._pre_setup
+
+            def _pre_setup(self):
+                ''' Create a Site after the test transaction is started '''
+                pre_setup(self)
+                ensure_site()
+
+            func._pre_setup = _pre_setup
+            return func
+
+        set_up_class = func.__dict__.get('setUpClass')
+
+        def setUpClass(cls):
+            ''' Create a Site before the tests of class '''
+            ensure_site()
+            if set_up_class is not None:
+                set_up_class.__get__(None, cls)()
+            else:
+                super(func, cls).setUpClass()
+
+        func.setUpClass = classmethod(setUpClass)
+        return func
+
     @wraps(func)
     def _wrapper(*args, **kwargs):
         ''' Create a Site before call a test function '''
-        model_factory(Site, id=settings.SITE_ID, save=True)
+        ensure_site()
         return func(*args, **kwargs)
 
     return _wrapper
@@ -173,6 +741,8 @@ def no_database(func):
     @wraps(func)
     def wrapped_func(*args, **kwargs):
         ''' Execute original function in no database context '''
+        import mock
+
         cursor_wrapper = mock.Mock()
         cursor_wrapper.side_effect = \
             RuntimeError("No touching the database!")
@@ -193,44 +763,18 @@ def get_fake_email(num=1):
     return emails
 
 
+def iter_fake_emails(start=0):
+    ''' Endless fake emails starting from 'email_0@example.com' '''
+    for counter in iter_count(start):
+        yield 'email_{0}@example.com'.format(counter)
+
+
 def get_sha1():
     ''' Return always the same valid sha1 hash '''
     return sha1('some key').hexdigest()
 
 
-def profile(log_file):
-    """Profile some callable.
-
-    This decorator uses the hotshot profiler to profile some callable (like
-    a view function or method) and dumps the profile data somewhere sensible
-    for later processing and examination.
-
-    It takes one argument, the profile log name. If it's a relative path, it
-    places it under the PROFILE_LOG_BASE. It also inserts a time stamp into the
-    file name, such that 'my_view.prof' become 'my_view-20100211T170321.prof',
-    where the time stamp is in UTC. This makes it easy to run and compare
-    multiple trials.
-    """
-
-    if not os.path.isabs(log_file):
-        log_file = os.path.join(PROFILE_LOG_BASE, log_file)
-
-    def _outer(f):
-        def _inner(*args, **kwargs):
-            # Add a timestamp to the profile output when the callable
-            # is actually called.
-            (base, ext) = os.path.splitext(log_file)
-            final_log_file = base + ext
-            try:
-                os.unlink(final_log_file)
-            except OSError:
-                pass
-            prof = hotshot.Profile(final_log_file)
-            try:
-                ret = prof.runcall(f, *args, **kwargs)
-            finally:
-                prof.close()
-            return ret
-
-        return _inner
-    return _outer
+def profile(log_file, merge=False, collapsed=False):
+    ''' Decorator which profiles callable, see test_tools.profiling.profile '''
+    from test_tools import profiling
+    return profiling.profile(log_file, merge, collapsed)
@@ -0,0 +1,226 @@
+''' Resident runner which reruns tests affected by changed files '''
+
+import os
+import signal
+import sys
+import time
+import traceback
+
+from django.db import connections
+from django.utils.importlib import import_module
+from test_tools.discovery import DiscoveryIndex
+from test_tools.impact import EXTERNAL_DIRS, get_impacted_tests, \
+    get_project_root, get_source_path
+
+# Seconds between checks of project files
+WATCH_INTERVAL = 1.0
+
+
+def get_source_files(root):
+    ''' Modification time of every python file of the project '''
+    files = {}
+    for path, dirs, names in os.walk(root):
+        dirs[:] = [name for name in dirs if not name.startswith('.') and
+                   name not in EXTERNAL_DIRS]
+        for name in names:
+            if name.endswith('.py'):
+                filename = os.path.join(path, name)
+                try:
+                    files[filename] = os.stat(filename).st_mtime
+                except OSError:
+                    pass
+    return files
+
+
+def get_changed_files(old, new):
+    ''' Files which were added, removed or modified '''
+    return set(path for path in set(old) | set(new)
+               if old.get(path) != new.get(path))
+
+
+def interrupt(signum, frame):
+    ''' Stop watcher on SIGTERM the same way as on Ctrl+C '''
+    raise KeyboardInterrupt
+
+
+def get_loaded_files():
+    ''' Python files of modules imported in current process '''
+    loaded = set()
+    for module in sys.modules.values():
+        filename = getattr(module, '__file__', None)
+        if filename:
+            filename = os.path.abspath(filename)
+            if filename.endswith(('.pyc', '.pyo')):
+                filename = filename[:-1]
+            loaded.add(filename)
+    return loaded
+
+
+class Watcher(object):
+    '''
+    Set up test environment and databases once, then poll project files
+    and run tests of every change in a forked child, so settings, apps and
+    databases are not set up again. Children import test modules and
+    changed code fresh. If a module imported by the watcher itself, like
+    models or settings, is changed, the watcher restarts.
+    '''
+
+    def __init__(self, runner, test_labels, extra_tests=None,
+                 interval=WATCH_INTERVAL):
+        self.runner = runner
+        self.test_labels = list(test_labels)
+        self.extra_tests = extra_tests
+        self.interval = interval
+        self.root = get_project_root()
+
+    def write(self, message):
+        ''' Print message about watcher state '''
+        sys.stderr.write(message + '\n')
+        sys.stderr.flush()
+
+    def get_module_label(self, path):
+        ''' Label of test module of the file or None '''
+        for app_name in self.runner.get_apps():
+            try:
+                app_dir = os.path.dirname(os.path.abspath(
+                                        import_module(app_name).__file__))
+            except ImportError:
+                continue
+            if path == os.path.join(app_dir, 'tests.py'):
+                return app_name
+            tests_dir = os.path.join(app_dir, 'tests') + os.sep
+            if path.startswith(tests_dir):
+                name = path[len(tests_dir):].split(os.sep)[0]
+                if name != '__init__.py':
+                    return '.'.join([app_name, name.rsplit('.py', 1)[0]])
+        return None
+
+    def get_labels(self, changed_files):
+        '''
+        Labels of test modules which were changed, which use changed test
+        classes, or which executed changed code according to the impact
+        map. None if it's not known which tests are affected.
+        '''
+        index = DiscoveryIndex()
+        labels = set()
+        other_files = set()
+        for path in changed_files:
+            label = self.get_module_label(path)
+            if label is not None:
+                if os.path.exists(path):
+                    labels.add(label)
+                continue
+            users = [entry['label'] for entry in index.modules.values()
+                     if path in set(os.path.abspath(filename)
+                                    for filename in entry['files'])]
+            if users:
+                labels.update(users)
+            else:
+                other_files.add(path)
+
+        if other_files:
+            paths = set(get_source_path(path, self.root)
+                        for path in other_files)
+            impacted, tests = get_impacted_tests(paths - set([None]))
+            if impacted is None or not tests:
+                return None
+            for test_id in impacted:
+                label = self.get_test_label(index, test_id)
+                if label is None:
+                    return None
+                labels.add(label)
+
+        if self.test_labels:
+            labels = [name for name in labels if any(name == given or
+                name.startswith(given + '.') for given in self.test_labels)]
+        return sorted(labels)
+
+    def get_test_label(self, index, test_id):
+        ''' Label of test by its id from discovery index '''
+        for module_name, entry in index.modules.items():
+            for test in entry['tests'] or ():
+                # Test class may be imported from other module
+                if '.'.join(test) == test_id:
+                    return '.'.join([entry['label']] + test[1:])
+            if test_id.startswith(module_name + '.'):
+                return entry['label'] + test_id[len(module_name):]
+        for entry in index.apps.values():
+            # Tests of plain tests module are run by the whole app
+            for test in entry['tests'] or ():
+                if '.'.join(test) == test_id:
+                    return entry['label']
+        return None
+
+    def run_child(self, labels):
+        ''' Run tests of labels in forked process, return its exit status '''
+        for connection in connections.all():
+            connection.close()
+        pid = os.fork()
+        if pid:
+            try:
+                return os.waitpid(pid, 0)[1]
+            except KeyboardInterrupt:
+                os.waitpid(pid, 0)
+                raise
+
+        code = 1
+        try:
+            runner = self.runner
+            if runner.discovery_index is not None:
+                runner.discovery_index = DiscoveryIndex()
+            runner.for_each_database(runner.prepare_database)
+            suite = runner.build_suite(labels, self.extra_tests)
+            result = runner.run_suite(suite)
+            runner.for_each_database(runner.cleanup_database)
+            code = 1 if runner.suite_result(suite, result) else 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def restart(self):
+        ''' Start the watcher again, so changed modules are imported '''
+        self.write('Imported modules changed, restarting...')
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    def run(self):
+        ''' Run tests on every change until interrupted '''
+        runner = self.runner
+        signal.signal(signal.SIGTERM, interrupt)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        runner.for_each_database(runner.cleanup_database)
+        try:
+            files = get_source_files(self.root)
+            self.run_child(self.test_labels)
+            while True:
+                self.write('Watching for changes, press Ctrl+C to stop...')
+                changed_files = set()
+                while not changed_files:
+                    time.sleep(self.interval)
+                    new_files = get_source_files(self.root)
+                    changed_files = get_changed_files(files, new_files)
+                files = new_files
+
+                if changed_files & get_loaded_files():
+                    runner.teardown_databases(old_config)
+                    runner.teardown_test_environment()
+                    self.restart()
+
+                labels = self.get_labels(changed_files)
+                if labels is None:
+                    labels = self.test_labels
+                elif not labels:
+                    self.write('No tests are affected by {0}'.format(
+                        ', '.join(sorted(changed_files))))
+                    continue
+                self.write('Running {0}'.format(' '.join(labels) or
+                                                'all the tests'))
+                self.run_child(labels)
+        except KeyboardInterrupt:
+            pass
+        runner.teardown_databases(old_config)
+        runner.teardown_test_environment()
+        return 0
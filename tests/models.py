@@ -0,0 +1,19 @@
+''' Models used by tests of test_tools '''
+
+from django.db import models
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50)
+
+
+class Item(models.Model):
+    name = models.CharField(max_length=50, blank=True)
+    number = models.IntegerField(default=0)
+    day = models.DateField(null=True)
+    tag = models.ForeignKey(Tag, null=True)
+
+    @property
+    def title(self):
+        ''' Attribute which is not a field '''
+        return self.name.title()
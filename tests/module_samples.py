@@ -0,0 +1,21 @@
+''' Test case of a module with module fixtures, run as sample '''
+
+import time
+
+from django.utils import unittest
+from test_tools.utils import get_fake_email
+
+
+def setUpModule():
+    time.sleep(0.01)
+
+
+def tearDownModule():
+    get_fake_email()
+    time.sleep(0.06)
+
+
+class ModuleFixtureTest(unittest.TestCase):
+
+    def test_a(self):
+        pass
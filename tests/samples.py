@@ -0,0 +1,125 @@
+''' Test cases and listeners which tests of test_tools run as samples '''
+
+import os
+import time
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.test import TestCase
+from django.utils import unittest
+from test_tools.datasets import cached_dataset
+from test_tools.listeners import TestListener
+from test_tools.testcases import SharedDataTestCase
+from test_tools.utils import get_fake_email, model_factory, site_required
+from tests.models import Tag
+
+
+class PassingTest(unittest.TestCase):
+
+    def test_a(self):
+        pass
+
+    def test_b(self):
+        pass
+
+
+class FailingTest(unittest.TestCase):
+
+    def test_failure(self):
+        self.fail('broken')
+
+    def test_error(self):
+        raise ValueError('boom')
+
+
+class SlowSetupTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        time.sleep(0.01)
+
+    def test_slow(self):
+        time.sleep(0.06)
+
+
+class FixtureTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.email = get_fake_email()
+
+    def test_email(self):
+        self.assertTrue(self.email)
+
+
+class SharedDataTest(SharedDataTestCase):
+    data_calls = 0
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data_calls += 1
+        cls.tags = model_factory(Tag, name=['a', 'b'], save=True)
+
+    def test_change(self):
+        Tag.objects.create(name='c')
+        self.assertEqual(Tag.objects.count(), 3)
+
+    def test_data(self):
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(self.data_calls, 1)
+
+    def test_delete(self):
+        Tag.objects.all().delete()
+        self.assertEqual(Tag.objects.count(), 0)
+
+
+@cached_dataset
+def create_tags(names):
+    ''' Cached data set which counts its builds '''
+    create_tags.builds += 1
+    return [Tag.objects.create(name=name).pk for name in names]
+create_tags.builds = 0
+
+
+@site_required
+class SiteTest(TestCase):
+
+    def test_site(self):
+        self.assertTrue(Site.objects.filter(pk=settings.SITE_ID).exists())
+
+
+class RecordingListener(TestListener):
+    ''' Remember process of every test and calls of fixtures '''
+
+    def __init__(self):
+        self.processes = {}
+        self.fixtures = []
+
+    def beforeTest(self, test):
+        self.processes[test.id()] = os.getpid()
+
+    def fixture(self, name, duration):
+        self.fixtures.append(name)
+
+    def get_data(self):
+        return self.processes
+
+    def merge_data(self, data):
+        self.processes.update(data)
+
+
+def get_suite(*classes):
+    ''' Flat suite of all the tests of classes in order of their names '''
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([test for klass in classes
+                               for test in loader.loadTestsFromTestCase(klass)])
+
+
+class CrashingTest(unittest.TestCase):
+    ''' Kills worker process which runs it '''
+
+    def test_a_crash(self):
+        os._exit(3)
+
+    def test_b_lost(self):
+        pass
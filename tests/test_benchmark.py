@@ -0,0 +1,24 @@
+''' Tests of benchmarks of test_tools overhead '''
+
+from django.utils import unittest
+from test_tools.benchmark import IMPORTED_MODULES, measure, \
+    run_import_benchmarks, time_import
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_import_benchmarks(self):
+        self.assertIn('cProfile', IMPORTED_MODULES)
+        self.assertNotIn('hotshot', IMPORTED_MODULES)
+        results = run_import_benchmarks(repeat=1)
+        self.assertIn('import:cProfile', results)
+        self.assertIn('import:test_tools.utils', results)
+
+    def test_missing_module_is_skipped(self):
+        self.assertEqual(time_import('test_tools_missing_module', 1), None)
+
+    def test_best_time(self):
+        calls = []
+        self.assertGreaterEqual(measure(lambda: calls.append(1), 3,
+                                        lambda: calls.append(0)), 0)
+        self.assertEqual(calls, [0, 1] * 3)
@@ -0,0 +1,45 @@
+''' Tests of files persisted between test runs '''
+
+import os
+import shutil
+import tempfile
+
+import mock
+from django.test.utils import override_settings
+from django.utils import unittest
+from test_tools.cache import get_cache_path, load_json, save_json
+
+
+class CachePathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_default_folder_is_in_project_root(self):
+        # Tests of test_tools keep their cache in temporary folder
+        settings = mock.Mock(spec=['TEST_TOOLS_PROJECT_ROOT'],
+                             TEST_TOOLS_PROJECT_ROOT=self.root)
+        with mock.patch('test_tools.cache.settings', settings):
+            self.assertEqual(get_cache_path('timings.json'),
+                os.path.join(self.root, '.test_tools', 'timings.json'))
+            self.assertTrue(os.path.isdir(os.path.join(self.root,
+                                                       '.test_tools')))
+
+    def test_folder_is_relative_to_project_root(self):
+        with override_settings(TEST_TOOLS_PROJECT_ROOT=self.root,
+                               TEST_TOOLS_CACHE_DIR='ci/cache'):
+            self.assertEqual(get_cache_path('timings.json'),
+                os.path.join(self.root, 'ci', 'cache', 'timings.json'))
+
+    def test_overridden_folder(self):
+        cache_dir = os.path.join(self.root, 'cache')
+        with override_settings(TEST_TOOLS_CACHE_DIR=cache_dir):
+            save_json('other.json', ['tests.samples.PassingTest.test_a'])
+            self.assertEqual(load_json('other.json'),
+                             ['tests.samples.PassingTest.test_a'])
+        self.assertTrue(os.path.exists(os.path.join(cache_dir,
+                                                    'other.json')))
+        self.assertIsNone(load_json('other.json'))
@@ -0,0 +1,56 @@
+''' Tests of logged in clients '''
+
+import mock
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, hashers
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import unittest
+from test_tools.test_runner import DiscoveryDjangoTestSuiteRunner
+from test_tools.utils import FAST_PASSWORD_HASHER, get_logged_in_client, \
+    get_logged_in_clients, get_password_hash, login_client
+
+
+class LoggedInClientTest(TestCase):
+
+    def test_distinct_users(self):
+        clients = get_logged_in_clients(3)
+        names = [client.get('/whoami/').content for client in clients]
+        self.assertEqual(len(set(names)), 3)
+        self.assertEqual(sorted(names), sorted(
+                    User.objects.values_list('username', flat=True)))
+
+    def test_given_users(self):
+        user = User.objects.create(username='john')
+        client = get_logged_in_clients(users=[user])
+        self.assertEqual(client.get('/whoami/').content, 'john')
+        self.assertEqual(login_client(user).get('/whoami/').content, 'john')
+
+    def test_password_is_hashed_once(self):
+        with mock.patch('django.contrib.auth.hashers.make_password',
+                        return_value='hash') as make_password:
+            get_password_hash('once')
+            get_password_hash('once')
+        self.assertEqual(make_password.call_count, 1)
+        client = get_logged_in_client()
+        self.assertEqual(client.session[SESSION_KEY], User.objects.get().pk)
+
+
+class FastHasherTest(unittest.TestCase):
+
+    def test_fast_hasher_is_first(self):
+        runner = DiscoveryDjangoTestSuiteRunner(verbosity=0, fast_hasher=True)
+        hashers_before = settings.PASSWORD_HASHERS
+        with mock.patch('django.test.simple.DjangoTestSuiteRunner.'
+                        'setup_test_environment'), \
+                mock.patch('django.test.simple.DjangoTestSuiteRunner.'
+                           'teardown_test_environment'):
+            runner.setup_test_environment()
+            try:
+                self.assertEqual(settings.PASSWORD_HASHERS[0],
+                                 FAST_PASSWORD_HASHER)
+                self.assertTrue(hashers.make_password('x').startswith(
+                                                                'md5$'))
+            finally:
+                runner.teardown_test_environment()
+        self.assertEqual(settings.PASSWORD_HASHERS, hashers_before)
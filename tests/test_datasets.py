@@ -0,0 +1,59 @@
+''' Tests of data sets cached between runs '''
+
+import glob
+import os
+
+from django.test import TestCase
+from test_tools.cache import get_cache_path
+from tests import samples
+from tests.models import Tag
+
+
+class CachedDatasetTest(TestCase):
+
+    def setUp(self):
+        for path in glob.glob(get_cache_path('dataset-tests.samples.*')):
+            os.remove(path)
+        samples.create_tags.builds = 0
+
+    def test_rows_are_loaded_from_cache(self):
+        pks = samples.create_tags(['a', 'b'])
+        rows = list(Tag.objects.order_by('pk').values_list('pk', 'name'))
+        Tag.objects.all().delete()
+        self.assertEqual(samples.create_tags(['a', 'b']), pks)
+        self.assertEqual(samples.create_tags.builds, 1)
+        self.assertEqual(list(Tag.objects.order_by('pk').values_list(
+                                                    'pk', 'name')), rows)
+
+    def test_other_arguments_are_built(self):
+        samples.create_tags(['a'])
+        Tag.objects.all().delete()
+        samples.create_tags(['b'])
+        self.assertEqual(samples.create_tags.builds, 2)
+        self.assertEqual(list(Tag.objects.values_list('name', flat=True)),
+                         ['b'])
+
+    def test_sequence_is_reset_after_load(self):
+        samples.create_tags(['a'])
+        Tag.objects.all().delete()
+        pk = samples.create_tags(['a'])[0]
+        self.assertGreater(Tag.objects.create(name='new').pk, pk)
+
+    def test_second_call_builds_new_rows(self):
+        first = samples.create_tags(['a', 'b'])
+        second = samples.create_tags(['a', 'b'])
+        self.assertEqual(samples.create_tags.builds, 2)
+        self.assertEqual(len(set(first + second)), 4)
+        self.assertEqual(Tag.objects.count(), 4)
+
+    def test_table_with_rows(self):
+        Tag.objects.create(name='existing')
+        pks = samples.create_tags(['a'])
+        Tag.objects.filter(pk__in=pks).delete()
+        self.assertEqual(samples.create_tags(['a']), pks)
+        self.assertEqual(samples.create_tags.builds, 1)
+        Tag.objects.create(name='other')
+        samples.create_tags(['a'])
+        self.assertEqual(samples.create_tags.builds, 2)
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)),
+                         ['a', 'a', 'existing', 'other'])
@@ -0,0 +1,111 @@
+''' Tests of discovery index of test modules and apps '''
+
+import os
+import shutil
+import sys
+import tempfile
+
+import mock
+from django.utils import unittest
+from django.utils.importlib import import_module
+from test_tools.discovery import DiscoveryIndex, iter_tests
+from test_tools.test_runner import DiscoveryDjangoTestSuiteRunner
+
+TEST_MODULE = '''
+from django.utils import unittest
+
+
+class {0}(unittest.TestCase):
+
+    def test_it(self):
+        pass
+'''
+
+
+class DiscoveryIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        sys.path.insert(0, self.root)
+        self.app_name = 'indexed_app'
+        self.write('__init__.py', '')
+        self.write('models.py', '')
+        self.write('tests/__init__.py', '')
+        self.write('tests/test_first.py', TEST_MODULE.format('FirstTest'))
+        # Test class imported from other module
+        self.write('tests/test_imported.py',
+                   'from tests.samples import PassingTest\n')
+        self.index_name = 'discovery_{0}.json'.format(id(self))
+
+    def tearDown(self):
+        sys.path.remove(self.root)
+        for name in list(sys.modules):
+            if name.startswith(self.app_name):
+                del sys.modules[name]
+        shutil.rmtree(self.root)
+        path = os.path.join('.test_tools', self.index_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, self.app_name, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as module_file:
+            module_file.write(content)
+
+    def load_app(self):
+        ''' Load tests of app with new index, return ids of tests '''
+        runner = DiscoveryDjangoTestSuiteRunner(verbosity=0)
+        runner.discovery_index = DiscoveryIndex(self.index_name)
+        with mock.patch('test_tools.test_runner.get_app', lambda name:
+                        import_module(self.app_name + '.models')):
+            suite = unittest.TestSuite(runner.load_from_app(self.app_name))
+        runner.discovery_index.save()
+        return sorted(test.id() for test in iter_tests(suite))
+
+    def test_fresh_app_is_not_introspected(self):
+        test_ids = self.load_app()
+        self.assertEqual(test_ids, [
+            'indexed_app.tests.test_first.FirstTest.test_it',
+            'tests.samples.PassingTest.test_a',
+            'tests.samples.PassingTest.test_b'])
+        with mock.patch('test_tools.test_runner.build_suite') as build, \
+                mock.patch('test_tools.test_runner.get_app') as get_app, \
+                mock.patch('test_tools.discovery.save_json') as save:
+            self.assertEqual(self.load_app(), test_ids)
+        self.assertFalse(build.called)
+        self.assertFalse(get_app.called)
+        self.assertFalse(save.called)
+
+    def test_new_module_makes_app_stale(self):
+        self.load_app()
+        self.write('tests/test_second.py', TEST_MODULE.format('SecondTest'))
+        self.assertIn('indexed_app.tests.test_second.SecondTest.test_it',
+                      self.load_app())
+
+    def test_label_of_imported_class(self):
+        self.load_app()
+        runner = DiscoveryDjangoTestSuiteRunner(verbosity=0)
+        runner.discovery_index = index = DiscoveryIndex(self.index_name)
+        list(runner.load_custom_test_package(
+            import_module(self.app_name + '.tests'), self.app_name))
+        suite = index.find('indexed_app.test_imported.PassingTest.test_b')
+        self.assertEqual([test.id() for test in iter_tests(suite)],
+                         ['tests.samples.PassingTest.test_b'])
+
+    def test_label_of_several_modules(self):
+        self.write('tests/test_second.py', TEST_MODULE.format('SecondTest'))
+        runner = DiscoveryDjangoTestSuiteRunner(verbosity=0)
+        runner.discovery_index = index = DiscoveryIndex(self.index_name)
+        list(runner.load_custom_test_package(
+            import_module(self.app_name + '.tests'), self.app_name))
+        suite = index.find('indexed_app')
+        self.assertEqual(sorted(test.id() for test in iter_tests(suite)), [
+            'indexed_app.tests.test_first.FirstTest.test_it',
+            'indexed_app.tests.test_second.SecondTest.test_it',
+            'tests.samples.PassingTest.test_a',
+            'tests.samples.PassingTest.test_b'])
+        self.write('tests/test_second.py',
+                   TEST_MODULE.format('ChangedSecondTest'))
+        self.assertIsNone(index.find('indexed_app'))
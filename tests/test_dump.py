@@ -0,0 +1,88 @@
+''' Tests of loading schema dump into test databases '''
+
+import os
+import sqlite3
+
+import mock
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import override_settings
+from django.utils import unittest
+from test_tools import signals
+from test_tools.dump import dump_schema
+from test_tools.snapshot import get_snapshot_name
+from test_tools.test_runner import get_worker_db_name
+
+
+def get_tables(db_name):
+    ''' Names of tables of database read without Django '''
+    return set(row[0] for row in sqlite3.connect(db_name).execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"))
+
+
+class LoadSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = connections[DEFAULT_DB_ALIAS]
+        self.test_db_name = self.connection.settings_dict['NAME']
+        self.db_names = [get_worker_db_name(self.test_db_name, worker)
+                         for worker in (7, 8)]
+        signals.SCHEMA_DUMPS.clear()
+        self.settings = override_settings(TEST_TOOLS_LOAD_SCHEMA=True)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        signals.SCHEMA_DUMPS.clear()
+        for db_name in self.db_names:
+            for name in (db_name, get_snapshot_name(db_name)):
+                if os.path.exists(name):
+                    os.remove(name)
+
+    def test_dump_has_only_tables_of_models(self):
+        cursor = self.connection.cursor()
+        cursor.execute('CREATE TABLE unmanaged_extra (id integer)')
+        try:
+            schema = dump_schema(self.connection)
+        finally:
+            cursor.execute('DROP TABLE unmanaged_extra')
+        self.assertIn('"tests_tag"', schema['script'])
+        self.assertNotIn('unmanaged_extra', schema['script'])
+
+    def test_schema_of_source_is_dumped_once(self):
+        with mock.patch('test_tools.signals.dump_schema',
+                        side_effect=dump_schema) as dump:
+            for db_name in self.db_names:
+                signals.call_db_command(self.connection, db_name, 'migrate',
+                                        'first', self.test_db_name)
+            self.assertEqual(dump.call_count, 1)
+            self.assertEqual(dump.call_args[0][0].settings_dict['NAME'],
+                             self.test_db_name)
+            signals.call_db_command(self.connection, self.db_names[0],
+                                    'migrate', 'first', self.test_db_name)
+            self.assertEqual(dump.call_count, 1)
+        self.assertEqual(self.connection.settings_dict['NAME'],
+                         self.test_db_name)
+        for db_name in self.db_names:
+            self.assertIn('tests_tag', get_tables(db_name))
+
+    def test_schema_is_not_dumped_for_migrated_database(self):
+        with mock.patch('test_tools.signals.dump_schema') as dump:
+            with mock.patch('test_tools.signals.get_state',
+                            return_value='first'):
+                signals.call_db_command(self.connection, self.db_names[0],
+                                        'migrate', 'first', self.test_db_name)
+        self.assertFalse(dump.called)
+
+    def test_only_tables_of_models_are_replaced(self):
+        db_name = self.db_names[0]
+        database = sqlite3.connect(db_name)
+        database.execute('CREATE TABLE unmanaged_extra (id integer)')
+        database.execute('CREATE TABLE tests_tag (id integer)')
+        database.commit()
+        database.close()
+        signals.call_db_command(self.connection, db_name, 'migrate', 'first',
+                                self.test_db_name)
+        self.assertIn('unmanaged_extra', get_tables(db_name))
+        columns = [row[1] for row in sqlite3.connect(db_name).execute(
+                                            'PRAGMA table_info(tests_tag)')]
+        self.assertIn('name', columns)
@@ -0,0 +1,59 @@
+''' Tests of running tests which failed last time first '''
+
+from django.utils import unittest
+from test_tools.cache import save_json
+from test_tools.failures import FAILURES_FILE, FailureListener, \
+    load_failures, order_failed_first
+from test_tools.listeners import ListenedTestSuite
+from tests import samples
+
+
+def get_ids(suite):
+    return [test.id() for test in suite]
+
+
+class OrderFailedFirstTest(unittest.TestCase):
+
+    def setUp(self):
+        self.suite = samples.get_suite(samples.PassingTest,
+                                       samples.SlowSetupTest,
+                                       samples.FailingTest)
+
+    def test_class_of_failed_test_is_moved_whole(self):
+        suite = order_failed_first(self.suite,
+                                   set(['tests.samples.PassingTest.test_b']))
+        self.assertEqual(get_ids(suite), get_ids(self.suite))
+        suite = order_failed_first(self.suite, set([
+            'tests.samples.FailingTest.test_failure',
+            'tests.samples.SlowSetupTest.test_slow']))
+        self.assertEqual(get_ids(suite), [
+            'tests.samples.SlowSetupTest.test_slow',
+            'tests.samples.FailingTest.test_error',
+            'tests.samples.FailingTest.test_failure',
+            'tests.samples.PassingTest.test_a',
+            'tests.samples.PassingTest.test_b'])
+
+    def test_only_failed(self):
+        suite = order_failed_first(self.suite, set([
+            'tests.samples.FailingTest.test_failure',
+            'setUpClass (tests.samples.SlowSetupTest)']), only=True)
+        self.assertEqual(get_ids(suite), [
+            'tests.samples.SlowSetupTest.test_slow',
+            'tests.samples.FailingTest.test_failure'])
+
+
+class FailureListenerTest(unittest.TestCase):
+
+    def test_failures_are_saved(self):
+        save_json(FAILURES_FILE, ['tests.samples.PassingTest.test_a',
+                                  'tests.samples.Missing.test_it'])
+        listener = FailureListener()
+        listener.startTestRun()
+        ListenedTestSuite(samples.get_suite(samples.PassingTest,
+                                            samples.FailingTest),
+                          [listener]).run(unittest.TestResult())
+        listener.stopTestRun()
+        self.assertEqual(load_failures(), set([
+            'tests.samples.Missing.test_it',
+            'tests.samples.FailingTest.test_error',
+            'tests.samples.FailingTest.test_failure']))
@@ -0,0 +1,54 @@
+''' Tests of flushing only tables written by tests '''
+
+import mock
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import unittest
+from test_tools.flush import DirtyTableFlusher
+from test_tools.queries import add_observer, remove_observer
+from tests.models import Item, Tag
+
+
+class DirtyTableFlusherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.flusher = DirtyTableFlusher(verify=True)
+        self.flusher.install()
+        self.flush()
+
+    def tearDown(self):
+        self.flusher.uninstall()
+        Item.objects.all().delete()
+        Tag.objects.all().delete()
+
+    def flush(self):
+        from django.test import testcases
+        testcases.call_command('flush', verbosity=0, interactive=False,
+                               database=DEFAULT_DB_ALIAS)
+
+    def test_written_tables_are_reset(self):
+        tag = Tag.objects.create(name='a')
+        Item.objects.create(name='item', tag=tag)
+        self.assertEqual(self.flusher.dirty[DEFAULT_DB_ALIAS],
+                         set(['tests_tag', 'tests_item']))
+        with mock.patch.object(self.flusher, 'original_call_command') as full:
+            self.flush()
+        self.assertFalse(full.called)
+        self.assertEqual(Tag.objects.count(), 0)
+        self.assertEqual(Item.objects.count(), 0)
+        self.assertEqual(Tag.objects.create(name='b').pk, tag.pk)
+
+    def test_unknown_statement_flushes_everything(self):
+        connections[DEFAULT_DB_ALIAS].cursor().execute(
+                                    'CREATE TEMPORARY TABLE scratch (id int)')
+        with mock.patch.object(self.flusher, 'original_call_command') as full:
+            self.flush()
+        self.assertEqual(full.call_args[0][0], 'flush')
+
+    def test_verify_finds_tables_which_differ(self):
+        remove_observer(self.flusher.observe)
+        try:
+            Tag.objects.create(name='unnoticed')
+        finally:
+            add_observer(self.flusher.observe)
+        Item.objects.create(name='item')
+        self.assertRaises(AssertionError, self.flush)
@@ -0,0 +1,105 @@
+''' Tests of recording and selecting tests affected by changed files '''
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import mock
+from django.utils import unittest
+from test_tools.impact import ImpactListener, get_changed_files
+from test_tools.listeners import ListenedTestSuite
+from tests import module_samples, samples
+
+
+class ImpactListenerTest(unittest.TestCase):
+
+    def run_suite(self, *classes):
+        listener = ImpactListener()
+        listener.startTestRun()
+        ListenedTestSuite(samples.get_suite(*classes), [listener]).run(
+                                                    unittest.TestResult())
+        return listener.get_tests()
+
+    def test_files_of_tests(self):
+        tests = self.run_suite(samples.PassingTest)
+        self.assertIn('tests/samples.py',
+                      tests['tests.samples.PassingTest.test_a'])
+        self.assertNotIn('tests/test_impact.py',
+                         tests['tests.samples.PassingTest.test_a'])
+
+    def test_files_of_class_fixtures(self):
+        tests = self.run_suite(samples.PassingTest, samples.FixtureTest)
+        self.assertIn('test_tools/utils.py',
+                      tests['tests.samples.FixtureTest.test_email'])
+        self.assertNotIn('test_tools/utils.py',
+                         tests['tests.samples.PassingTest.test_b'])
+
+    def test_files_of_module_fixtures(self):
+        listener = ImpactListener()
+        listener.startTestRun()
+        listener.beforeFixture('tests.samples.setUpModule')
+        samples.get_fake_email()
+        listener.fixture('tests.samples.setUpModule', 0)
+        listener.beforeTest(samples.PassingTest('test_a'))
+        listener.afterTest(samples.PassingTest('test_a'))
+        self.assertIn('test_tools/utils.py', listener.get_tests()[
+                                        'tests.samples.PassingTest.test_a'])
+
+
+    def test_classes_of_different_modules(self):
+        trace = sys.gettrace()
+        tests = self.run_suite(samples.PassingTest,
+                               module_samples.ModuleFixtureTest)
+        self.assertIs(sys.gettrace(), trace)
+        self.assertIn('test_tools/utils.py', tests[
+                                'tests.module_samples.ModuleFixtureTest.test_a'])
+        self.assertNotIn('test_tools/utils.py',
+                         tests['tests.samples.PassingTest.test_a'])
+
+    def test_nested_tracing(self):
+        trace = sys.gettrace()
+        listener = ImpactListener()
+        listener.start_tracing()
+        samples.PassingTest('test_a').test_a()
+        listener.start_tracing()
+        samples.get_fake_email()
+        inner = listener.stop_tracing()
+        outer = listener.stop_tracing()
+        self.assertIs(sys.gettrace(), trace)
+        self.assertIn('test_tools/utils.py', inner)
+        self.assertNotIn('tests/samples.py', inner)
+        self.assertTrue(set(['tests/samples.py',
+                             'test_tools/utils.py']).issubset(outer))
+
+
+class ChangedFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        for name, content in (('.gitignore', '*.log\n'), ('old.py', '')):
+            self.write(name, content)
+        self.git('init', '-q')
+        self.git('add', '.')
+        self.git('-c', 'user.name=test', '-c', 'user.email=test@test',
+                 'commit', '-q', '-m', 'initial')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content=''):
+        with open(os.path.join(self.root, name), 'w') as source_file:
+            source_file.write(content)
+
+    def git(self, *args):
+        subprocess.check_call(('git',) + args, cwd=self.root)
+
+    def test_changed_and_untracked_files(self):
+        self.write('old.py', 'changed = True\n')
+        self.write('new.py')
+        self.write('debug.log')
+        with mock.patch('test_tools.impact.get_project_root',
+                        lambda: self.root):
+            self.assertEqual(get_changed_files(since='HEAD'),
+                             set(['old.py', 'new.py']))
@@ -0,0 +1,61 @@
+''' Tests of modules which test_tools imports lazily '''
+
+import os
+import subprocess
+import sys
+
+from django.utils import unittest
+
+IMPORT_SCRIPT = '''
+import sys
+from django.conf import settings
+settings.configure()
+import {0}
+print(' '.join(sorted(sys.modules)))
+'''
+UNCONFIGURED_IMPORT_SCRIPT = '''
+import sys
+import {0}
+print(' '.join(sorted(sys.modules)))
+'''
+
+
+def get_imported_modules(module_name, script=IMPORT_SCRIPT):
+    ''' Names of modules imported by fresh interpreter with the module '''
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    env.pop('DJANGO_SETTINGS_MODULE', None)
+    output = subprocess.Popen(
+        [sys.executable, '-c', script.format(module_name)],
+        stdout=subprocess.PIPE, env=env).communicate()[0]
+    return set(output.split())
+
+
+class UtilsImportTest(unittest.TestCase):
+
+    def test_heavy_modules_are_not_imported(self):
+        modules = get_imported_modules('test_tools.utils')
+        self.assertIn('test_tools.utils', modules)
+        for name in ('mock', 'django.contrib.auth.models',
+                     'django.contrib.sites.models', 'django.test.client',
+                     'test_tools.profiling', 'cProfile'):
+            self.assertNotIn(name, modules)
+
+
+class RunnerImportTest(unittest.TestCase):
+
+    def test_modules_of_options_are_not_imported(self):
+        modules = get_imported_modules('test_tools.test_runner')
+        self.assertIn('test_tools.test_runner', modules)
+        for name in ('parallel', 'profiling', 'junit', 'watch', 'datasets',
+                     'flush', 'impact', 'memory', 'queries', 'sharding'):
+            self.assertNotIn('test_tools.' + name, modules)
+
+
+class CacheImportTest(unittest.TestCase):
+
+    def test_settings_are_not_needed_for_import(self):
+        for module_name in ('test_tools.timing', 'test_tools.impact'):
+            modules = get_imported_modules(module_name,
+                                           UNCONFIGURED_IMPORT_SCRIPT)
+            self.assertIn('test_tools.cache', modules)
+            self.assertIn(module_name, modules)
@@ -0,0 +1,61 @@
+''' Tests of discovery runner for django_jenkins '''
+
+import os
+import shutil
+import tempfile
+from xml.dom import minidom
+
+from django.utils import unittest
+from tests import samples
+
+try:
+    from test_tools.jenkins import JenkinsDiscoveryDjangoTestSuiteRunner
+except ImportError:
+    JenkinsDiscoveryDjangoTestSuiteRunner = None
+
+
+@unittest.skipIf(JenkinsDiscoveryDjangoTestSuiteRunner is None,
+                 'django_jenkins is not installed')
+class JenkinsRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def run_tests(self, **kwargs):
+        '''
+        Run sample tests in environment and databases of the running suite
+        '''
+        runner = JenkinsDiscoveryDjangoTestSuiteRunner(
+            output_dir=self.output_dir, verbosity=0, interactive=False,
+            **kwargs)
+        runner.build_suite = lambda *args, **kwargs: samples.get_suite(
+                                    samples.PassingTest, samples.FixtureTest)
+        runner.setup_test_environment = lambda **kwargs: None
+        runner.teardown_test_environment = lambda **kwargs: None
+        runner.setup_databases = lambda **kwargs: None
+        runner.teardown_databases = lambda old_config, **kwargs: None
+        suite_result = runner.suite_result
+
+        def dump_and_count(suite, result, **kwargs):
+            # Newer django_jenkins writes the report after the run
+            result.dump_xml(runner.output_dir)
+            return suite_result(suite, result, **kwargs)
+
+        runner.suite_result = dump_and_count
+        return runner, runner.run_tests([])
+
+    def test_streamed_report_is_kept(self):
+        runner, failures = self.run_tests()
+        self.assertEqual(failures, 0)
+        self.assertTrue(runner.with_reports)
+        document = minidom.parse(os.path.join(self.output_dir, 'junit.xml'))
+        self.assertEqual([case.getAttribute('name') for case in
+                          document.getElementsByTagName('testcase')],
+                         ['test_a', 'test_b', 'test_email'])
+
+    def test_output_is_buffered_unless_debugging(self):
+        self.assertTrue(self.run_tests()[0].buffer)
+        self.assertFalse(self.run_tests(debug=True)[0].buffer)
@@ -0,0 +1,75 @@
+''' Tests of JUnit XML report written while tests run '''
+
+import os
+import shutil
+import tempfile
+from xml.dom import minidom
+
+from django.utils import unittest
+from test_tools.junit import JUnitXMLWriter, ReportedTestSuite
+from tests import samples
+
+
+def get_suites(path):
+    ''' Names of testsuite elements with names of their testcases '''
+    document = minidom.parse(path)
+    return [(suite.getAttribute('name'),
+             [case.getAttribute('name')
+              for case in suite.getElementsByTagName('testcase')])
+            for suite in document.getElementsByTagName('testsuite')]
+
+
+class JUnitXMLWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'reports', 'junit.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_report(self):
+        suite = samples.get_suite(samples.PassingTest, samples.FailingTest)
+        ReportedTestSuite(suite, JUnitXMLWriter(self.path)).run(
+                                                    unittest.TestResult())
+        self.assertEqual(get_suites(self.path), [
+            ('tests.samples.PassingTest', ['test_a', 'test_b']),
+            ('tests.samples.FailingTest', ['test_error', 'test_failure']),
+        ])
+        document = minidom.parse(self.path)
+        failing = document.getElementsByTagName('testsuite')[1]
+        self.assertEqual(failing.getAttribute('failures'), '1')
+        self.assertEqual(failing.getAttribute('errors'), '1')
+
+    def test_interleaved_classes_are_merged(self):
+        passing = samples.get_suite(samples.PassingTest)._tests
+        failing = samples.get_suite(samples.FailingTest)._tests
+        writer = JUnitXMLWriter(self.path)
+        writer.expect(passing + failing)
+        writer.open()
+        # Workers running classes at the same time mix their events
+        for test in (passing[0], failing[0], passing[1], failing[1]):
+            writer.startTest(test)
+            writer.stopTest(test)
+        self.assertEqual(get_suites(self.path),
+                         [('tests.samples.PassingTest', ['test_a', 'test_b'])])
+        writer.close()
+        self.assertEqual(get_suites(self.path), [
+            ('tests.samples.PassingTest', ['test_a', 'test_b']),
+            ('tests.samples.FailingTest', ['test_error', 'test_failure']),
+        ])
+
+    def test_finished_class_is_written_when_next_test_starts(self):
+        passing = samples.get_suite(samples.PassingTest)._tests
+        slow = samples.get_suite(samples.SlowSetupTest)._tests
+        writer = JUnitXMLWriter(self.path)
+        writer.expect(passing + slow)
+        writer.open()
+        for test in passing:
+            writer.startTest(test)
+            writer.stopTest(test)
+        self.assertEqual(get_suites(self.path), [])
+        writer.startTest(slow[0])
+        self.assertEqual(get_suites(self.path),
+                         [('tests.samples.PassingTest', ['test_a', 'test_b'])])
+        writer.close()
@@ -0,0 +1,170 @@
+''' Tests of memory listener '''
+
+import os
+from StringIO import StringIO
+
+import mock
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.utils import unittest
+
+from test_tools import memory
+from test_tools.memory import LEAK_THRESHOLD, MemoryListener, format_size, \
+    get_rss, get_site
+from test_tools.test_runner import DiscoveryDjangoTestSuiteRunner
+from tests.samples import PassingTest, get_suite
+
+
+class Frame(object):
+
+    def __init__(self, filename, lineno):
+        self.filename = filename
+        self.lineno = lineno
+
+
+class Stat(object):
+
+    def __init__(self, traceback, size_diff, count_diff):
+        self.traceback = traceback
+        self.size_diff = size_diff
+        self.count_diff = count_diff
+
+
+class Snapshot(object):
+    ''' Snapshot which differs from any other by its stats '''
+
+    def __init__(self, stats=()):
+        self.stats = stats
+
+    def filter_traces(self, filters):
+        return self
+
+    def compare_to(self, old, key_type):
+        return self.stats
+
+
+class FakeTracemalloc(object):
+    ''' Module tracemalloc returning given memory sizes and snapshots '''
+
+    __file__ = 'tracemalloc.py'
+
+    def __init__(self, memory, snapshots):
+        self.memory = iter(memory)
+        self.snapshots = iter(snapshots)
+        self.tracing = False
+
+    def Filter(self, inclusive, pattern):
+        return inclusive, pattern
+
+    def is_tracing(self):
+        return self.tracing
+
+    def start(self, frames):
+        self.tracing = True
+
+    def stop(self):
+        self.tracing = False
+
+    def get_traced_memory(self):
+        return next(self.memory)
+
+    def take_snapshot(self):
+        return next(self.snapshots)
+
+
+class MemoryHelpersTest(unittest.TestCase):
+
+    def test_format_size(self):
+        self.assertEqual(format_size(512), '512.0 B')
+        self.assertEqual(format_size(-2048), '-2.0 KB')
+        self.assertEqual(format_size(3 * 1024 ** 3), '3.0 GB')
+
+    def test_rss(self):
+        self.assertGreaterEqual(get_rss(), 0)
+
+    def test_site_is_most_recent_project_frame(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        traceback = [Frame('/usr/lib/python2.7/json/decoder.py', 10),
+                     Frame(os.path.join(root, 'tests', 'models.py'), 5),
+                     Frame(os.path.join(root, 'tests', 'samples.py'), 7)]
+        self.assertEqual(get_site(traceback, root),
+                         os.path.join('tests', 'models.py') + ':5')
+
+    def test_site_without_project_frames(self):
+        traceback = [Frame('/usr/lib/python2.7/json/decoder.py', 10)]
+        self.assertEqual(get_site(traceback, '/nonexistent'),
+                         '/usr/lib/python2.7/json/decoder.py:10')
+
+
+class MemoryListenerTest(unittest.TestCase):
+
+    def test_tracemalloc_is_required(self):
+        with mock.patch('test_tools.memory.tracemalloc', None):
+            with self.assertRaises(CommandError) as context:
+                MemoryListener()
+        self.assertIn('pytracemalloc', str(context.exception))
+
+    def test_runner_checks_tracemalloc(self):
+        with mock.patch('test_tools.memory.tracemalloc', None):
+            self.assertRaises(CommandError, DiscoveryDjangoTestSuiteRunner,
+                              memory=True, verbosity=0)
+
+    def test_growth_and_report(self):
+        models_path = os.path.join(settings.TEST_TOOLS_PROJECT_ROOT, 'tests',
+                                   'models.py')
+        samples_path = os.path.join(settings.TEST_TOOLS_PROJECT_ROOT,
+                                    'tests', 'samples.py')
+        leak = LEAK_THRESHOLD * 2
+        stats = [Stat([Frame(models_path, 5)], leak / 2, 3),
+                 Stat([Frame(models_path, 5)], leak / 4, 1),
+                 Stat([Frame(samples_path, 7)], leak / 4, 2),
+                 Stat([Frame(samples_path, 9)], -leak, -4)]
+        fake = FakeTracemalloc(
+            # Current and peak memory before and after every test
+            memory=[(1000, 1000), (1000 + leak, 3000 + leak),
+                    (1000 + leak, 3000 + leak), (1100 + leak, 3000 + leak)],
+            snapshots=[Snapshot(), Snapshot(stats)])
+        leaking, small = get_suite(PassingTest)
+        stream = StringIO()
+        with mock.patch('test_tools.memory.tracemalloc', fake):
+            listener = MemoryListener(stream=stream)
+            listener.startTestRun()
+            self.assertTrue(fake.tracing)
+            for test in (leaking, small):
+                listener.beforeTest(test)
+                listener.afterTest(test)
+            listener.stopTestRun()
+        self.assertFalse(fake.tracing)
+
+        peak, retained, rss, sites = listener.stats[leaking.id()]
+        self.assertEqual((peak, retained), (2000 + leak, leak))
+        self.assertEqual(sites, [
+            (os.path.join('tests', 'models.py') + ':5', leak * 3 / 4, 4),
+            (os.path.join('tests', 'samples.py') + ':7', leak / 4, 2)])
+        # Peak of the process didn't grow, so peak of the test is unknown
+        self.assertEqual(listener.stats[small.id()][:2], (100, 100))
+        self.assertEqual(listener.stats[small.id()][3], [])
+
+        report = stream.getvalue()
+        retaining = report.split('Tests retaining most memory:\n')[1]
+        self.assertTrue(retaining.startswith('  128.0 KB retained'))
+        self.assertIn(leaking.id(), retaining.split('\n')[0])
+        self.assertIn(
+            '   96.0 KB in      4 blocks  tests/models.py:5',
+            retaining.split('\n')[1])
+        self.assertIn(small.id(), retaining.split('Tests with')[0])
+        peaks = report.split('Tests with highest memory peak:\n')[1]
+        self.assertIn(leaking.id(), peaks.split('\n')[0])
+
+    @unittest.skipIf(memory.tracemalloc is None, 'tracemalloc is missing')
+    def test_report(self):
+        stream = StringIO()
+        listener = MemoryListener(stream=stream)
+        listener.startTestRun()
+        test = get_suite(PassingTest)._tests[0]
+        listener.beforeTest(test)
+        listener.afterTest(test)
+        listener.stopTestRun()
+        peak, retained, rss, sites = listener.stats[test.id()]
+        self.assertGreaterEqual(peak, 0)
+        self.assertIn('Tests with highest memory peak', stream.getvalue())
@@ -0,0 +1,146 @@
+''' Tests of running the suite in worker processes '''
+
+import multiprocessing
+import os
+import Queue
+import sqlite3
+import time
+
+import mock
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import unittest
+from test_tools.cache import save_json
+from test_tools.failures import FAILURES_FILE, FailureListener, \
+    load_failures
+from test_tools.parallel import ParallelTestSuite
+from test_tools.snapshot import get_snapshot_name
+from test_tools.test_runner import DiscoveryDjangoTestSuiteRunner, \
+    RunnerOptions, get_worker_db_name, get_worker_db_names
+from tests import samples
+
+
+class ParallelTestSuiteTest(unittest.TestCase):
+
+    def run_suite(self, *classes):
+        listener = samples.RecordingListener()
+        result = unittest.TestResult()
+        ParallelTestSuite(samples.get_suite(*classes), 2, {},
+                          [listener]).run(result)
+        return result, listener
+
+    def test_results_of_workers(self):
+        result, listener = self.run_suite(samples.PassingTest,
+                                          samples.FailingTest)
+        self.assertEqual(result.testsRun, 4)
+        self.assertEqual(len(result.failures), 1)
+        self.assertIn('broken', str(result.failures[0][1]))
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('boom', str(result.errors[0][1]))
+
+    def test_class_is_run_by_one_worker(self):
+        result, listener = self.run_suite(samples.PassingTest,
+                                          samples.FailingTest)
+        processes = listener.processes
+        self.assertEqual(len(processes), 4)
+        self.assertNotIn(os.getpid(), processes.values())
+        self.assertEqual(processes[samples.PassingTest('test_a').id()],
+                         processes[samples.PassingTest('test_b').id()])
+        self.assertEqual(processes[samples.FailingTest('test_error').id()],
+                         processes[samples.FailingTest('test_failure').id()])
+
+    def test_tests_of_crashed_worker_are_errors(self):
+        result, listener = self.run_suite(samples.CrashingTest,
+                                          samples.PassingTest)
+        self.assertEqual(result.testsRun, 4)
+        self.assertEqual(sorted(test.id() for test, err in result.errors), [
+            samples.CrashingTest('test_a_crash').id(),
+            samples.CrashingTest('test_b_lost').id()])
+        self.assertIn('exited with code 3', result.errors[0][1])
+
+    def test_tests_of_crashed_worker_are_failures(self):
+        save_json(FAILURES_FILE, [])
+        listener = FailureListener()
+        listener.startTestRun()
+        ParallelTestSuite(samples.get_suite(samples.CrashingTest,
+                                            samples.FailingTest), 2, {},
+                          [listener]).run(unittest.TestResult())
+        listener.stopTestRun()
+        self.assertEqual(load_failures(), set([
+            samples.CrashingTest('test_a_crash').id(),
+            samples.CrashingTest('test_b_lost').id(),
+            samples.FailingTest('test_error').id(),
+            samples.FailingTest('test_failure').id()]))
+
+    def test_events_are_read_after_workers_exit(self):
+        queue_class = type(multiprocessing.Queue())
+
+        class SlowQueue(queue_class):
+            ''' Queue read by busy process, the first read times out '''
+            timed_out = False
+
+            def get(self, block=True, timeout=None):
+                if not self.timed_out:
+                    self.timed_out = True
+                    time.sleep(1)
+                    raise Queue.Empty
+                return super(SlowQueue, self).get(block, timeout)
+
+        with mock.patch('test_tools.parallel.multiprocessing.Queue',
+                        SlowQueue):
+            result, listener = self.run_suite(samples.PassingTest,
+                                              samples.FailingTest)
+        self.assertEqual(result.testsRun, 4)
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('boom', str(result.errors[0][1]))
+        self.assertEqual(len(listener.processes), 4)
+
+
+class WorkerDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = connections[DEFAULT_DB_ALIAS]
+        self.test_db_name = self.connection.settings_dict['NAME']
+
+    def tearDown(self):
+        for name in get_worker_db_names(self.connection, self.test_db_name):
+            os.remove(name)
+            if os.path.exists(get_snapshot_name(name)):
+                os.remove(get_snapshot_name(name))
+
+    def test_worker_db_name(self):
+        self.assertEqual(get_worker_db_name('test_db.sqlite', 2),
+                         'test_db_2.sqlite')
+        self.assertEqual(get_worker_db_name('test_db', 1), 'test_db_1')
+
+    def test_setup_worker_databases(self):
+        runner = DiscoveryDjangoTestSuiteRunner(parallel=2, verbosity=0)
+        names = runner.setup_worker_databases(self.connection, 'tools.db')
+        self.assertEqual(names, [get_worker_db_name(self.test_db_name, 1),
+                                 get_worker_db_name(self.test_db_name, 2)])
+        self.assertEqual(get_worker_db_names(self.connection,
+                                             self.test_db_name), names)
+        self.assertEqual(self.connection.settings_dict['NAME'],
+                         self.test_db_name)
+        for name in names:
+            tables = [row[0] for row in sqlite3.connect(name).execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")]
+            self.assertIn('tests_item', tables)
+
+
+class RunnerOptionsTest(unittest.TestCase):
+
+    def test_defaults(self):
+        runner = DiscoveryDjangoTestSuiteRunner(parallel=3, verbosity=0)
+        self.assertEqual(runner.parallel, 3)
+        self.assertEqual(runner.options.parallel, 3)
+        self.assertEqual(runner.options.slowest, 0)
+        self.assertFalse(runner.options.failed_first)
+        self.assertEqual(runner.verbosity, 0)
+
+    def test_options_object(self):
+        options = RunnerOptions(DiscoveryDjangoTestSuiteRunner.option_list,
+                                shard='2/3', verify_flush=True)
+        runner = DiscoveryDjangoTestSuiteRunner(options, verbosity=0)
+        self.assertIs(runner.options, options)
+        self.assertEqual(runner.shard, (2, 3))
+        self.assertTrue(runner.dirty_tables)
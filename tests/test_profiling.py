@@ -0,0 +1,133 @@
+''' Tests of profiling helpers '''
+
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+from django.test.utils import override_settings
+from django.utils import unittest
+from test_tools import utils
+from test_tools.listeners import ListenedTestSuite
+from test_tools.parallel import ParallelTestSuite
+from test_tools.profiling import ProfileListener, get_collapsed_stacks
+from tests import samples
+
+
+class ProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_profile_log_base_alias(self):
+        self.assertEqual(utils.PROFILE_LOG_BASE, '/tmp')
+        with override_settings(PROFILE_LOG_BASE=self.folder):
+            self.assertEqual(os.path.join(utils.PROFILE_LOG_BASE, 'a.prof'),
+                             os.path.join(self.folder, 'a.prof'))
+
+    def test_log_of_every_call(self):
+        with override_settings(PROFILE_LOG_BASE=self.folder):
+            profiled = utils.profile('sum.prof', merge=True)(sum)
+            self.assertEqual(profiled([1, 2]), 3)
+            profiled([3])
+        self.assertEqual(len(glob.glob(os.path.join(self.folder,
+                                                    'sum-2*.prof'))), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.folder,
+                                                    'sum-merged.prof')))
+
+
+def get_layered_stats(layers, width=2):
+    '''
+    Stats of call graph where every function calls all the functions of
+    the next layer, so number of call paths grows exponentially. Every
+    function spends half of its time in itself.
+    '''
+    stats = {}
+    for layer in range(layers):
+        ct = 0.5 ** layer / width
+        for column in range(width):
+            callers = {}
+            if layer:
+                for caller in range(width):
+                    callers[('m.py', layer - 1, str(caller))] = (
+                                    1, 1, ct / 2 / width, ct / width)
+            calls = max(len(callers), 1)
+            stats[('m.py', layer, str(column))] = (calls, calls, ct / 2, ct,
+                                                   callers)
+    return mock.Mock(stats=stats)
+
+
+class CollapsedStacksTest(unittest.TestCase):
+
+    def test_paths_below_threshold_are_not_walked(self):
+        started = time.time()
+        stacks = get_collapsed_stacks(get_layered_stats(40))
+        self.assertLess(time.time() - started, 5)
+        self.assertIn(('m.py:0:0', 250000), stacks)
+        self.assertTrue(all(duration > 0 for stack, duration in stacks))
+
+    def test_recursive_function_on_the_top(self):
+        command = ('command.py', 1, 'call_command')
+        signal = ('signals.py', 2, 'send')
+        stats = mock.Mock(stats={
+            command: (1, 2, 0.1, 1.0, {signal: (1, 0, 0.05, 0.5)}),
+            signal: (1, 1, 0.4, 0.9, {command: (1, 1, 0.4, 0.9)}),
+        })
+        self.assertEqual(get_collapsed_stacks(stats), [
+            ('command.py:1:call_command', 100000),
+            ('command.py:1:call_command;signals.py:2:send', 400000)])
+
+
+class ProfileListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def run_suite(self, *classes):
+        listener = ProfileListener(self.folder)
+        listener.startTestRun()
+        ListenedTestSuite(samples.get_suite(*classes), [listener]).run(
+                                                    unittest.TestResult())
+        listener.stopTestRun()
+
+    def get_names(self):
+        return sorted(name for name in os.listdir(self.folder)
+                      if not name.startswith('.'))
+
+    def test_profiles_of_previous_run_are_removed(self):
+        self.run_suite(samples.PassingTest)
+        self.run_suite(samples.FixtureTest)
+        self.assertEqual(self.get_names(), [
+            'merged.collapsed', 'merged.prof',
+            'tests.samples.FixtureTest.test_email.prof'])
+
+    def test_other_files_are_kept(self):
+        for name in ('mine.prof', 'mine.collapsed'):
+            open(os.path.join(self.folder, name), 'w').close()
+        self.run_suite(samples.PassingTest)
+        self.run_suite(samples.PassingTest)
+        self.assertEqual(self.get_names(), [
+            'merged.collapsed', 'merged.prof', 'mine.collapsed', 'mine.prof',
+            'tests.samples.PassingTest.test_a.prof',
+            'tests.samples.PassingTest.test_b.prof'])
+
+    def test_profiles_of_workers_are_merged(self):
+        listener = ProfileListener(self.folder)
+        listener.startTestRun()
+        ParallelTestSuite(samples.get_suite(samples.PassingTest,
+                                            samples.FixtureTest), 2, {},
+                          [listener]).run(unittest.TestResult())
+        listener.stopTestRun()
+        self.assertEqual(sorted(listener.names), [
+            'tests.samples.FixtureTest.test_email.prof',
+            'tests.samples.PassingTest.test_a.prof',
+            'tests.samples.PassingTest.test_b.prof'])
+        self.assertIn('merged.prof', self.get_names())
@@ -0,0 +1,54 @@
+''' Tests of counting queries of tests '''
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.test import TestCase
+from test_tools.queries import ObservedCursorWrapper, add_observer, \
+    query_budget, remove_observer
+from tests.models import Tag
+
+
+class ObservedCursorTest(TestCase):
+
+    def setUp(self):
+        self.queries = []
+        add_observer(self.observe)
+
+    def tearDown(self):
+        remove_observer(self.observe)
+
+    def observe(self, db, sql, params, duration):
+        self.queries.append((db.alias, sql, params))
+
+    def test_queries_are_observed(self):
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        self.assertIsInstance(cursor, ObservedCursorWrapper)
+        cursor.execute('SELECT %s', [1])
+        self.assertEqual(cursor.fetchone(), (1,))
+        cursor.executemany('INSERT INTO tests_tag (name) VALUES (%s)',
+                           [['a'], ['b']])
+        self.assertEqual(self.queries, [
+            (DEFAULT_DB_ALIAS, 'SELECT %s', [1]),
+            (DEFAULT_DB_ALIAS, 'INSERT INTO tests_tag (name) VALUES (%s)',
+             [['a'], ['b']])])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_transaction_is_dirty(self):
+        transaction.set_clean()
+        connections[DEFAULT_DB_ALIAS].cursor().execute(
+                            'INSERT INTO tests_tag (name) VALUES (%s)', ['a'])
+        self.assertTrue(transaction.is_dirty())
+
+
+class QueryBudgetTest(TestCase):
+
+    def test_budget_exceeded(self):
+        with self.assertRaises(AssertionError) as context:
+            with query_budget(max_queries=1):
+                list(Tag.objects.all())
+                list(Tag.objects.all())
+        self.assertIn('Expected at most 1 queries, got 2',
+                      str(context.exception))
+
+    def test_budget_kept(self):
+        with query_budget(max_queries=1, using=DEFAULT_DB_ALIAS):
+            list(Tag.objects.all())
@@ -0,0 +1,87 @@
+''' Tests of splitting suite into shards '''
+
+import json
+import os
+import tempfile
+
+from django.core.management.base import CommandError
+from django.utils import unittest
+from test_tools.cache import save_json
+from test_tools.sharding import load_timings, parse_shard, split_suite
+from test_tools.test_runner import DiscoveryDjangoTestSuiteRunner
+from test_tools.timing import HISTORY_FILE
+from tests import samples
+
+CLASSES = (samples.PassingTest, samples.FailingTest, samples.SlowSetupTest)
+
+
+def get_shard_ids(suite, count, durations=None):
+    return [[test.id() for position, test in chunk]
+            for chunk in split_suite(suite, count, durations)]
+
+
+class SplitSuiteTest(unittest.TestCase):
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('2/3'), (2, 3))
+        self.assertRaises(CommandError, parse_shard, '4/3')
+        self.assertRaises(CommandError, parse_shard, 'first')
+
+    def test_split_doesnt_depend_on_order(self):
+        shards = get_shard_ids(samples.get_suite(*CLASSES), 2)
+        reversed_shards = get_shard_ids(
+                            samples.get_suite(*reversed(CLASSES)), 2)
+        self.assertEqual(map(sorted, shards), map(sorted, reversed_shards))
+        self.assertEqual(sorted(map(len, shards)), [2, 3])
+
+    def test_tests_of_class_are_kept_together(self):
+        for shard in get_shard_ids(samples.get_suite(*CLASSES), 3):
+            self.assertEqual(len(set(test_id.rsplit('.', 1)[0]
+                                     for test_id in shard)), 1)
+
+    def test_balance_by_durations(self):
+        durations = dict((test.id(), 1.0)
+                         for test in samples.get_suite(*CLASSES))
+        durations['tests.samples.SlowSetupTest.test_slow'] = 10.0
+        shards = get_shard_ids(samples.get_suite(*CLASSES), 2, durations)
+        self.assertIn(['tests.samples.SlowSetupTest.test_slow'], shards)
+
+
+class ShardTimingsTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def select_shard(self, **options):
+        runner = DiscoveryDjangoTestSuiteRunner(verbosity=0, **options)
+        suite = runner.select_shard(samples.get_suite(*CLASSES))
+        return [test.id() for test in suite]
+
+    def test_local_history_is_not_used(self):
+        save_json(HISTORY_FILE, {'tests.samples.PassingTest.test_a': [50.0]})
+        self.assertEqual(self.select_shard(shard='1/2'),
+                         ['tests.samples.FailingTest.test_error',
+                          'tests.samples.FailingTest.test_failure',
+                          'tests.samples.SlowSetupTest.test_slow'])
+
+    def test_shared_timings(self):
+        with open(self.path, 'w') as timings_file:
+            json.dump({'tests.samples.PassingTest.test_a': [50.0],
+                       'tests.samples.PassingTest.test_b': [1.0],
+                       'tests.samples.FailingTest.test_error': [1.0],
+                       'tests.samples.FailingTest.test_failure': [1.0],
+                       'tests.samples.SlowSetupTest.test_slow': [1.0]},
+                      timings_file)
+        self.assertEqual(self.select_shard(shard='1/2',
+                                           shard_timings=self.path),
+                         ['tests.samples.PassingTest.test_a',
+                          'tests.samples.PassingTest.test_b'])
+
+    def test_missing_timings(self):
+        os.remove(self.path)
+        self.assertRaises(CommandError, load_timings, self.path)
+        open(self.path, 'w').close()
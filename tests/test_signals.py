@@ -0,0 +1,78 @@
+''' Tests of syncing and migrating test databases '''
+
+import os
+import sqlite3
+
+import mock
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import unittest
+from test_tools import signals
+from test_tools.snapshot import get_snapshot_name
+from test_tools.test_runner import get_worker_db_name
+
+SOURCE_NAME = 'tools.db'
+
+
+def get_fingerprint(connection):
+    ''' Fake fingerprint which tells database it was computed for '''
+    return 'fingerprint of ' + connection.settings_dict['NAME']
+
+
+class SyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = connections[DEFAULT_DB_ALIAS]
+        self.test_db_name = self.connection.settings_dict['NAME']
+        self.db_name = get_worker_db_name(self.test_db_name, 9)
+
+    def tearDown(self):
+        for name in (self.db_name, get_snapshot_name(self.db_name)):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def read_state(self, name):
+        ''' State of the worker database read without Django '''
+        return sqlite3.connect(self.db_name).execute(
+            'SELECT value FROM test_tools_state WHERE name = ?',
+            [name]).fetchone()[0]
+
+    @mock.patch('test_tools.signals.get_schema_fingerprint', get_fingerprint)
+    def test_fingerprint_of_source(self):
+        signals.sync_database(self.connection, self.db_name, SOURCE_NAME)
+        self.assertEqual(self.read_state('syncdb'),
+                         'fingerprint of ' + SOURCE_NAME)
+        self.assertEqual(self.connection.settings_dict['NAME'],
+                         self.test_db_name)
+
+    def test_command_is_skipped_for_same_fingerprint(self):
+        with mock.patch('test_tools.signals.call_command') as call_command:
+            signals.call_db_command(self.connection, self.db_name, 'syncdb',
+                                    'first')
+            signals.call_db_command(self.connection, self.db_name, 'syncdb',
+                                    'first')
+            self.assertEqual(call_command.call_count, 1)
+            signals.call_db_command(self.connection, self.db_name, 'syncdb',
+                                    'second')
+            self.assertEqual(call_command.call_count, 2)
+        self.assertEqual(self.read_state('syncdb'), 'second')
+
+    def test_test_database_is_not_synced_again(self):
+        with mock.patch('test_tools.signals.call_db_command') as call:
+            signals.call_test_db_command('syncdb')
+        self.assertFalse(call.called)
+
+
+class MigrateTest(unittest.TestCase):
+
+    @mock.patch('test_tools.signals.is_test_database', lambda connection:
+                False)
+    @mock.patch('test_tools.signals.call_test_db_command')
+    def test_migrated_after_partial_migration(self, call_test_db_command):
+        # migrate app 0005 sends the signal only for the app
+        signals.migrate_test_db(None, app='first', db=DEFAULT_DB_ALIAS)
+        call_test_db_command.assert_called_once_with('migrate')
+
+    @mock.patch('test_tools.signals.call_test_db_command')
+    def test_test_database_is_not_migrated_again(self, call_test_db_command):
+        signals.migrate_test_db(None, app='last', db=DEFAULT_DB_ALIAS)
+        self.assertFalse(call_test_db_command.called)
@@ -0,0 +1,52 @@
+''' Tests of creating Site of SITE_ID once per database '''
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import unittest
+from test_tools import utils
+from test_tools.flush import DirtyTableFlusher
+from test_tools.queries import query_budget
+from test_tools.schema import delete_state, set_state
+from tests import samples
+
+
+def get_cache_key():
+    connection = connections[DEFAULT_DB_ALIAS]
+    return DEFAULT_DB_ALIAS, connection.settings_dict['NAME']
+
+
+class EnsureSiteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = connections[DEFAULT_DB_ALIAS]
+        utils.reset_site_cache(DEFAULT_DB_ALIAS)
+
+    def tearDown(self):
+        utils.create_site(DEFAULT_DB_ALIAS)
+        set_state(self.connection, utils.SITE_STATE, str(settings.SITE_ID))
+        utils.reset_site_cache(DEFAULT_DB_ALIAS)
+
+    def test_site_is_looked_up_once(self):
+        utils.ensure_site()
+        with query_budget(max_queries=0):
+            utils.ensure_site()
+        self.assertIn(get_cache_key(), utils._site_databases)
+
+    def test_class_site_is_rolled_back(self):
+        delete_state(self.connection, utils.SITE_STATE)
+        Site.objects.all().delete()
+        result = unittest.TestResult()
+        unittest.TestSuite([samples.SiteTest('test_site')]).run(result)
+        self.assertEqual(result.errors + result.failures, [])
+        self.assertFalse(Site.objects.exists())
+        self.assertNotIn(get_cache_key(), utils._site_databases)
+
+    def test_reset_of_site_table_clears_cache(self):
+        flusher = DirtyTableFlusher()
+        flusher.baselines[DEFAULT_DB_ALIAS] = flusher.get_baseline(
+                                                            self.connection)
+        utils.ensure_site()
+        flusher.reset(self.connection, [Site._meta.db_table])
+        self.assertNotIn(get_cache_key(), utils._site_databases)
+        self.assertTrue(Site.objects.filter(pk=settings.SITE_ID).exists())
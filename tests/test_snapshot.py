@@ -0,0 +1,129 @@
+''' Tests of data fingerprints and templates of test databases '''
+
+import os
+import sqlite3
+
+import mock
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.test import TestCase
+from django.utils import unittest
+from test_tools.schema import delete_state, get_data_fingerprint, \
+    get_data_summary, get_migration_rows, get_state, get_table_rows, \
+    restore_migration_rows
+from test_tools.snapshot import create_snapshot, get_snapshot_name
+from test_tools.test_runner import DiscoveryDjangoTestSuiteRunner
+from tests.models import Tag
+
+MIGRATION_TABLE = 'south_migrationhistory'
+
+
+class DataFingerprintTest(TestCase):
+
+    def test_update_changes_fingerprint(self):
+        tag = Tag.objects.create(name='old')
+        fingerprint = get_data_fingerprint(connections[DEFAULT_DB_ALIAS])
+        tag.name = 'new'
+        tag.save()
+        self.assertNotEqual(get_data_fingerprint(
+                            connections[DEFAULT_DB_ALIAS]), fingerprint)
+
+    def test_summary_of_added_and_deleted_rows(self):
+        connection = connections[DEFAULT_DB_ALIAS]
+        summary = get_data_summary(connection)
+        tag = Tag.objects.create(name='old')
+        added = get_data_summary(connection)
+        self.assertNotEqual(added, summary)
+        tag.name = 'new'
+        tag.save()
+        self.assertEqual(get_data_summary(connection), added)
+        tag.delete()
+        self.assertNotEqual(get_data_summary(connection), added)
+
+    def test_same_rows_give_same_fingerprint(self):
+        Tag.objects.create(name='tag')
+        connection = connections[DEFAULT_DB_ALIAS]
+        self.assertEqual(get_data_fingerprint(connection),
+                         get_data_fingerprint(connection))
+
+
+class MigrationRowsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = connections[DEFAULT_DB_ALIAS]
+        cursor = self.connection.cursor()
+        cursor.execute('CREATE TABLE {0} (id integer PRIMARY KEY, '
+                       'migration varchar(255))'.format(MIGRATION_TABLE))
+        cursor.executemany('INSERT INTO {0} VALUES (%s, %s)'.format(
+            MIGRATION_TABLE), [(1, '0001_initial'), (2, '0002_field')])
+        transaction.commit_unless_managed()
+        table_names = self.connection.introspection.django_table_names
+        self.patcher = mock.patch.object(self.connection.introspection,
+            'django_table_names', lambda only_existing=False:
+                table_names(only_existing) + [MIGRATION_TABLE])
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.connection.cursor().execute('DROP TABLE ' + MIGRATION_TABLE)
+        transaction.commit_unless_managed()
+
+    def test_migration_table_is_not_data(self):
+        fingerprint = get_data_fingerprint(self.connection)
+        self.connection.cursor().execute('DELETE FROM ' + MIGRATION_TABLE)
+        transaction.commit_unless_managed()
+        self.assertEqual(get_data_fingerprint(self.connection), fingerprint)
+
+    def test_flushed_rows_are_restored(self):
+        rows = get_migration_rows(self.connection)
+        self.assertEqual(rows.keys(), [MIGRATION_TABLE])
+        self.connection.cursor().execute('DELETE FROM ' + MIGRATION_TABLE)
+        transaction.commit_unless_managed()
+        restore_migration_rows(self.connection, rows)
+        self.assertEqual(get_table_rows(self.connection, MIGRATION_TABLE),
+                         rows[MIGRATION_TABLE])
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = connections[DEFAULT_DB_ALIAS]
+        self.snapshot_name = get_snapshot_name(
+                                    self.connection.settings_dict['NAME'])
+        delete_state(self.connection, 'data')
+        delete_state(self.connection, 'data_checksum')
+
+    def tearDown(self):
+        Tag.objects.all().delete()
+        transaction.commit_unless_managed()
+        if os.path.exists(self.snapshot_name):
+            os.remove(self.snapshot_name)
+
+    def test_state_is_saved_with_template(self):
+        self.assertTrue(create_snapshot(self.connection))
+        for name, value in (('data', get_data_summary(self.connection)),
+                ('data_checksum', get_data_fingerprint(self.connection))):
+            self.assertEqual(get_state(self.connection, name), value)
+            self.assertEqual(sqlite3.connect(self.snapshot_name).execute(
+                'SELECT value FROM test_tools_state WHERE name = ?', [name]
+                ).fetchone()[0], value)
+
+    def test_state_is_not_saved_without_template(self):
+        with mock.patch('test_tools.snapshot.copy_database',
+                        return_value=False):
+            self.assertFalse(create_snapshot(self.connection))
+        self.assertIsNone(get_state(self.connection, 'data'))
+
+    def test_dirty_database(self):
+        tag = Tag.objects.create(name='old')
+        transaction.commit_unless_managed()
+        create_snapshot(self.connection)
+        runner = DiscoveryDjangoTestSuiteRunner()
+        verifying_runner = DiscoveryDjangoTestSuiteRunner(verify_data=True)
+        tag.name = 'new'
+        tag.save()
+        transaction.commit_unless_managed()
+        self.assertFalse(runner.is_dirty(self.connection))
+        self.assertTrue(verifying_runner.is_dirty(self.connection))
+        Tag.objects.create(name='added')
+        transaction.commit_unless_managed()
+        self.assertTrue(runner.is_dirty(self.connection))
@@ -0,0 +1,20 @@
+''' Tests of test case classes '''
+
+from django.utils import unittest
+from tests import samples
+from tests.models import Tag
+
+
+class SharedDataTestCaseTest(unittest.TestCase):
+
+    def test_data_is_shared_and_rolled_back(self):
+        samples.SharedDataTest.data_calls = 0
+        result = unittest.TestResult()
+        # Changes of every test are rolled back, so order doesn't matter
+        unittest.TestSuite([samples.SharedDataTest(name) for name in
+                            ('test_change', 'test_data', 'test_delete',
+                             'test_data')]).run(result)
+        self.assertEqual(result.testsRun, 4)
+        self.assertEqual(result.errors + result.failures, [])
+        self.assertEqual(samples.SharedDataTest.data_calls, 1)
+        self.assertEqual(Tag.objects.count(), 0)
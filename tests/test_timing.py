@@ -0,0 +1,77 @@
+''' Tests of timings history and slow tests report '''
+
+from StringIO import StringIO
+
+from django.utils import unittest
+from test_tools.cache import save_json
+from test_tools.listeners import ListenedTestSuite
+from test_tools.timing import HISTORY_FILE, HISTORY_SIZE, TimingListener, \
+    load_history
+from tests import module_samples, samples
+
+SLOW_ID = 'tests.samples.SlowSetupTest.test_slow'
+SETUP_ID = 'tests.samples.SlowSetupTest.setUpClass'
+
+
+class TimingListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        save_json(HISTORY_FILE, {})
+
+    def run_suite(self, top=0, classes=(samples.PassingTest,
+                                        samples.SlowSetupTest)):
+        listener = TimingListener(top=top, stream=StringIO())
+        suite = ListenedTestSuite(samples.get_suite(*classes), [listener])
+        listener.startTestRun()
+        suite.run(unittest.TestResult())
+        listener.stopTestRun()
+        return listener
+
+    def test_durations_of_tests_and_fixtures(self):
+        listener = self.run_suite()
+        self.assertGreaterEqual(listener.durations[SLOW_ID], 0.06)
+        self.assertGreaterEqual(listener.durations[SETUP_ID], 0.01)
+        self.assertIn('tests.samples.PassingTest.test_a', listener.durations)
+        # Classes without fixtures are not kept
+        self.assertNotIn('tests.samples.PassingTest.setUpClass',
+                         listener.durations)
+
+    def test_durations_of_module_fixtures(self):
+        listener = self.run_suite(classes=(module_samples.ModuleFixtureTest,
+                                           samples.PassingTest))
+        durations = listener.durations
+        self.assertGreaterEqual(
+            durations['tests.module_samples.setUpModule'], 0.01)
+        self.assertLess(durations['tests.module_samples.setUpModule'], 0.06)
+        self.assertGreaterEqual(
+            durations['tests.module_samples.tearDownModule'], 0.06)
+        # Teardown of the first module isn't timed as setup of the next one
+        self.assertLess(durations.get('tests.samples.setUpModule', 0), 0.06)
+
+    def test_history_is_accumulated(self):
+        save_json(HISTORY_FILE, {SLOW_ID: [1.0] * HISTORY_SIZE})
+        self.run_suite()
+        self.run_suite()
+        history = load_history()
+        self.assertEqual(len(history[SLOW_ID]), HISTORY_SIZE)
+        self.assertEqual(history[SLOW_ID][:-2], [1.0] * (HISTORY_SIZE - 2))
+        self.assertEqual(len(history[SETUP_ID]), 2)
+
+    def test_report_of_slowest_and_regressions(self):
+        save_json(HISTORY_FILE, {SLOW_ID: [0.001, 0.001]})
+        report = self.run_suite(top=1).stream.getvalue()
+        slowest = report.split('Slowest tests:\n')[1].split('\n')[0]
+        self.assertIn(SLOW_ID, slowest)
+        self.assertIn(SETUP_ID, report)
+        regressions = report.split('Regressions')[1]
+        self.assertIn('0.001s -> ', regressions)
+        self.assertIn(SLOW_ID, regressions)
+
+    def test_merged_fixture_durations_are_summed(self):
+        setup_id = 'tests.module_samples.setUpModule'
+        listener = TimingListener()
+        listener.startTestRun()
+        listener.merge_data({setup_id: 0.25, SLOW_ID: 0.5})
+        listener.merge_data({setup_id: 0.5})
+        self.assertEqual(listener.durations[setup_id], 0.75)
+        self.assertEqual(listener.durations[SLOW_ID], 0.5)
@@ -0,0 +1,197 @@
+''' Tests of helpers of test_tools.utils '''
+
+from datetime import date, datetime
+
+import mock
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TestCase
+from test_tools.utils import DebugList, bulk_save, has_consecutive_pks, \
+    iter_fake_emails, iter_model_factory, model_factory, reserve_pks
+from tests.models import Item, Tag
+
+
+class BulkSaveTest(TestCase):
+
+    def test_primary_keys_are_set(self):
+        Tag.objects.create(name='existing')
+        tags = model_factory(Tag, name=['a', 'b', 'c', 'd', 'e'],
+                             save=True, bulk=True, batch_size=2)
+        self.assertEqual([(tag.pk, tag.name) for tag in tags],
+                         list(Tag.objects.exclude(name='existing')
+                              .order_by('pk').values_list('pk', 'name')))
+        self.assertFalse(tags[0]._state.adding)
+
+    def test_objects_with_primary_keys(self):
+        tags = [Tag(pk=100, name='old'), Tag(name='new')]
+        bulk_save(Tag, tags)
+        self.assertEqual(tags[0].pk, 100)
+        self.assertEqual(Tag.objects.get(pk=tags[1].pk).name, 'new')
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_foreign_keys_of_saved_objects(self):
+        tags = model_factory(Tag, name=['a', 'b'], save=True, bulk=True)
+        model_factory(Item, tag=tags, save=True, bulk=True)
+        self.assertEqual(sorted(Item.objects.values_list('tag__name',
+                                                         flat=True)),
+                         ['a', 'b'])
+
+    def test_postgresql_table_name_is_quoted(self):
+        connection = mock.Mock(vendor='postgresql')
+        connection.ops.quote_name = lambda name: '"{0}"'.format(name)
+        cursor = connection.cursor.return_value
+        cursor.fetchall.return_value = [(7,), (8,)]
+        with mock.patch('django.db.connections',
+                        {DEFAULT_DB_ALIAS: connection}):
+            self.assertEqual(reserve_pks(Tag, DEFAULT_DB_ALIAS, 2), [7, 8])
+        self.assertEqual(cursor.execute.call_args[0][1],
+                         ['"tests_tag"', 'id', 2])
+
+    def test_no_reservation_on_sqlite(self):
+        self.assertEqual(reserve_pks(Tag, DEFAULT_DB_ALIAS, 2), None)
+
+    def test_interleaved_mysql_keys_are_not_consecutive(self):
+        connection = mock.Mock(vendor='mysql')
+        cursor = connection.cursor.return_value
+        cursor.fetchone.return_value = (2,)
+        self.assertFalse(has_consecutive_pks(connection))
+        cursor.fetchone.return_value = (1,)
+        self.assertTrue(has_consecutive_pks(connection))
+
+
+class DiffTest(TestCase):
+
+    def setUp(self):
+        self.items = model_factory(Item, name=['a', 'b'], number=[1, 2],
+                                   day=[date(2020, 1, 1), date(2020, 1, 2)],
+                                   save=True)
+
+    def test_equal_objects(self):
+        actual = Item.objects.order_by('pk')
+        self.assertFalse(self.items.has_diff(actual))
+        self.assertEqual(self.items.get_diff(actual), '')
+        self.assertFalse(self.items.has_diff(list(actual), ordered=True))
+
+    def test_values_are_converted_by_fields(self):
+        expected = DebugList([Item(id=self.items[0].id, number='1',
+                                   day=datetime(2020, 1, 1, 10, 30))],
+                             fields=['number', 'day'])
+        actual = Item.objects.filter(pk=self.items[0].pk)
+        self.assertFalse(expected.has_diff(actual, fields=True))
+        self.assertEqual(expected.get_diff(list(actual)), '')
+
+    def test_changed_field_is_diff(self):
+        Item.objects.filter(pk=self.items[1].pk).update(number=5)
+        actual = Item.objects.all()
+        # Only ids are compared by default
+        self.assertFalse(self.items.has_diff(actual))
+        self.assertTrue(self.items.has_diff(actual, fields=True))
+        self.assertTrue(self.items.has_diff(list(actual), fields=True))
+        self.assertIn("number: 2 != 5", self.items.get_diff(actual))
+        self.assertIn("number: 2 != 5", self.items.get_diff(list(actual)))
+        self.assertTrue(self.items.get_diff(actual).startswith(
+            "Expected and actual objects are different\nChanged objects: "))
+
+    def test_missed_and_extra_objects(self):
+        self.items[1].delete()
+        Item.objects.create(name='c')
+        diff = self.items.get_diff(Item.objects.all())
+        self.assertTrue(self.items.has_diff(Item.objects.all()))
+        self.assertIn('Missed objects', diff)
+        self.assertIn('Extra objects', diff)
+
+    def test_unsaved_objects_are_matched_by_position(self):
+        expected = model_factory(Item, name=['a', 'b'], number=[1, 2])
+        actual = list(expected)
+        self.assertEqual(expected.get_diff(actual), '')
+        self.assertFalse(expected.has_diff(actual, fields=True))
+        actual[1] = Item(name='c', number=2)
+        self.assertIn("Item(id=None): name: 'b' != 'c'",
+                      expected.get_diff(actual))
+
+    def test_wrong_order(self):
+        actual = Item.objects.order_by('-pk')
+        self.assertFalse(self.items.has_diff(actual))
+        self.assertTrue(self.items.has_diff(actual, ordered=True))
+        self.assertIn('Wrong ID order', self.items.get_diff(actual,
+                                                            ordered=True))
+
+
+class QuerySetDiffTest(TestCase):
+
+    def setUp(self):
+        self.items = model_factory(Item, name=['a', 'b', 'c', 'd', 'e'],
+                                   number=[1, 1, 1, 2, 2], save=True)
+
+    def test_attributes_which_are_not_fields(self):
+        expected = DebugList(self.items, fields=['name', 'title'])
+        self.assertFalse(expected.has_diff(Item.objects.all(), fields=True))
+        Item.objects.filter(name='b').update(name='x')
+        self.assertIn("title: 'B' != u'X'",
+                      expected.get_diff(Item.objects.all()))
+
+    def test_offset_chunks_with_equal_values(self):
+        expected = DebugList(self.items, fields=['number'])
+        expected.diff_chunk_size = 2
+        with mock.patch.object(expected, 'get_offset_chunks',
+                               wraps=expected.get_offset_chunks) as chunks:
+            self.assertFalse(expected.has_diff(
+                            Item.objects.order_by('number'), ordered=True,
+                            fields=True))
+        values = chunks.call_args[0][0]
+        self.assertEqual(values.query.order_by, ['number', 'pk'])
+
+    def test_unordered_queryset_by_offset(self):
+        expected = DebugList(self.items, fields=['number'])
+        expected.diff_chunk_size = 2
+        with mock.patch.object(expected, 'get_offset_chunks',
+                               wraps=expected.get_offset_chunks) as chunks:
+            self.assertFalse(expected.has_diff(Item.objects.all(),
+                                               ordered=True, fields=True))
+        values = chunks.call_args[0][0]
+        self.assertEqual(values.query.order_by, ['pk'])
+
+    def test_pk_chunks_with_repeated_rows(self):
+        tags = model_factory(Tag, name=['a', 'b'], save=True)
+        model_factory(Item, tag=[tags[0], tags[0], tags[1], tags[1]],
+                      save=True)
+        # Join with items repeats every tag twice
+        tagged = Tag.objects.filter(item__number__gte=0)
+        expected = DebugList([tags[0], tags[0], tags[1], tags[1]])
+        expected.diff_chunk_size = 3
+        self.assertFalse(expected.has_diff(tagged))
+        expected = DebugList([tags[0], tags[0], tags[1]])
+        expected.diff_chunk_size = 3
+        self.assertTrue(expected.has_diff(tagged))
+        expected = DebugList(tags)
+        expected.diff_chunk_size = 1
+        self.assertFalse(expected.has_diff(tagged.distinct()))
+
+
+class IterModelFactoryTest(TestCase):
+
+    def test_values_of_every_kind(self):
+        items = list(iter_model_factory(Item, name=iter_fake_emails(),
+                                        number=lambda number: number * 10,
+                                        day=[date(2020, 1, 1)] * 3,
+                                        tag=None))
+        self.assertEqual([(item.name, item.number, item.day)
+                          for item in items],
+                         [('email_{0}@example.com'.format(number),
+                           number * 10, date(2020, 1, 1))
+                          for number in range(3)])
+        self.assertEqual(Item.objects.count(), 0)
+
+    def test_objects_are_created_lazily(self):
+        objects = iter_model_factory(Tag, name=iter_fake_emails(), save=True)
+        self.assertEqual(Tag.objects.count(), 0)
+        first = next(objects)
+        self.assertEqual(list(Tag.objects.all()), [first])
+
+    def test_batches_are_saved(self):
+        batches = list(iter_model_factory(Tag, name=iter_fake_emails(),
+                                          count=5, save=True, bulk=True,
+                                          batch_size=2))
+        self.assertEqual(map(len, batches), [2, 2, 1])
+        self.assertFalse(batches[1].has_diff(Tag.objects.filter(
+                            pk__in=[tag.pk for tag in batches[1]])))
+        self.assertEqual(Tag.objects.count(), 5)
@@ -0,0 +1,96 @@
+''' Tests of selecting tests of changed files in watch mode '''
+
+import os
+import shutil
+import tempfile
+
+import mock
+from django.utils import unittest
+from test_tools.cache import get_cache_path, save_json
+from test_tools.impact import get_project_root
+from test_tools.watch import Watcher, get_changed_files, get_source_files
+
+INDEX = {'modules': {
+    'shop.tests.test_items': {
+        'label': 'shop.test_items',
+        'files': {'/project/shop/tests/test_items.py': [1, 1],
+                  '/project/shop/tests/base.py': [1, 1]},
+        'tests': [['shop.tests.test_items', 'ItemTest', 'test_a'],
+                  ['shop.tests.base', 'BaseTest', 'test_base']],
+    },
+}, 'apps': {
+    'blog': {
+        'label': 'blog',
+        'files': {'/project/blog/tests.py': [1, 1]},
+        'tests': [['blog.tests', 'PostTest', 'test_a']],
+    },
+}}
+
+
+class SourceFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for name in ('a.py', 'b.txt', '.git/c.py', 'site-packages/d.py',
+                     'app/e.py'):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_python_files_of_project(self):
+        self.assertEqual(sorted(os.path.relpath(path, self.root)
+                                for path in get_source_files(self.root)),
+                         ['a.py', os.path.join('app', 'e.py')])
+
+    def test_changed_files(self):
+        old = {'a.py': 1, 'b.py': 1, 'c.py': 1}
+        new = {'a.py': 1, 'b.py': 2, 'd.py': 1}
+        self.assertEqual(get_changed_files(old, new),
+                         set(['b.py', 'c.py', 'd.py']))
+
+
+class WatcherLabelsTest(unittest.TestCase):
+
+    def setUp(self):
+        save_json('discovery.json', INDEX)
+        runner = mock.Mock()
+        runner.get_apps.return_value = []
+        self.watcher = Watcher(runner, [])
+
+    def tearDown(self):
+        os.remove(get_cache_path('discovery.json'))
+
+    def test_modules_using_changed_class(self):
+        self.assertEqual(self.watcher.get_labels(
+                                    ['/project/shop/tests/base.py']),
+                         ['shop.test_items'])
+
+    def test_tests_which_executed_changed_file(self):
+        path = os.path.join(get_project_root(), 'tests', 'models.py')
+        impacted = set(['shop.tests.base.BaseTest.test_base'])
+        with mock.patch('test_tools.watch.get_impacted_tests',
+                        return_value=(impacted, {'other': set()})):
+            self.assertEqual(self.watcher.get_labels([path]),
+                             ['shop.test_items.BaseTest.test_base'])
+
+    def test_tests_of_app_which_executed_changed_file(self):
+        path = os.path.join(get_project_root(), 'tests', 'models.py')
+        impacted = set(['blog.tests.PostTest.test_a'])
+        with mock.patch('test_tools.watch.get_impacted_tests',
+                        return_value=(impacted, {'other': set()})):
+            self.assertEqual(self.watcher.get_labels([path]), ['blog'])
+
+    def test_unknown_impact_runs_everything(self):
+        path = os.path.join(get_project_root(), 'tests', 'models.py')
+        with mock.patch('test_tools.watch.get_impacted_tests',
+                        return_value=(None, {})):
+            self.assertEqual(self.watcher.get_labels([path]), None)
+
+    def test_labels_are_limited_by_given_ones(self):
+        self.watcher.test_labels = ['other']
+        self.assertEqual(self.watcher.get_labels(
+                                    ['/project/shop/tests/base.py']), [])
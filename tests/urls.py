@@ -0,0 +1,14 @@
+''' Views used by tests of test_tools '''
+
+from django.conf.urls import patterns, url
+from django.http import HttpResponse
+
+
+def whoami(request):
+    ''' Username of logged in user '''
+    return HttpResponse(request.user.username)
+
+
+urlpatterns = patterns('',
+    url(r'^whoami/$', whoami),
+)